@@ -24,7 +24,8 @@ except AttributeError:
 
 import numbers
 import logging
-from xml.dom.minidom import parseString
+import re
+from functools import lru_cache
 
 LOG = logging.getLogger("dicttoxml")
 
@@ -65,56 +66,150 @@ def unicode_me(something):
         return unicode(something)
 
 
-ids = []  # initialize list of unique ids
-
-
 def make_id(element, start=100000, end=999999):
     """Returns a random integer"""
     return '%s_%s' % (element, randint(start, end))
 
 
-def get_unique_id(element):
-    """Returns a unique id for a given element"""
-    this_id = make_id(element)
-    dup = True
-    while dup:
-        if this_id not in ids:
-            dup = False
-            ids.append(this_id)
-        else:
+class UniqueIds(object):
+    """Keeps track of the ids handed out during a single dicttoxml() call.
+    Ids only need to be unique within one document, so a new instance is
+    created for every call and nothing accumulates between calls."""
+
+    def __init__(self):
+        self.used = set()
+
+    def get(self, element):
+        this_id = make_id(element)
+        while this_id in self.used:
             this_id = make_id(element)
-    return ids[-1]
+        self.used.add(this_id)
+        return this_id
+
+
+def unique_ids(ids):
+    """Returns the UniqueIds instance to use for a conversion: ids itself if
+    it already is one, a new one if ids is just a truthy flag (as callers of
+    the convert functions used to pass), or False"""
+    if isinstance(ids, UniqueIds):
+        return ids
+    return UniqueIds() if ids else False
+
+
+def get_unique_id(element, ids=None):
+    """Returns a unique id for a given element from the UniqueIds instance
+    for the current conversion. Without one, the id is only unique within
+    this call."""
+    return unique_ids(ids or True).get(element)
+
+
+# How each kind of value is converted. Values are routed with a lookup of
+# their exact type in TYPE_KINDS rather than a chain of isinstance() checks;
+# the first time a type is seen (a subclass such as indigo.Dict, a Decimal,
+# etc.) it is classified with the isinstance() rules and the answer is added
+# to the table, so the rules only ever run once per type.
+KIND_KV = 'kv'  # numbers (including bool) and strings
+KIND_DATE = 'date'  # anything with an isoformat() method
+KIND_NONE = 'none'
+KIND_DICT = 'dict'
+KIND_LIST = 'list'  # any other iterable
+KIND_UNSUPPORTED = 'unsupported'
+
+TYPE_KINDS = {
+    str: KIND_KV,
+    unicode: KIND_KV,
+    int: KIND_KV,
+    long: KIND_KV,
+    float: KIND_KV,
+    bool: KIND_KV,
+    type(None): KIND_NONE,
+    dict: KIND_DICT,
+    list: KIND_LIST,
+    tuple: KIND_LIST,
+    set: KIND_LIST,
+}
+
+
+def classify_type(cls):
+    """Returns the kind of conversion used for values of type cls and
+    remembers it in TYPE_KINDS"""
+    if issubclass(cls, numbers.Number) or cls in (str, unicode):
+        kind = KIND_KV
+    elif hasattr(cls, 'isoformat'):
+        kind = KIND_DATE
+    elif cls is type(None):
+        kind = KIND_NONE
+    elif issubclass(cls, dict):
+        kind = KIND_DICT
+    elif issubclass(cls, iterable):
+        kind = KIND_LIST
+    else:
+        kind = KIND_UNSUPPORTED
+    TYPE_KINDS[cls] = kind
+    return kind
+
+
+def get_kind(val):
+    """Returns the kind of conversion used for val"""
+    try:
+        return TYPE_KINDS[type(val)]
+    except KeyError:
+        return classify_type(type(val))
+
+
+# The xml type attribute for each exact type, filled in the same way.
+XML_TYPES = {}
+
+
+def classify_xml_type(cls):
+    """Returns the data type for the xml type attribute of values of type
+    cls and remembers it in XML_TYPES"""
+    name = cls.__name__
+    if name in ('str', 'unicode'):
+        xml_type = 'str'
+    elif name in ('int', 'long'):
+        xml_type = 'int'
+    elif name in ('float', 'bool'):
+        xml_type = name
+    elif issubclass(cls, numbers.Number):
+        xml_type = 'number'
+    elif name == 'NoneType':
+        xml_type = 'null'
+    elif issubclass(cls, dict):
+        xml_type = 'dict'
+    elif issubclass(cls, iterable):
+        xml_type = 'list'
+    else:
+        xml_type = name
+    XML_TYPES[cls] = xml_type
+    return xml_type
 
 
 def get_xml_type(val):
     """Returns the data type for the xml type attribute"""
-    if type(val).__name__ in ('str', 'unicode'):
-        return 'str'
-    if type(val).__name__ in ('int', 'long'):
-        return 'int'
-    if type(val).__name__ == 'float':
-        return 'float'
-    if type(val).__name__ == 'bool':
-        return 'bool'
-    if isinstance(val, numbers.Number):
-        return 'number'
-    if type(val).__name__ == 'NoneType':
-        return 'null'
-    if isinstance(val, dict):
-        return 'dict'
-    if isinstance(val, iterable):
-        return 'list'
-    return type(val).__name__
+    try:
+        return XML_TYPES[type(val)]
+    except KeyError:
+        return classify_xml_type(type(val))
+
+
+XML_ESCAPE_RE = re.compile('[&"\'<>]')
 
 
 def escape_xml(s):
     if type(s) in (str, unicode):
-        s = unicode_me(s)  # avoid UnicodeDecodeError
-        s = s.replace('&', '&amp;')
-        s = s.replace('"', '&quot;')
-        s = s.replace('\'', '&apos;')
-        s = s.replace('<', '&lt;')
-        s = s.replace('>', '&gt;')
+        if type(s) is not unicode:
+            s = unicode_me(s)  # avoid UnicodeDecodeError
+        # Most strings need no escaping at all, so one scan for a special
+        # character lets them skip the replacements entirely. (For the ones
+        # that do, chained replace() calls measure faster than a single
+        # str.translate() pass with a dict table.)
+        if XML_ESCAPE_RE.search(s) is not None:
+            s = s.replace('&', '&amp;')
+            s = s.replace('"', '&quot;')
+            s = s.replace('\'', '&apos;')
+            s = s.replace('<', '&lt;')
+            s = s.replace('>', '&gt;')
     return s
 
 
@@ -124,40 +219,61 @@ def make_attrstring(attr):
     return '%s%s' % (' ' if attrstring != '' else '', attrstring)
 
 
+# NameStartChar and NameChar from the XML 1.0 (Fifth Edition) spec, without
+# the colon: element names are checked the way a namespace-aware parser sees
+# them, so "a:b" (an undeclared prefix) is not valid.
+NAME_START_CHARS = (
+    'A-Z_a-z\u00C0-\u00D6\u00D8-\u00F6\u00F8-\u02FF\u0370-\u037D'
+    '\u037F-\u1FFF\u200C-\u200D\u2070-\u218F\u2C00-\u2FEF\u3001-\uD7FF'
+    '\uF900-\uFDCF\uFDF0-\uFFFD\U00010000-\U000EFFFF'
+)
+NAME_CHARS = NAME_START_CHARS + '\\-.0-9\u00B7\u0300-\u036F\u203F-\u2040'
+XML_NAME_RE = re.compile('[%s][%s]*\\Z' % (NAME_START_CHARS, NAME_CHARS))
+
+# Device dicts reuse the same few hundred keys over and over, so remember the
+# answer for the keys we have already seen.
+KEY_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=KEY_CACHE_SIZE)
 def key_is_valid_xml(key):
     """Checks that a key is a valid XML name"""
-    LOG.info('Inside key_is_valid_xml(). Testing "%s"' % (unicode_me(key)))
-    test_xml = '<?xml version="1.0" encoding="UTF-8" ?><%s>foo</%s>' % (key, key)
-    try:
-        parseString(test_xml)
-        return True
-    except Exception:  # minidom does not implement exceptions well
-        return False
+    # only called on a cache miss, so a lazy message is cheap enough here
+    LOG.info('Inside key_is_valid_xml(). Testing "%s"', key)
+    return XML_NAME_RE.match(unicode_me(key)) is not None
 
 
-def make_valid_xml_name(key, attr):
-    """Tests an XML name and fixes it if invalid"""
-    LOG.info('Inside make_valid_xml_name(). Testing key "%s" with attr "%s"' % (
-        unicode_me(key), unicode_me(attr))
-             )
+@lru_cache(maxsize=KEY_CACHE_SIZE)
+def fix_xml_name(key):
+    """Returns a tuple of the XML name to use for key and, if the key can't be
+    made into a valid name, the escaped key to move into a name attribute
+    (otherwise None)"""
     key = escape_xml(key)
-    attr = escape_xml(attr)
 
     # pass through if key is already valid
     if key_is_valid_xml(key):
-        return key, attr
+        return key, None
 
     # prepend a lowercase n if the key is numeric
     if key.isdigit():
-        return 'n%s' % (key), attr
+        return 'n%s' % (key), None
 
     # replace spaces with underscores if that fixes the problem
     if key_is_valid_xml(key.replace(' ', '_')):
-        return key.replace(' ', '_'), attr
+        return key.replace(' ', '_'), None
 
     # key is still invalid - move it into a name attribute
-    attr['name'] = key
-    key = 'key'
+    return 'key', key
+
+
+def make_valid_xml_name(key, attr, debug=False):
+    """Tests an XML name and fixes it if invalid"""
+    if debug:
+        LOG.info('Inside make_valid_xml_name(). Testing key "%s" with attr "%s"',
+                 unicode_me(key), unicode_me(attr))
+    key, name = fix_xml_name(key)
+    if name is not None:
+        attr['name'] = name
     return key, attr
 
 
@@ -171,169 +287,159 @@ def default_item_func(parent):
     return 'item'
 
 
-def convert(obj, ids, attr_type, item_func, cdata, parent='root'):
+def iter_convert(obj, ids, attr_type, item_func, cdata, parent='root', debug=False):
     """Routes the elements of an object to the right function to convert them
-    based on their data type"""
+    based on their data type, yielding the XML in chunks"""
 
-    LOG.info('Inside convert(). obj type is: "%s", obj="%s"' % (type(obj).__name__, unicode_me(obj)))
+    if debug:
+        LOG.info('Inside convert(). obj type is: "%s", obj="%s"', type(obj).__name__, unicode_me(obj))
 
     item_name = item_func(parent)
+    kind = get_kind(obj)
 
-    if isinstance(obj, numbers.Number) or type(obj) in (str, unicode):
-        return convert_kv(item_name, obj, attr_type, cdata)
+    if kind is KIND_KV:
+        yield convert_kv(item_name, obj, attr_type, cdata, debug=debug)
 
-    if hasattr(obj, 'isoformat'):
-        return convert_kv(item_name, obj.isoformat(), attr_type, cdata)
+    elif kind is KIND_DICT:
+        for chunk in iter_dict(obj, ids, parent, attr_type, item_func, cdata, debug):
+            yield chunk
 
-    if type(obj) == bool:
-        return convert_bool(item_name, obj, attr_type, cdata)
+    elif kind is KIND_LIST:
+        for chunk in iter_list(obj, ids, parent, attr_type, item_func, cdata, debug):
+            yield chunk
 
-    if obj is None:
-        return convert_none(item_name, '', attr_type, cdata)
+    elif kind is KIND_DATE:
+        yield convert_kv(item_name, obj.isoformat(), attr_type, cdata, debug=debug)
 
-    if isinstance(obj, dict):
-        return convert_dict(obj, ids, parent, attr_type, item_func, cdata)
-
-    if isinstance(obj, iterable):
-        return convert_list(obj, ids, parent, attr_type, item_func, cdata)
-
-    raise TypeError('Unsupported data type: %s (%s)' % (obj, type(obj).__name__))
+    elif kind is KIND_NONE:
+        yield convert_none(item_name, '', attr_type, cdata, debug=debug)
 
+    else:
+        raise TypeError('Unsupported data type: %s (%s)' % (obj, type(obj).__name__))
 
-def convert_dict(obj, ids, parent, attr_type, item_func, cdata):
-    """Converts a dict into an XML string."""
-    LOG.info('Inside convert_dict(): obj type is: "%s", obj="%s"' % (
-        type(obj).__name__, unicode_me(obj))
-             )
-    output = []
-    addline = output.append
 
-    item_name = item_func(parent)
+def iter_dict(obj, ids, parent, attr_type, item_func, cdata, debug=False):
+    """Converts a dict into XML, yielding one chunk per element. Nested
+    collections are yielded as they are walked rather than being built up
+    into a string and copied into every enclosing element."""
+    if debug:
+        LOG.info('Inside convert_dict(): obj type is: "%s", obj="%s"',
+                 type(obj).__name__, unicode_me(obj))
 
     for key, val in obj.items():
-        LOG.info('Looping inside convert_dict(): key="%s", val="%s", type(val)="%s"' % (
-            unicode_me(key), unicode_me(val), type(val).__name__)
-                 )
+        if debug:
+            LOG.info('Looping inside convert_dict(): key="%s", val="%s", type(val)="%s"',
+                     unicode_me(key), unicode_me(val), type(val).__name__)
 
-        attr = {} if not ids else {'id': '%s' % (get_unique_id(parent))}
+        attr = {} if not ids else {'id': '%s' % (get_unique_id(parent, ids))}
 
-        key, attr = make_valid_xml_name(key, attr)
+        key, attr = make_valid_xml_name(key, attr, debug)
+        kind = get_kind(val)
 
-        if isinstance(val, numbers.Number) or type(val) in (str, unicode):
-            addline(convert_kv(key, val, attr_type, attr, cdata))
+        if kind is KIND_KV:
+            yield convert_kv(key, val, attr_type, attr, cdata, debug=debug)
 
-        elif hasattr(val, 'isoformat'):  # datetime
-            addline(convert_kv(key, val.isoformat(), attr_type, attr, cdata))
-
-        elif type(val) == bool:
-            addline(convert_bool(key, val, attr_type, attr, cdata))
-
-        elif isinstance(val, dict):
+        elif kind is KIND_DICT:
             if attr_type:
                 attr['type'] = get_xml_type(val)
-            addline('<%s%s>%s</%s>' % (
-                key, make_attrstring(attr),
-                convert_dict(val, ids, key, attr_type, item_func, cdata),
-                key
-            )
-                    )
-
-        elif isinstance(val, iterable):
+            yield '<%s%s>' % (key, make_attrstring(attr))
+            for chunk in iter_dict(val, ids, key, attr_type, item_func, cdata, debug):
+                yield chunk
+            yield '</%s>' % (key)
+
+        elif kind is KIND_LIST:
             if attr_type:
                 attr['type'] = get_xml_type(val)
-            addline('<%s%s>%s</%s>' % (
-                key,
-                make_attrstring(attr),
-                convert_list(val, ids, key, attr_type, item_func, cdata),
-                key
-            )
-                    )
+            yield '<%s%s>' % (key, make_attrstring(attr))
+            for chunk in iter_list(val, ids, key, attr_type, item_func, cdata, debug):
+                yield chunk
+            yield '</%s>' % (key)
+
+        elif kind is KIND_DATE:
+            yield convert_kv(key, val.isoformat(), attr_type, attr, cdata, debug=debug)
 
-        elif val is None:
-            addline(convert_none(key, val, attr_type, attr, cdata))
+        elif kind is KIND_NONE:
+            yield convert_none(key, val, attr_type, attr, cdata, debug=debug)
 
         else:
             raise TypeError('Unsupported data type: %s (%s)' % (
                 val, type(val).__name__)
                             )
 
-    return ''.join(output)
 
-
-def convert_list(items, ids, parent, attr_type, item_func, cdata):
-    """Converts a list into an XML string."""
-    LOG.info('Inside convert_list()')
-    output = []
-    addline = output.append
+def iter_list(items, ids, parent, attr_type, item_func, cdata, debug=False):
+    """Converts a list into XML, yielding one chunk per element."""
+    if debug:
+        LOG.info('Inside convert_list()')
 
     item_name = item_func(parent)
 
     if ids:
-        this_id = get_unique_id(parent)
+        this_id = get_unique_id(parent, ids)
 
     for i, item in enumerate(items):
-        LOG.info('Looping inside convert_list(): item="%s", item_name="%s", type="%s"' % (
-            unicode_me(item), item_name, type(item).__name__)
-                 )
+        if debug:
+            LOG.info('Looping inside convert_list(): item="%s", item_name="%s", type="%s"',
+                     unicode_me(item), item_name, type(item).__name__)
         attr = {} if not ids else {'id': '%s_%s' % (this_id, i + 1)}
-        if isinstance(item, numbers.Number) or type(item) in (str, unicode):
-            addline(convert_kv(item_name, item, attr_type, attr, cdata))
+        kind = get_kind(item)
 
-        elif hasattr(item, 'isoformat'):  # datetime
-            addline(convert_kv(item_name, item.isoformat(), attr_type, attr, cdata))
+        if kind is KIND_KV:
+            yield convert_kv(item_name, item, attr_type, attr, cdata, debug=debug)
 
-        elif type(item) == bool:
-            addline(convert_bool(item_name, item, attr_type, attr, cdata))
-
-        elif isinstance(item, dict):
+        elif kind is KIND_DICT:
             if not attr_type:
-                addline('<%s>%s</%s>' % (
-                    item_name,
-                    convert_dict(item, ids, parent, attr_type, item_func, cdata),
-                    item_name,
-                )
-                        )
+                yield '<%s>' % (item_name)
             else:
-                addline('<%s type="dict">%s</%s>' % (
-                    item_name,
-                    convert_dict(item, ids, parent, attr_type, item_func, cdata),
-                    item_name,
-                )
-                        )
-
-        elif isinstance(item, iterable):
+                yield '<%s type="dict">' % (item_name)
+            for chunk in iter_dict(item, ids, parent, attr_type, item_func, cdata, debug):
+                yield chunk
+            yield '</%s>' % (item_name)
+
+        elif kind is KIND_LIST:
             if not attr_type:
-                addline('<%s %s>%s</%s>' % (
-                    item_name, make_attrstring(attr),
-                    convert_list(item, ids, item_name, attr_type, item_func, cdata),
-                    item_name,
-                )
-                        )
+                yield '<%s %s>' % (item_name, make_attrstring(attr))
             else:
-                addline('<%s type="list"%s>%s</%s>' % (
-                    item_name, make_attrstring(attr),
-                    convert_list(item, ids, item_name, attr_type, item_func, cdata),
-                    item_name,
-                )
-                        )
+                yield '<%s type="list"%s>' % (item_name, make_attrstring(attr))
+            for chunk in iter_list(item, ids, item_name, attr_type, item_func, cdata, debug):
+                yield chunk
+            yield '</%s>' % (item_name)
 
-        elif item is None:
-            addline(convert_none(item_name, None, attr_type, attr, cdata))
+        elif kind is KIND_DATE:
+            yield convert_kv(item_name, item.isoformat(), attr_type, attr, cdata, debug=debug)
+
+        elif kind is KIND_NONE:
+            yield convert_none(item_name, None, attr_type, attr, cdata, debug=debug)
 
         else:
             raise TypeError('Unsupported data type: %s (%s)' % (
                 item, type(item).__name__)
                             )
-    return ''.join(output)
 
 
-def convert_kv(key, val, attr_type, attr={}, cdata=False):
+def convert(obj, ids, attr_type, item_func, cdata, parent='root', debug=False):
+    """Routes the elements of an object to the right function to convert them
+    based on their data type"""
+    return ''.join(iter_convert(obj, unique_ids(ids), attr_type, item_func, cdata, parent, debug))
+
+
+def convert_dict(obj, ids, parent, attr_type, item_func, cdata, debug=False):
+    """Converts a dict into an XML string."""
+    return ''.join(iter_dict(obj, unique_ids(ids), parent, attr_type, item_func, cdata, debug))
+
+
+def convert_list(items, ids, parent, attr_type, item_func, cdata, debug=False):
+    """Converts a list into an XML string."""
+    return ''.join(iter_list(items, unique_ids(ids), parent, attr_type, item_func, cdata, debug))
+
+
+def convert_kv(key, val, attr_type, attr={}, cdata=False, debug=False):
     """Converts a number or string into an XML element"""
-    LOG.info('Inside convert_kv(): key="%s", val="%s", type(val) is: "%s"' % (
-        unicode_me(key), unicode_me(val), type(val).__name__)
-             )
+    if debug:
+        LOG.info('Inside convert_kv(): key="%s", val="%s", type(val) is: "%s"',
+                 unicode_me(key), unicode_me(val), type(val).__name__)
 
-    key, attr = make_valid_xml_name(key, attr)
+    key, attr = make_valid_xml_name(key, attr, debug)
 
     if attr_type:
         attr['type'] = get_xml_type(val)
@@ -345,13 +451,13 @@ def convert_kv(key, val, attr_type, attr={}, cdata=False):
     )
 
 
-def convert_bool(key, val, attr_type, attr={}, cdata=False):
+def convert_bool(key, val, attr_type, attr={}, cdata=False, debug=False):
     """Converts a boolean into an XML element"""
-    LOG.info('Inside convert_bool(): key="%s", val="%s", type(val) is: "%s"' % (
-        unicode_me(key), unicode_me(val), type(val).__name__)
-             )
+    if debug:
+        LOG.info('Inside convert_bool(): key="%s", val="%s", type(val) is: "%s"',
+                 unicode_me(key), unicode_me(val), type(val).__name__)
 
-    key, attr = make_valid_xml_name(key, attr)
+    key, attr = make_valid_xml_name(key, attr, debug)
 
     if attr_type:
         attr['type'] = get_xml_type(val)
@@ -359,11 +465,12 @@ def convert_bool(key, val, attr_type, attr={}, cdata=False):
     return '<%s%s>%s</%s>' % (key, attrstring, unicode(val).lower(), key)
 
 
-def convert_none(key, val, attr_type, attr={}, cdata=False):
+def convert_none(key, val, attr_type, attr={}, cdata=False, debug=False):
     """Converts a null value into an XML element"""
-    LOG.info('Inside convert_none(): key="%s"' % (unicode_me(key)))
+    if debug:
+        LOG.info('Inside convert_none(): key="%s"', unicode_me(key))
 
-    key, attr = make_valid_xml_name(key, attr)
+    key, attr = make_valid_xml_name(key, attr, debug)
 
     if attr_type:
         attr['type'] = get_xml_type(val)
@@ -371,6 +478,52 @@ def convert_none(key, val, attr_type, attr={}, cdata=False):
     return '<%s%s></%s>' % (key, attrstring, key)
 
 
+def iterxml(obj, root=True, custom_root='root', ids=False, attr_type=True,
+            item_func=default_item_func, cdata=False):
+    """Converts a python object into XML, yielding the document in chunks
+    (unicode strings) as the object is walked. Takes the same arguments as
+    dicttoxml(). Nothing is converted until the first chunk is requested."""
+    # Check the log level once for the whole conversion - the per-element
+    # messages below format entire subtrees, so they must not run unless
+    # someone is actually listening (see set_debug()).
+    debug = LOG.isEnabledFor(logging.INFO)
+    if debug:
+        LOG.info('Inside dicttoxml(): type(obj) is: "%s", obj="%s"', type(obj).__name__, unicode_me(obj))
+    ids = unique_ids(ids)
+    if root == True:
+        yield '<?xml version="1.0" encoding="UTF-8" ?>'
+        yield '<%s>' % (custom_root)
+        for chunk in iter_convert(obj, ids, attr_type, item_func, cdata, parent=custom_root, debug=debug):
+            yield chunk
+        yield '</%s>' % (custom_root)
+    else:
+        for chunk in iter_convert(obj, ids, attr_type, item_func, cdata, parent='', debug=debug):
+            yield chunk
+
+
+def dumpxml(obj, fp, root=True, custom_root='root', ids=False, attr_type=True,
+            item_func=default_item_func, cdata=False, encoding='utf-8',
+            buffer_size=65536):
+    """Converts a python object into XML and writes it to fp, a file-like
+    object opened in binary mode. Takes the same arguments as dicttoxml().
+    Chunks are collected into writes of roughly buffer_size characters, so
+    memory use is bounded by the buffer and the nesting depth rather than
+    the size of the document. Returns the number of bytes written."""
+    written = 0
+    pending = []
+    pending_size = 0
+    for chunk in iterxml(obj, root, custom_root, ids, attr_type, item_func, cdata):
+        pending.append(chunk)
+        pending_size += len(chunk)
+        if pending_size >= buffer_size:
+            written += fp.write(''.join(pending).encode(encoding)) or 0
+            pending = []
+            pending_size = 0
+    if pending:
+        written += fp.write(''.join(pending).encode(encoding)) or 0
+    return written
+
+
 def dicttoxml(obj, root=True, custom_root='root', ids=False, attr_type=True,
               item_func=default_item_func, cdata=False):
     """Converts a python object into XML.
@@ -388,18 +541,6 @@ def dicttoxml(obj, root=True, custom_root='root', ids=False, attr_type=True,
       Default is 'item'
     - cdata specifies whether string values should be wrapped in CDATA sections.
       Default is False
+    See iterxml() and dumpxml() to convert large objects in bounded memory.
     """
-    LOG.info('Inside dicttoxml(): type(obj) is: "%s", obj="%s"' % (type(obj).__name__, unicode_me(obj)))
-    output = []
-    addline = output.append
-    if root == True:
-        addline('<?xml version="1.0" encoding="UTF-8" ?>')
-        addline('<%s>%s</%s>' % (
-            custom_root,
-            convert(obj, ids, attr_type, item_func, cdata, parent=custom_root),
-            custom_root,
-        )
-                )
-    else:
-        addline(convert(obj, ids, attr_type, item_func, cdata, parent=''))
-    return ''.join(output).encode('utf-8')
+    return ''.join(iterxml(obj, root, custom_root, ids, attr_type, item_func, cdata)).encode('utf-8')
@@ -0,0 +1,143 @@
+####################
+# Copyright (c) 2026, Indigo Domotics. All rights reserved.
+# https://www.indigodomo.com
+"""
+Microbenchmarks for the vendored dicttoxml module next to this file, over dicts shaped like dict(dev) for a typical
+device. This isn't loaded by the plugin - run it by hand before and after changing dicttoxml.py (the Example HTTP
+Responder's copy is the same file):
+
+    python3 dicttoxml_benchmark.py [number of devices]
+
+Each line is the best of a few runs, per call. The dumps of N devices are timed with the dicttoxml logger at WARNING
+(logging off, the default) and at INFO with a NullHandler (logging on, but the messages go nowhere), which shows what
+the debug messages cost.
+"""
+# dicttoxml looks up collections.abc without importing it, which only works once something else has imported it.
+import collections.abc
+import datetime
+import io
+import logging
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import dicttoxml
+
+REPEAT = 5
+
+
+def device_dict(dev_id: int) -> dict:
+    """
+    :param dev_id: the device's id
+    :return: a dict with the keys and value types of dict(dev) for a dimmer - about 45 keys, nested dicts and lists,
+        and a datetime
+    """
+    now = datetime.datetime(2026, 1, 1, 12, 0, 0)
+    return {
+        "address": f"{dev_id % 256:02X}.{dev_id % 97:02X}.{dev_id % 13:02X}",
+        "batteryLevel": None,
+        "brightness": dev_id % 101,
+        "buttonGroupCount": 0,
+        "configured": True,
+        "description": "Living room lamp <east> & window",
+        "deviceTypeId": "dimmer",
+        "displayStateId": "brightnessLevel",
+        "displayStateImageSel": "DimmerOn",
+        "displayStateValRaw": dev_id % 101,
+        "displayStateValUi": str(dev_id % 101),
+        "enabled": True,
+        "energyAccumBaseTime": None,
+        "energyAccumTimeDelta": None,
+        "energyAccumTotal": None,
+        "energyCurLevel": None,
+        "errorState": "",
+        "folderId": 1234567,
+        "globalProps": {"com.indigodomo.indigoserver": {"speedIndex": 0}},
+        "id": dev_id,
+        "lastChanged": now,
+        "lastSuccessfulComm": now,
+        "ledStates": [False] * 8,
+        "model": "LampLinc",
+        "name": f"Lamp {dev_id}",
+        "onBrightensToDefaultToggle": True,
+        "onBrightensToLast": False,
+        "onState": bool(dev_id % 2),
+        "ownerProps": {"address": str(dev_id), "SupportsOnState": True, "SupportsStatusRequest": True},
+        "pluginId": "",
+        "pluginProps": {},
+        "protocol": "Insteon",
+        "remoteDisplay": True,
+        "sharedProps": {},
+        "states": {
+            "brightnessLevel": dev_id % 101,
+            "onOffState": bool(dev_id % 2),
+            "onOffState.ui": "on" if dev_id % 2 else "off",
+        },
+        "subModel": "Plug-In",
+        "subType": "",
+        "supportsAllLightsOnOff": True,
+        "supportsAllOff": True,
+        "supportsStatusRequest": True,
+        "version": 65,
+    }
+
+
+def best(func: callable, number: int) -> float:
+    """
+    :param func: the function to time
+    :param number: the number of calls per run
+    :return: the fastest run's time per call, in seconds
+    """
+    return min(timeit.repeat(func, number=number, repeat=REPEAT)) / number
+
+
+def with_log_level(level: int, func: callable) -> callable:
+    """
+    :param level: the level to set the dicttoxml logger to while func runs
+    :param func: the function to time
+    :return: a function that calls func with the logger at level
+    """
+    def run() -> any:
+        dicttoxml.LOG.setLevel(level)
+        try:
+            return func()
+        finally:
+            dicttoxml.LOG.setLevel(logging.WARNING)
+    return run
+
+
+def main(device_count: int = 1000) -> None:
+    # Log messages at INFO go to a NullHandler, so the logging-on case measures formatting them, not writing them.
+    dicttoxml.LOG.addHandler(logging.NullHandler())
+    dicttoxml.LOG.propagate = False
+    dicttoxml.LOG.setLevel(logging.WARNING)
+    device: dict = device_dict(1)
+    devices: list = [device_dict(dev_id) for dev_id in range(device_count)]
+    cases: list = [
+        ("escape_xml, no special characters", lambda: dicttoxml.escape_xml("Living room lamp"), 100000),
+        ("escape_xml, special characters", lambda: dicttoxml.escape_xml("lamp <east> & window"), 100000),
+        ("get_xml_type(float)", lambda: dicttoxml.get_xml_type(1.5), 100000),
+        ("one device dict", lambda: dicttoxml.dicttoxml(device), 1000),
+        ("one device dict, ids=True", lambda: dicttoxml.dicttoxml(device, ids=True), 1000),
+        (
+            f"{device_count} devices, dicttoxml(), logging off",
+            with_log_level(logging.WARNING, lambda: dicttoxml.dicttoxml(devices)),
+            1
+        ),
+        (
+            f"{device_count} devices, dicttoxml(), logging on",
+            with_log_level(logging.INFO, lambda: dicttoxml.dicttoxml(devices)),
+            1
+        ),
+        (f"{device_count} devices, dumpxml()", lambda: dicttoxml.dumpxml(devices, io.BytesIO()), 1),
+    ]
+    width: int = max(len(name) for name, _, _ in cases)
+    for name, func, number in cases:
+        seconds: float = best(func, number)
+        shown: str = f"{seconds * 1e6:.2f} us" if seconds < 0.01 else f"{seconds:.3f} s"
+        print(f"{name:<{width}}  {shown}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
@@ -7,9 +7,9 @@ try:
 except ImportError:
     pass
 
-import json
-import yaml
-import dicttoxml
+import io
+import os
+import serializers
 
 ################################################################################
 class Plugin(indigo.PluginBase):
@@ -63,11 +63,89 @@ class Plugin(indigo.PluginBase):
         errors: indigo.Dict = indigo.Dict()
         if dev_id not in indigo.devices:
             errors["device"] = "'deviceId' must be included and must represent an existing device"
+        # The tabular formats need a list of devices - see export_device_states.
+        Plugin.validate_format(props, errors, tabular=False)
+        Plugin.validate_output_path(props, errors)
+        return (len(errors) == 0, errors)
+
+    @staticmethod
+    def validate_state_export_action(props: indigo.Dict) -> tuple:
+        """
+        This static method will validate the state export information in the specified props dictionary.
+
+        :param props: dictionary of props to validate against
+        :return: a tuple: (False, errors) or (True, empty_dict)
+        """
+        errors: indigo.Dict = indigo.Dict()
+        Plugin.validate_format(props, errors, tabular=True)
+        Plugin.validate_output_path(props, errors)
+        missing: list = []
+        for dev_id in props.get("devices", []):
+            try:
+                if int(dev_id) not in indigo.devices:
+                    missing.append(dev_id)
+            except (TypeError, ValueError):
+                missing.append(dev_id)
+        if missing:
+            errors["devices"] = f"these aren't ids of existing devices: {', '.join(str(dev_id) for dev_id in missing)}"
+        return (len(errors) == 0, errors)
+
+    @staticmethod
+    def validate_format(props: indigo.Dict, errors: indigo.Dict, tabular: bool = None) -> None:
+        """
+        Check the 'format' prop against the serializer registry and add an error to the errors dict if it's invalid.
+
+        :param props: dictionary of props to validate against
+        :param errors: the errors dict to update
+        :param tabular: if not None, only accept formats whose tabular flag matches
+        :return: None
+        """
+        formats: list = serializers.serializer_names(tabular)
         if "format" not in props:
             errors["format"] = "'format' parameter is missing"
-        elif props["format"] not in ["json", "xml", "yaml"]:
-            errors["format"] = f"{props['format']} must be one of: 'json', 'xml', 'yaml'"
-        return (len(errors) == 0, errors)
+        elif props["format"] not in formats:
+            errors["format"] = f"{props['format']} must be one of: {', '.join(repr(name) for name in formats)}"
+
+    @staticmethod
+    def validate_output_path(props: indigo.Dict, errors: indigo.Dict) -> None:
+        """
+        Check the optional 'outputPath' prop and add an error to the errors dict if the file can't be written there.
+
+        :param props: dictionary of props to validate against
+        :param errors: the errors dict to update
+        :return: None
+        """
+        output_path: str = props.get("outputPath", "")
+        if output_path:
+            folder: str = os.path.dirname(os.path.expanduser(output_path))
+            if not os.path.isabs(os.path.expanduser(output_path)):
+                errors["outputPath"] = f"{output_path} must be an absolute path"
+            elif not os.path.isdir(folder):
+                errors["outputPath"] = f"the folder {folder} doesn't exist"
+
+    ########################################
+    def format_list(
+            self: indigo.PluginBase,
+            filter: str = "",
+            values_dict: indigo.Dict = None,
+            type_id: str = "",
+            target_id: int = 0
+    ) -> list:
+        """
+        Dynamic list callback for the format menus in Actions.xml, built from the serializer registry. The filter
+        attribute of the List element is "tabular" for actions that only accept tabular formats, and "device" for
+        actions that only accept formats for a single device dict.
+
+        :param filter: the filter attribute from the List element
+        :param values_dict: the current values in the config UI
+        :param type_id: the action type id
+        :param target_id: the id of the target device
+        :return: a list of (format name, label) tuples
+        """
+        tabular: bool = {"tabular": True, "device": False}.get(filter)
+        return [
+            (name, serializers.get_serializer(name).label) for name in serializers.serializer_names(tabular)
+        ]
 
     ########################################
     def get_device_info(
@@ -94,6 +172,10 @@ class Plugin(indigo.PluginBase):
         in this example. There is an optional arg to return JSON that doesn't have indents, which means it would be
         smaller. condense-json can be any value at all and it will skip the formatting with indents.
 
+        Large documents (YAML and XML especially) are expensive to pass back through the reply and to print in the Event
+        Log, so if the optional 'outputPath' prop is set, the output is streamed straight to that file instead and the
+        reply only contains the path, the number of bytes written, and how long it took.
+
         :param action: action.props contains all the information passed from the action config or executeAction call
         :param dev: device whose details to return in the appropriate format
         :param caller_waiting_for_result: this will be true if it's an API call or false if it's called via the server
@@ -121,17 +203,139 @@ class Plugin(indigo.PluginBase):
             # If the validation passes, we generate a dict from the device, convert it to the requested format, and
             # add it to the reply.
             device_dict: dict = dict(dev)
-            if props["format"] == "yaml":
-                reply_dict["deviceInfo"] = yaml.dump(device_dict)
-            elif props["format"] == "xml":
-                reply_dict["deviceInfo"] = dicttoxml.dicttoxml(device_dict)
+            serializer: serializers.Serializer = serializers.get_serializer(props["format"])
+            if props.get("outputPath", ""):
+                if self.write_output_file(reply_dict, "get_device_info", serializer, device_dict, props["outputPath"]):
+                    if not caller_waiting_for_result:
+                        self.log_file_result(f"Device details for device '{dev.name}'", reply_dict)
+            else:
+                reply_dict["deviceInfo"] = serializer.dumps(device_dict)
+                if not caller_waiting_for_result:
+                    # We're only going to write to the log if it's called from the UI action
+                    self.logger.info(f"Device details for device '{dev.name}':\n{reply_dict['deviceInfo']}")
+        return reply_dict
+
+    ########################################
+    def export_device_states(
+            self: indigo.PluginBase,
+            action: any,
+            dev: indigo.Device = None,
+            caller_waiting_for_result: bool = None
+    ) -> indigo.Dict:
+        """
+        This handler exports the states of many devices at once as CSV or TSV: one row per device and one column per
+        state key, which is easy to load into a spreadsheet or a pandas DataFrame without parsing a JSON document for
+        every device.
+
+        The optional 'devices' prop is a list of device ids to export - if it's empty or missing, all devices are
+        exported. As with get_device_info, the optional 'outputPath' prop streams the export to a file instead. The
+        state columns are collected first from the device states alone, so each row is written as soon as its device is
+        read and we never build a full dict for every device.
+
+        :param action: action.props contains the 'format' ("csv" or "tsv") and the optional 'devices' list
+        :param dev: unused
+        :param caller_waiting_for_result: this will be true if it's an API call or false if it's called via the server
+        :return: a reply dict with the content value being the CSV or TSV text.
+        """
+        reply_dict: indigo.Dict = indigo.Dict()
+        props: dict = dict(action.props)
+        is_valid: bool
+        errors: indigo.Dict
+        is_valid, errors = self.validate_state_export_action(props)
+        reply_dict["status"] = is_valid
+        if not is_valid:
+            self.logger.error(f"Couldn't complete 'export_device_states' action because of errors:\n{dict(errors)}")
+            reply_dict["errors"] = errors
+        else:
+            device_ids: list = [int(dev_id) for dev_id in props.get("devices", [])]
+            devices: list = [indigo.devices[dev_id] for dev_id in device_ids] if device_ids else list(indigo.devices)
+            serializer: serializers.Serializer = serializers.get_serializer(props["format"])
+            rows = (self.device_state_row(device) for device in devices)
+            columns: list = serializers.state_columns(devices)
+            reply_dict["deviceCount"] = len(devices)
+            if props.get("outputPath", ""):
+                if self.write_output_file(
+                        reply_dict, "export_device_states", serializer, rows, props["outputPath"], columns=columns
+                ):
+                    if not caller_waiting_for_result:
+                        self.log_file_result(f"Device states for {len(devices)} devices", reply_dict)
             else:
-                reply_dict["deviceInfo"] = json.dumps(device_dict, indent=2, cls=indigo.utils.JSONDateEncoder)
-            if not caller_waiting_for_result:
-                # We're only going to write to the log if it's called from the UI action
-                self.logger.info(f"Device details for device '{dev.name}':\n{reply_dict['deviceInfo']}")
+                stream: io.StringIO = io.StringIO()
+                serializer.dump(rows, stream, columns=columns)
+                reply_dict["stateExport"] = stream.getvalue()
+                if not caller_waiting_for_result:
+                    self.logger.info(f"Device states for {len(devices)} devices:\n{reply_dict['stateExport']}")
         return reply_dict
 
+    def write_output_file(
+            self: indigo.PluginBase,
+            reply_dict: indigo.Dict,
+            action_name: str,
+            serializer: serializers.Serializer,
+            obj: any,
+            path: str,
+            **kwargs: dict
+    ) -> bool:
+        """
+        Stream obj to the file at path and add the result to the reply dict. If the file can't be written (i.e. the path
+        is a folder, or we don't have permission), the reply's status is set to False with the error for 'outputPath'.
+
+        :param reply_dict: the reply dict to update
+        :param action_name: the action's name, for the error message
+        :param serializer: the Serializer to use
+        :param obj: the object to serialize
+        :param path: the 'outputPath' prop
+        :param kwargs: passed through to serializers.dump_to_file
+        :return: True if the file was written
+        """
+        try:
+            result: dict = serializers.dump_to_file(serializer, obj, path, **kwargs)
+        except OSError as exc:
+            errors: indigo.Dict = indigo.Dict()
+            errors["outputPath"] = f"couldn't write {path}: {exc.strerror or exc}"
+            self.logger.error(f"Couldn't complete '{action_name}' action because of errors:\n{dict(errors)}")
+            reply_dict["status"] = False
+            reply_dict["errors"] = errors
+            return False
+        self.add_file_result(reply_dict, result)
+        return True
+
+    @staticmethod
+    def add_file_result(reply_dict: indigo.Dict, result: dict) -> None:
+        """
+        Copy the result of serializers.dump_to_file into the reply dict.
+
+        :param reply_dict: the reply dict to update
+        :param result: the dict returned from serializers.dump_to_file
+        :return: None
+        """
+        reply_dict["outputPath"] = result["path"]
+        reply_dict["byteCount"] = result["byteCount"]
+        reply_dict["seconds"] = result["seconds"]
+
+    def log_file_result(self: indigo.PluginBase, description: str, reply_dict: indigo.Dict) -> None:
+        """
+        Log a one line summary of a file export rather than the exported content.
+
+        :param description: what was exported
+        :param reply_dict: the reply dict updated by add_file_result
+        :return: None
+        """
+        self.logger.info(
+            f"{description} written to {reply_dict['outputPath']} "
+            f"({reply_dict['byteCount']} bytes in {reply_dict['seconds']} seconds)"
+        )
+
+    @staticmethod
+    def device_state_row(dev: indigo.Device) -> dict:
+        """
+        Build the small dict a tabular serializer needs for one device, rather than converting the whole device.
+
+        :param dev: the device to export
+        :return: a dict with the device's id, name, type, and states
+        """
+        return {"id": dev.id, "name": dev.name, "deviceTypeId": dev.deviceTypeId, "states": dict(dev.states)}
+
     ########################################
     def validateActionConfigUi(self: indigo.PluginBase, values_dict: indigo.Dict, type_id: str, dev_id: int) -> tuple:
         """
@@ -146,12 +350,15 @@ class Plugin(indigo.PluginBase):
         """
         self.logger.debug(f"validateDeviceConfigUi: type_id: {type_id}  dev_id: {dev_id}")
         if type_id == "get_device_info":
-            # Here we validate the configuration for the "get_device_info" action (the only one currently).
+            # Here we validate the configuration for the "get_device_info" action.
             is_valid: bool
             errors: indigo.Dict
             # Validate the device information
             is_valid, errors = self.validate_device_info_action(dev_id, values_dict)
             return (is_valid, values_dict, errors)
+        elif type_id == "export_device_states":
+            is_valid, errors = self.validate_state_export_action(values_dict)
+            return (is_valid, values_dict, errors)
         else:
             # If we had other actions in Actions.xml, we would do a different validation here.
             return (True, values_dict)
@@ -0,0 +1,222 @@
+####################
+# Copyright (c) 2026, Indigo Domotics. All rights reserved.
+# https://www.indigodomo.com
+"""
+A small registry of the output formats supported by the Example Action API plugin. Each format name maps to a
+Serializer which knows how to encode an object to a string (dumps) and how to write it to an open file-like object
+(dump). The capability flags let callers decide how to treat the output without knowing anything about the format:
+
+    streaming: dump() writes the output incrementally rather than building the whole document in memory first
+    binary:    the output is bytes rather than str
+    tabular:   the serializer flattens a list of device dicts into rows (one row per device) - its dump also accepts an
+               optional list of state columns so that the devices are only iterated once
+
+To add a new format, just call register_serializer() - validation and the action config menus are driven from here.
+"""
+try:
+    # This is primarily for IDEs - the indigo package is always included when a plugin is started.
+    import indigo
+except ImportError:
+    pass
+
+import csv
+import io
+import json
+import os
+import time
+from typing import Callable, Iterable, NamedTuple
+
+import yaml
+import dicttoxml
+
+# Writes to an output file are made in pieces of at most this many bytes (or characters for text formats).
+CHUNK_SIZE = 64 * 1024
+
+# The device properties that lead every row of a tabular export. Device states follow in the order they are first seen.
+TABULAR_BASE_COLUMNS = ["id", "name", "deviceTypeId"]
+
+
+class Serializer(NamedTuple):
+    name: str
+    label: str
+    dumps: Callable
+    dump: Callable
+    streaming: bool = False
+    binary: bool = False
+    tabular: bool = False
+
+
+SERIALIZERS: dict = {}
+
+
+def register_serializer(
+        name: str,
+        label: str,
+        dumps: Callable,
+        dump: Callable = None,
+        streaming: bool = False,
+        binary: bool = False,
+        tabular: bool = False
+) -> Serializer:
+    """
+    Add a serializer to the registry, replacing any existing serializer with the same name.
+
+    :param name: the format name used in action props (i.e. "json")
+    :param label: the human readable name of the format
+    :param dumps: callable(obj) that returns the encoded object
+    :param dump: callable(obj, stream) that writes the encoded object to stream - if it's not given, the output of dumps
+        is written in one piece
+    :param streaming: True if dump writes incrementally
+    :param binary: True if the output is bytes
+    :param tabular: True if the serializer expects a list of device dicts
+    :return: the registered Serializer
+    """
+    if dump is None:
+        def dump(obj, stream):
+            write_chunked(dumps(obj), stream)
+    serializer = Serializer(name, label, dumps, dump, streaming, binary, tabular)
+    SERIALIZERS[name] = serializer
+    return serializer
+
+
+def get_serializer(name: str) -> Serializer:
+    """
+    Look up a serializer by format name.
+
+    :param name: the format name
+    :return: the Serializer for the format
+    :raises KeyError: if no serializer is registered for the format
+    """
+    return SERIALIZERS[name]
+
+
+def serializer_names(tabular: bool = None) -> list:
+    """
+    Return the registered format names, optionally limited to the tabular (or non-tabular) serializers.
+
+    :param tabular: if not None, only return the serializers whose tabular flag matches
+    :return: a list of format names in registration order
+    """
+    return [name for name, serializer in SERIALIZERS.items() if tabular is None or serializer.tabular == tabular]
+
+
+def write_chunked(data: any, stream: any, chunk_size: int = CHUNK_SIZE) -> None:
+    """
+    Write a string or bytes object to stream in pieces of at most chunk_size.
+
+    :param data: the str or bytes to write
+    :param stream: a file-like object opened in the matching mode
+    :param chunk_size: the maximum size of each write
+    :return: None
+    """
+    view = memoryview(data) if isinstance(data, bytes) else data
+    for start in range(0, len(data), chunk_size):
+        stream.write(view[start:start + chunk_size])
+
+
+def dump_to_file(serializer: Serializer, obj: any, path: str, **kwargs: dict) -> dict:
+    """
+    Serialize obj straight into the file at path. Streaming serializers write as they go, so the document is never
+    held in memory as a whole; the others are encoded first and written in chunks.
+
+    :param serializer: the Serializer to use
+    :param obj: the object to serialize
+    :param path: the path of the file to create (or replace)
+    :param kwargs: passed through to the serializer's dump (i.e. columns for tabular serializers)
+    :return: a dict with the path, the number of bytes written, and the elapsed time in seconds
+    """
+    path = os.path.expanduser(path)
+    start: float = time.perf_counter()
+    if serializer.binary:
+        stream = open(path, "wb", buffering=CHUNK_SIZE)
+    else:
+        stream = open(path, "w", encoding="utf-8", newline="", buffering=CHUNK_SIZE)
+    with stream:
+        serializer.dump(obj, stream, **kwargs)
+    return {
+        "path": path,
+        "byteCount": os.path.getsize(path),
+        "seconds": round(time.perf_counter() - start, 4),
+    }
+
+
+########################################
+# JSON, YAML, and XML - a single device dict
+####################
+def _json_dumps(obj: any) -> str:
+    return json.dumps(obj, indent=2, cls=indigo.utils.JSONDateEncoder)
+
+
+def _json_dump(obj: any, stream: any) -> None:
+    # json.dump writes each chunk produced by the encoder, so the document is never held in memory as a whole
+    json.dump(obj, stream, indent=2, cls=indigo.utils.JSONDateEncoder)
+
+
+def _yaml_dump(obj: any, stream: any) -> None:
+    yaml.dump(obj, stream)
+
+
+########################################
+# CSV and TSV - device states flattened into columns, one row per device
+####################
+def state_columns(devices: Iterable) -> list:
+    """
+    Collect the union of the state keys for the specified devices, in the order they are first seen. Only the keys are
+    read, so this is cheap compared to converting every device to a dict.
+
+    :param devices: an iterable of indigo.Device instances or device dicts
+    :return: a list of state keys
+    """
+    columns: dict = {}
+    for dev in devices:
+        states = dev["states"] if isinstance(dev, dict) else dev.states
+        for key in states.keys():
+            columns[key] = None
+    return list(columns)
+
+
+def write_states(devices: Iterable, stream: any, delimiter: str = ",", columns: list = None) -> None:
+    """
+    Write one row per device with the device's states flattened into columns. If columns is specified, the devices are
+    only iterated once and each row is written as soon as it's read, so a generator of device dicts can be exported in
+    bounded memory. Otherwise, the devices are read into a list so the state columns can be collected first.
+
+    :param devices: a device dict or an iterable of device dicts
+    :param stream: a file-like object opened in text mode
+    :param delimiter: the field delimiter
+    :param columns: the state keys to use as columns, in order
+    :return: None
+    """
+    if isinstance(devices, dict):
+        devices = [devices]
+    if columns is None:
+        devices = list(devices)
+        columns = state_columns(devices)
+    writer = csv.writer(stream, delimiter=delimiter, lineterminator="\n")
+    writer.writerow(TABULAR_BASE_COLUMNS + columns)
+    for dev in devices:
+        states = dev.get("states", {})
+        writer.writerow(
+            [dev.get(key, "") for key in TABULAR_BASE_COLUMNS] + [states.get(key, "") for key in columns]
+        )
+
+
+def _states_dumps(delimiter: str) -> Callable:
+    def dumps(devices: any) -> str:
+        stream = io.StringIO()
+        write_states(devices, stream, delimiter)
+        return stream.getvalue()
+    return dumps
+
+
+def _states_dump(delimiter: str) -> Callable:
+    def dump(devices: any, stream: any, columns: list = None) -> None:
+        write_states(devices, stream, delimiter, columns)
+    return dump
+
+
+register_serializer("json", "JSON", _json_dumps, _json_dump, streaming=True)
+register_serializer("yaml", "YAML", yaml.dump, _yaml_dump, streaming=True)
+register_serializer("xml", "XML", dicttoxml.dicttoxml, dicttoxml.dumpxml, streaming=True, binary=True)
+register_serializer("csv", "CSV", _states_dumps(","), _states_dump(","), streaming=True, tabular=True)
+register_serializer("tsv", "TSV", _states_dumps("\t"), _states_dump("\t"), streaming=True, tabular=True)
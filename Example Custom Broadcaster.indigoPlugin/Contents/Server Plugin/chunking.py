@@ -0,0 +1,126 @@
+####################
+# Copyright (c) 2026, Indigo Domotics. All rights reserved.
+# https://www.indigodomo.com
+"""
+Broadcast payloads should stay at a few kilobytes. To share something bigger (like a snapshot of every device), a
+ChunkSender encodes the payload as JSON, splits it into chunks of at most CHUNK_SIZE characters, and broadcasts them
+one at a time under the "chunk" key, paced by the plugin's RateLimiter. Each chunk is a dict:
+
+    {"id": message id, "key": the payload's key, "part": 0-based chunk number, "count": number of chunks,
+     "crc": CRC-32 of this chunk's data, "totalCrc": CRC-32 of the whole encoded payload, "data": the piece of JSON}
+
+The Example Custom Subscriber reassembles them (see its reassembly.py), checking both checksums.
+"""
+try:
+    # This is primarily for IDEs - the indigo package is always included when a plugin is started.
+    import indigo
+except ImportError:
+    pass
+
+import collections
+import json
+import threading
+import uuid
+import zlib
+from typing import Callable
+
+from coalescer import RateLimiter
+
+CHUNK_KEY = "chunk"
+# The maximum number of characters of encoded payload in one chunk.
+CHUNK_SIZE = 4096
+
+
+def crc(text: str) -> int:
+    """
+    :param text: the text to checksum
+    :return: the CRC-32 of its UTF-8 encoding
+    """
+    return zlib.crc32(text.encode("utf-8"))
+
+
+def split_payload(key: str, payload: any, chunk_size: int = CHUNK_SIZE, message_id: str = None) -> list:
+    """
+    Encode a payload and split it into chunks.
+
+    :param key: the key the subscriber should handle the payload as (i.e. "deviceSnapshot")
+    :param payload: the payload - anything that can be encoded as JSON (dates are encoded in ISO format)
+    :param chunk_size: the maximum number of characters of encoded payload per chunk
+    :param message_id: the id shared by the chunks - a new random one by default
+    :return: the list of chunk dicts
+    """
+    text: str = json.dumps(payload, separators=(",", ":"), cls=indigo.utils.JSONDateEncoder)
+    message_id = message_id or uuid.uuid4().hex
+    pieces: list = [text[start:start + chunk_size] for start in range(0, len(text), chunk_size)] or [""]
+    total_crc: int = crc(text)
+    return [
+        {
+            "id": message_id,
+            "key": key,
+            "part": part,
+            "count": len(pieces),
+            "crc": crc(piece),
+            "totalCrc": total_crc,
+            "data": piece,
+        }
+        for part, piece in enumerate(pieces)
+    ]
+
+
+class ChunkSender:
+    def __init__(
+            self,
+            limiter: RateLimiter,
+            broadcast: Callable = None,
+            chunk_size: int = CHUNK_SIZE,
+            chunk_key: str = CHUNK_KEY
+    ) -> None:
+        """
+        :param limiter: the RateLimiter shared with the plugin's other broadcasts
+        :param broadcast: callable(key, payload) used to send a chunk - defaults to indigo.server.broadcastToSubscribers
+        :param chunk_size: the maximum number of characters of encoded payload per chunk
+        :param chunk_key: the broadcast key for chunks
+        """
+        self.limiter: RateLimiter = limiter
+        self.broadcast: Callable = broadcast or indigo.server.broadcastToSubscribers
+        self.chunk_size: int = chunk_size
+        self.chunk_key: str = chunk_key
+        self.lock: threading.Lock = threading.Lock()
+        self.queue: collections.deque = collections.deque()
+        self.chunks_sent: int = 0
+
+    def send(self, key: str, payload: any) -> int:
+        """
+        Queue a payload to be broadcast in chunks. This can be called from any thread.
+
+        :param key: the key the subscriber should handle the payload as
+        :param payload: the payload
+        :return: the number of chunks queued
+        """
+        chunks: list = split_payload(key, payload, self.chunk_size)
+        with self.lock:
+            self.queue.extend(chunks)
+        return len(chunks)
+
+    @property
+    def pending(self) -> int:
+        """
+        :return: the number of chunks waiting to be sent
+        """
+        return len(self.queue)
+
+    def send_if_due(self, now: float = None) -> bool:
+        """
+        Broadcast the next chunk if there is one and the rate limit allows it.
+
+        :param now: the current time.monotonic() (mostly for testing)
+        :return: True if a chunk was sent
+        """
+        if not self.queue or not self.limiter.ready(now):
+            return False
+        with self.lock:
+            chunk: dict = self.queue.popleft()
+        self.broadcast(self.chunk_key, chunk)
+        self.limiter.mark(now)
+        self.chunks_sent += 1
+        return True
@@ -0,0 +1,132 @@
+####################
+# Copyright (c) 2026, Indigo Domotics. All rights reserved.
+# https://www.indigodomo.com
+"""
+The Indigo Server asks that plugins not broadcast more than about once per second. Rather than calling
+broadcastToSubscribers() for every event, the plugin publishes its events to a BroadcastCoalescer, which buffers them
+and sends them as one "batch" broadcast per interval:
+
+    {"events": [[key, payload], ...], "state": {key: payload, ...}}
+
+Events for ordinary keys are sent in the order they were published. For "state" keys (like colorChanged, where only
+the current value matters) only the latest value is kept, so a burst of changes becomes a single update that is never
+older than the last change. Subscribers subscribe to the batch key and unpack it (see the Example Custom Subscriber).
+
+The rate is enforced by a RateLimiter, which can be shared with anything else that broadcasts (i.e. the chunked
+transfers in chunking.py) so that all of the plugin's broadcasts together stay under the limit.
+"""
+try:
+    # This is primarily for IDEs - the indigo package is always included when a plugin is started.
+    import indigo
+except ImportError:
+    pass
+
+import threading
+import time
+from typing import Callable, Iterable
+
+BATCH_KEY = "batch"
+# The default maximum number of broadcasts per second.
+MAX_RATE = 1.0
+# The maximum number of ordinary events in one batch - the rest wait for the next one, to keep broadcasts small.
+MAX_EVENTS = 100
+
+
+class RateLimiter:
+    def __init__(self, max_rate: float = MAX_RATE) -> None:
+        """
+        :param max_rate: the maximum number of broadcasts per second
+        """
+        self.interval: float = 1.0 / max_rate
+        self.last: float = float("-inf")
+
+    def set_max_rate(self, max_rate: float) -> None:
+        """
+        :param max_rate: the maximum number of broadcasts per second
+        :return: None
+        """
+        self.interval = 1.0 / max_rate
+
+    def ready(self, now: float = None) -> bool:
+        """
+        :param now: the current time.monotonic() (mostly for testing)
+        :return: True if it's been at least one interval since the last broadcast
+        """
+        return (time.monotonic() if now is None else now) - self.last >= self.interval
+
+    def mark(self, now: float = None) -> None:
+        """
+        Record that a broadcast was just sent.
+
+        :param now: the current time.monotonic() (mostly for testing)
+        :return: None
+        """
+        self.last = time.monotonic() if now is None else now
+
+
+class BroadcastCoalescer:
+    def __init__(
+            self,
+            state_keys: Iterable = (),
+            limiter: RateLimiter = None,
+            broadcast: Callable = None,
+            batch_key: str = BATCH_KEY
+    ) -> None:
+        """
+        :param state_keys: the keys for which only the latest value matters
+        :param limiter: the RateLimiter for the plugin's broadcasts - defaults to one allowing MAX_RATE per second
+        :param broadcast: callable(key, payload) used to send a batch - defaults to indigo.server.broadcastToSubscribers
+        :param batch_key: the broadcast key for batches
+        """
+        self.state_keys: set = set(state_keys)
+        self.limiter: RateLimiter = limiter or RateLimiter()
+        self.broadcast: Callable = broadcast or indigo.server.broadcastToSubscribers
+        self.batch_key: str = batch_key
+        self.lock: threading.Lock = threading.Lock()
+        self.events: list = []
+        self.state: dict = {}
+        self.published: int = 0
+        self.batches: int = 0
+
+    def publish(self, key: str, payload: any = None) -> None:
+        """
+        Queue an event for the next batch. This can be called from any thread.
+
+        :param key: the event's key (i.e. "colorChanged")
+        :param payload: the event's payload - a basic python object: string, number, boolean, dict, or list
+        :return: None
+        """
+        with self.lock:
+            if key in self.state_keys:
+                self.state[key] = payload
+            else:
+                self.events.append([key, payload])
+            self.published += 1
+
+    def flush_if_due(self, now: float = None) -> bool:
+        """
+        Send a batch if anything is waiting and the rate limit allows it.
+
+        :param now: the current time.monotonic() (mostly for testing)
+        :return: True if a batch was sent
+        """
+        if not self.limiter.ready(now):
+            return False
+        return self.flush(now)
+
+    def flush(self, now: float = None) -> bool:
+        """
+        Send whatever is waiting as one batch, regardless of the rate limit (i.e. when shutting down).
+
+        :param now: the current time.monotonic() (mostly for testing)
+        :return: True if a batch was sent
+        """
+        with self.lock:
+            if not self.events and not self.state:
+                return False
+            events, self.events = self.events[:MAX_EVENTS], self.events[MAX_EVENTS:]
+            state, self.state = self.state, {}
+        self.broadcast(self.batch_key, {"events": events, "state": state})
+        self.limiter.mark(now)
+        self.batches += 1
+        return True
@@ -7,7 +7,16 @@ try:
 except ImportError:
     pass
 
+import json
 import random
+import time
+
+from chunking import ChunkSender
+from coalescer import BroadcastCoalescer, MAX_RATE, RateLimiter
+from sequencing import SequencedLog
+from statesync import SNAPSHOT_KEY, StatePublisher
+
+COLOR_LIST = ["red", "green", "blue", "indigo", "orange", "black", "white", "magento", "silver", "gold"]
 
 ################################################################################
 class Plugin(indigo.PluginBase):
@@ -32,6 +41,33 @@ class Plugin(indigo.PluginBase):
         """
         super().__init__(plugin_id, plugin_display_name, plugin_version, plugin_prefs, **kwargs)
         self.debug: bool = True
+        # All of our broadcasts (except startup and shutdown) share one rate limit. Events are published to the
+        # coalescer, which sends them in batches (see coalescer.py) - colorChanged is a state key: subscribers only
+        # need the latest color. Payloads too big for one broadcast are sent in chunks (see chunking.py). All of our
+        # broadcasts are stamped with sequence numbers and kept for replay (see sequencing.py).
+        self.sequences: SequencedLog = SequencedLog()
+        self.limiter: RateLimiter = RateLimiter(float(plugin_prefs.get("maxBroadcastRate", MAX_RATE)))
+        self.coalescer: BroadcastCoalescer = BroadcastCoalescer(
+            state_keys=["colorChanged"], limiter=self.limiter, broadcast=self.broadcast_sequenced
+        )
+        self.chunks: ChunkSender = ChunkSender(self.limiter, broadcast=self.broadcast_sequenced)
+        # If set, every broadcast carries its send time so subscribers can measure latency.
+        self.embed_send_time: bool = bool(plugin_prefs.get("embedSendTime", False))
+        # The state we share with subscribers: after the snapshot at startup, only the keys that change are broadcast
+        # (see statesync.py).
+        self.state_sync: StatePublisher = StatePublisher(
+            self.limiter,
+            broadcast=self.broadcast_sequenced,
+            # The same epoch as the sequence numbers, which stamp it on every delta anyway.
+            epoch=self.sequences.epoch,
+            initial={
+                "color": None,
+                "colorChanges": 0,
+                "maxBroadcastRate": float(plugin_prefs.get("maxBroadcastRate", MAX_RATE)),
+                "embedSendTime": self.embed_send_time,
+            }
+        )
+
     ########################################
     def startup(self: indigo.PluginBase) -> None:
         """
@@ -44,6 +80,8 @@ class Plugin(indigo.PluginBase):
         # broadcast key. Note the key is arbitrary and will just be used by the
         # subscribers in their subscribeToBroadcast() call.
         indigo.server.broadcastToSubscribers("broadcasterStarted")
+        # Then send subscribers the whole shared state, which may be too big for one broadcast.
+        self.chunks.send(SNAPSHOT_KEY, self.state_sync.snapshot())
 
     def shutdown(self: indigo.PluginBase) -> None:
         """
@@ -52,6 +90,9 @@ class Plugin(indigo.PluginBase):
         :return: None
         """
         self.logger.debug("shutdown called -- broadcasting shutdown to all subscribers")
+        # Send anything still waiting so subscribers end up with the final state.
+        self.coalescer.flush()
+        self.state_sync.flush()
         # Broadcast to all listeners that we have shutdown using the "broadcasterShutdown"
         # broadcast key.
         indigo.server.broadcastToSubscribers("broadcasterShutdown")
@@ -67,16 +108,170 @@ class Plugin(indigo.PluginBase):
         :return: None
         """
         try:
-            # Every 3 seconds broadcast to subscribers a new random color from our list:
-            color_list = ["red", "green", "blue", "indigo", "orange", "black", "white", "magento", "silver", "gold"]
+            # Every 3 seconds publish a new random color from our list, and send whatever has been published as a batch
+            # (or else the changes to the shared state, or else the next chunk of a large payload) whenever the rate
+            # limit allows:
+            next_color: float = 0.0
             while True:
-                color = color_list[random.randint(0, len(color_list)-1)]
-                # broadcastToSubscribers can take an additional argument to be passed to
-                # the subscribers. Allowed types include basic python objects: string, number,
-                # boolean, dict, or list. For server performance please keep the data size
-                # sent small (a few kilobytes at most), and try not to broadcast more frequently
-                # than once per second. Bursts of higher data rates should be fine.
-                indigo.server.broadcastToSubscribers("colorChanged", color)
-                self.sleep(3)
+                if time.monotonic() >= next_color:
+                    color = COLOR_LIST[random.randint(0, len(COLOR_LIST)-1)]
+                    # broadcastToSubscribers can take an additional argument to be passed to
+                    # the subscribers. Allowed types include basic python objects: string, number,
+                    # boolean, dict, or list. For server performance please keep the data size
+                    # sent small (a few kilobytes at most), and try not to broadcast more frequently
+                    # than once per second. Bursts of higher data rates should be fine. The coalescer
+                    # takes care of the rate for us.
+                    self.coalescer.publish("colorChanged", color)
+                    self.state_sync.update(
+                        {"color": color, "colorChanges": self.state_sync.get("colorChanges", 0) + 1}
+                    )
+                    next_color = time.monotonic() + 3
+                if not self.coalescer.flush_if_due() and not self.state_sync.flush_if_due():
+                    self.chunks.send_if_due()
+                self.sleep(0.1)
         except self.StopThread:
             pass  # Optionally catch the StopThread exception and do any needed cleanup.
+
+    ########################################
+    def broadcast_sequenced(self: indigo.PluginBase, key: str, payload: dict) -> None:
+        """
+        Broadcast a dict payload stamped with its sequence number, keeping a copy for replay. If embedSendTime is on,
+        the broadcast also carries the time.monotonic() it was sent at as "sent" (replayed copies don't, since their
+        latency would include the time until the replay).
+
+        :param key: the broadcast key
+        :param payload: the payload
+        :return: None
+        """
+        stamped: dict = self.sequences.stamp(key, payload)
+        if self.embed_send_time:
+            stamped = dict(stamped, sent=time.monotonic())
+        indigo.server.broadcastToSubscribers(key, stamped)
+
+    def replay(
+            self: indigo.PluginBase,
+            action: any,
+            dev: indigo.Device = None,
+            caller_waiting_for_result: bool = None
+    ) -> indigo.Dict:
+        """
+        This handler returns the broadcasts a subscriber missed, so it can catch up without a full resync:
+
+            plugin = indigo.server.getPlugin("com.example.indigoplugin.custom-broadcaster")
+            props = {"key": "batch", "afterSeq": 41, "epoch": "..."}
+            reply = plugin.executeAction("replay", props=props, waitUntilDone=True)
+
+        :param action: action.props contains the broadcast 'key', 'afterSeq' (the last sequence number the subscriber
+            saw), and optionally the 'epoch' that sequence number belongs to
+        :param dev: unused
+        :param caller_waiting_for_result: this will be true if it's an API call
+        :return: a reply dict with our "epoch", "complete" (False if some of the missed messages are no longer
+            available), and the missed "messages" as a JSON list, oldest first
+        """
+        props: dict = dict(action.props)
+        reply_dict: indigo.Dict = indigo.Dict()
+        reply_dict["epoch"] = self.sequences.epoch
+        try:
+            key: str = props["key"]
+            after_seq: int = int(props.get("afterSeq", 0))
+        except (KeyError, ValueError):
+            self.logger.error("'replay' needs a 'key' and an integer 'afterSeq'")
+            reply_dict["status"] = False
+            return reply_dict
+        if props.get("epoch", self.sequences.epoch) != self.sequences.epoch:
+            # The subscriber's sequence number is from before we restarted - replay everything we still have.
+            after_seq = 0
+        missed, complete = self.sequences.replay(key, after_seq)
+        reply_dict["status"] = True
+        reply_dict["complete"] = complete
+        # The messages are returned as JSON: they can contain values (like None) that an indigo.Dict can't hold.
+        reply_dict["messages"] = json.dumps(missed)
+        return reply_dict
+
+    def state_snapshot(
+            self: indigo.PluginBase,
+            action: any,
+            dev: indigo.Device = None,
+            caller_waiting_for_result: bool = None
+    ) -> indigo.Dict:
+        """
+        This handler returns the whole shared state, for a subscriber that's starting up or has lost track of the
+        deltas:
+
+            plugin = indigo.server.getPlugin("com.example.indigoplugin.custom-broadcaster")
+            reply = plugin.executeAction("state_snapshot", waitUntilDone=True)
+
+        :param action: unused
+        :param dev: unused
+        :param caller_waiting_for_result: this will be true if it's an API call
+        :return: a reply dict with the "snapshot" as JSON: {"epoch", "version", "state"} (see statesync.py)
+        """
+        reply_dict: indigo.Dict = indigo.Dict()
+        # As JSON, like the replayed messages: the state can contain values (like None) that an indigo.Dict can't hold.
+        reply_dict["snapshot"] = json.dumps(self.state_sync.snapshot())
+        return reply_dict
+
+    ########################################
+    # Plugin config and menu items
+    ####################
+    def validatePrefsConfigUi(self: indigo.PluginBase, values_dict: indigo.Dict) -> tuple:
+        """
+        Validate the plugin config dialog.
+
+        :param values_dict: the values from the dialog
+        :return: a tuple: (True, values_dict) or (False, values_dict, errors)
+        """
+        errors: indigo.Dict = indigo.Dict()
+        try:
+            if float(values_dict.get("maxBroadcastRate", MAX_RATE)) <= 0:
+                errors["maxBroadcastRate"] = "the rate must be greater than zero"
+        except ValueError:
+            errors["maxBroadcastRate"] = "enter a number of broadcasts per second"
+        if len(errors):
+            return (False, values_dict, errors)
+        return (True, values_dict)
+
+    def closedPrefsConfigUi(self: indigo.PluginBase, values_dict: indigo.Dict, user_cancelled: bool) -> None:
+        """
+        Apply the new settings when the plugin config dialog is saved, and share them with subscribers.
+
+        :param values_dict: the values from the dialog
+        :param user_cancelled: True if the dialog was cancelled
+        :return: None
+        """
+        if not user_cancelled:
+            self.limiter.set_max_rate(float(values_dict.get("maxBroadcastRate", MAX_RATE)))
+            self.embed_send_time = bool(values_dict.get("embedSendTime", False))
+            self.state_sync.update({
+                "maxBroadcastRate": float(values_dict.get("maxBroadcastRate", MAX_RATE)),
+                "embedSendTime": self.embed_send_time,
+            })
+
+    def broadcast_color_burst(self: indigo.PluginBase) -> None:
+        """
+        This is called when the Publish a Burst of Colors menu item is selected. Publishes 50 colors at once to show
+        that subscribers only receive the last one, in a single batch.
+
+        :return: None
+        """
+        for _ in range(50):
+            color = COLOR_LIST[random.randint(0, len(COLOR_LIST)-1)]
+            self.coalescer.publish("colorChanged", color)
+        self.logger.info(
+            f"published 50 colors -- the last one was {color}; {self.coalescer.published} events published and "
+            f"{self.coalescer.batches} batches broadcast so far"
+        )
+
+    def broadcast_device_snapshot(self: indigo.PluginBase) -> None:
+        """
+        This is called when the Broadcast Device Snapshot menu item is selected. A snapshot of every device is far too
+        big for one broadcast, so it's sent in chunks (see chunking.py) as a "deviceSnapshot" payload.
+
+        :return: None
+        """
+        snapshot: dict = {str(dev.id): dict(dev) for dev in indigo.devices}
+        count: int = self.chunks.send("deviceSnapshot", snapshot)
+        self.logger.info(
+            f"broadcasting a snapshot of {len(snapshot)} devices in {count} chunks "
+            f"({self.chunks.pending} chunks waiting to be sent)"
+        )
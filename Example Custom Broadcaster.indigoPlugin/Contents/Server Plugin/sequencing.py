@@ -0,0 +1,62 @@
+####################
+# Copyright (c) 2026, Indigo Domotics. All rights reserved.
+# https://www.indigodomo.com
+"""
+Lets subscribers notice that they missed a broadcast and catch up. Every dict payload we broadcast is stamped with a
+per-key sequence number and the epoch (a random id for this run of the plugin, so subscribers can tell that the
+numbering started over), and a copy is kept in a per-key ring buffer of the most recent REPLAY_CAPACITY messages.
+
+A subscriber that sees a gap in the sequence numbers calls the plugin's "replay" action with the key and the last
+sequence number it saw, and gets back the messages it missed - as long as they're still in the ring buffer.
+"""
+import collections
+import threading
+import uuid
+
+# The number of recent messages kept per key for replay.
+REPLAY_CAPACITY = 256
+
+
+class SequencedLog:
+    def __init__(self, capacity: int = REPLAY_CAPACITY) -> None:
+        """
+        :param capacity: the number of recent messages to keep per key
+        """
+        self.epoch: str = uuid.uuid4().hex[:12]
+        self.capacity: int = capacity
+        self.lock: threading.Lock = threading.Lock()
+        self.last_seq: dict = {}  # key -> the last sequence number used
+        self.buffers: dict = {}  # key -> deque of stamped payloads
+
+    def stamp(self, key: str, payload: dict) -> dict:
+        """
+        Give a payload the next sequence number for its key and remember it for replay.
+
+        :param key: the broadcast key
+        :param payload: the dict payload to broadcast
+        :return: a copy of the payload with "seq" and "epoch" added
+        """
+        with self.lock:
+            seq: int = self.last_seq.get(key, 0) + 1
+            self.last_seq[key] = seq
+            stamped: dict = dict(payload, seq=seq, epoch=self.epoch)
+            buffer = self.buffers.get(key)
+            if buffer is None:
+                buffer = self.buffers[key] = collections.deque(maxlen=self.capacity)
+            buffer.append(stamped)
+        return stamped
+
+    def replay(self, key: str, after_seq: int) -> tuple:
+        """
+        :param key: the broadcast key
+        :param after_seq: the last sequence number the subscriber saw
+        :return: a tuple: (list of the stamped payloads after after_seq, oldest first; True if none of the missed
+            messages have already fallen out of the ring buffer)
+        """
+        with self.lock:
+            buffer = list(self.buffers.get(key, ()))
+        missed: list = [payload for payload in buffer if payload["seq"] > after_seq]
+        complete: bool = not missed or missed[0]["seq"] == after_seq + 1
+        if not missed and self.last_seq.get(key, 0) > after_seq:
+            complete = False
+        return (missed, complete)
@@ -0,0 +1,152 @@
+####################
+# Copyright (c) 2026, Indigo Domotics. All rights reserved.
+# https://www.indigodomo.com
+"""
+Shares a state dict with subscribers without resending all of it on every change. A StatePublisher keeps the state
+as of the last version it broadcast, plus the changes made since. Each broadcast (at most one per rate limit interval)
+is a delta with just the keys that changed:
+
+    {"epoch": id of this run, "version": n, "changed": {key: value, ...}, "removed": [key, ...]}
+
+A subscriber gets the whole state once - from the snapshot the plugin broadcasts at startup, or by asking for one with
+the "state_snapshot" action - and then keeps its mirror current by applying each delta to the version before it (see
+the Example Custom Subscriber's statemirror.py). A snapshot is:
+
+    {"epoch": id of this run, "version": n, "state": {key: value, ...}}
+
+Changes that cancel out before they're broadcast (a value set and then set back) are never sent.
+"""
+try:
+    # This is primarily for IDEs - the indigo package is always included when a plugin is started.
+    import indigo
+except ImportError:
+    pass
+
+import threading
+import uuid
+from typing import Callable
+
+from coalescer import RateLimiter
+
+DELTA_KEY = "stateDelta"
+SNAPSHOT_KEY = "stateSnapshot"
+# Marks a key that's been removed since the last delta.
+_REMOVED = object()
+
+
+class StatePublisher:
+    def __init__(
+            self,
+            limiter: RateLimiter,
+            broadcast: Callable = None,
+            initial: dict = None,
+            epoch: str = None,
+            delta_key: str = DELTA_KEY
+    ) -> None:
+        """
+        :param limiter: the RateLimiter shared with the plugin's other broadcasts
+        :param broadcast: callable(key, payload) used to send a delta - defaults to indigo.server.broadcastToSubscribers
+        :param initial: the state at version 0
+        :param epoch: an id for this run of the plugin, so subscribers can tell that the versions started over -
+            defaults to a random one
+        :param delta_key: the broadcast key for deltas
+        """
+        self.limiter: RateLimiter = limiter
+        self.broadcast: Callable = broadcast or indigo.server.broadcastToSubscribers
+        self.delta_key: str = delta_key
+        self.epoch: str = epoch or uuid.uuid4().hex[:12]
+        self.lock: threading.Lock = threading.Lock()
+        self.state: dict = dict(initial or {})  # the state as of self.version
+        self.version: int = 0
+        self.pending: dict = {}  # key -> new value (or _REMOVED) since self.version
+
+    def set(self, key: str, value: any) -> None:
+        """
+        Change one key. This can be called from any thread.
+
+        :param key: the key
+        :param value: the new value - a basic python object: string, number, boolean, dict, or list
+        :return: None
+        """
+        with self.lock:
+            self._set(key, value)
+
+    def update(self, values: dict) -> None:
+        """
+        Change several keys at once, so they're sure to be in the same delta.
+
+        :param values: {key: new value}
+        :return: None
+        """
+        with self.lock:
+            for key, value in values.items():
+                self._set(key, value)
+
+    def remove(self, key: str) -> None:
+        """
+        :param key: the key to remove from the state
+        :return: None
+        """
+        with self.lock:
+            self._set(key, _REMOVED)
+
+    def _set(self, key: str, value: any) -> None:
+        if self.state.get(key, _REMOVED) == value:
+            # Back to what subscribers already have.
+            self.pending.pop(key, None)
+        else:
+            self.pending[key] = value
+
+    def get(self, key: str, default: any = None) -> any:
+        """
+        :param key: the key
+        :param default: returned if the key isn't in the state
+        :return: the key's current value, including changes that haven't been broadcast yet
+        """
+        with self.lock:
+            value = self.pending.get(key, self.state.get(key, _REMOVED))
+        return default if value is _REMOVED else value
+
+    def snapshot(self) -> dict:
+        """
+        :return: the whole state as of the last delta broadcast (changes since then will arrive in the next delta)
+        """
+        with self.lock:
+            return {"epoch": self.epoch, "version": self.version, "state": dict(self.state)}
+
+    def flush_if_due(self, now: float = None) -> bool:
+        """
+        Broadcast a delta if anything has changed and the rate limit allows it.
+
+        :param now: the current time.monotonic() (mostly for testing)
+        :return: True if a delta was sent
+        """
+        if not self.pending or not self.limiter.ready(now):
+            return False
+        return self.flush(now)
+
+    def flush(self, now: float = None) -> bool:
+        """
+        Broadcast whatever has changed as one delta, regardless of the rate limit (i.e. when shutting down).
+
+        :param now: the current time.monotonic() (mostly for testing)
+        :return: True if a delta was sent
+        """
+        with self.lock:
+            if not self.pending:
+                return False
+            changed: dict = {}
+            removed: list = []
+            for key, value in self.pending.items():
+                if value is _REMOVED:
+                    self.state.pop(key, None)
+                    removed.append(key)
+                else:
+                    self.state[key] = value
+                    changed[key] = value
+            self.pending = {}
+            self.version += 1
+            delta: dict = {"epoch": self.epoch, "version": self.version, "changed": changed, "removed": removed}
+        self.broadcast(self.delta_key, delta)
+        self.limiter.mark(now)
+        return True
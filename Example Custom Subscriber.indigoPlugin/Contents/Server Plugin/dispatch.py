@@ -0,0 +1,164 @@
+####################
+# Copyright (c) 2026, Indigo Domotics. All rights reserved.
+# https://www.indigodomo.com
+"""
+Broadcast callbacks are called on the plugin's main thread, so a slow handler holds up every broadcast after it and all
+of the plugin's other callbacks. The callbacks in plugin.py just unpack the broadcast and put the work on a
+DispatchQueue, and a few worker threads run the handlers.
+
+Each broadcast key has its own bounded queue, and a key is only handled by one worker at a time, so the handlers for a
+key run in the order the broadcasts arrived while different keys are handled in parallel. The policy decides what
+happens to items that are still waiting:
+
+    DROP_OLDEST: items queue up to the maximum depth; when a key's queue is full, the oldest one is dropped to make room
+    LATEST:      on every put, anything still waiting is replaced (coalesced) - the maximum depth doesn't apply, the
+                 queue never holds more than one item, and the handler always sees the current value
+
+A key can instead have a merge function (see set_merge()), for handlers that mustn't miss anything: a new item for the
+key is merged into the one still waiting, if there is one, so nothing is dropped or replaced whatever the policy.
+"""
+import collections
+import logging
+import threading
+from typing import Callable
+
+DROP_OLDEST = "dropOldest"
+LATEST = "latest"
+# The default number of worker threads and maximum queue depth per key.
+WORKERS = 2
+MAX_DEPTH = 100
+
+
+class DispatchQueue:
+    def __init__(
+            self,
+            logger: logging.Logger,
+            workers: int = WORKERS,
+            max_depth: int = MAX_DEPTH,
+            policy: str = DROP_OLDEST
+    ) -> None:
+        """
+        :param logger: where to log exceptions raised by handlers
+        :param workers: the number of worker threads
+        :param max_depth: the maximum number of items waiting per key
+        :param policy: the queueing policy: DROP_OLDEST or LATEST
+        """
+        self.logger: logging.Logger = logger
+        self.worker_count: int = workers
+        self.max_depth: int = max_depth
+        self.policy: str = policy
+        self.condition: threading.Condition = threading.Condition()
+        self.queues: dict = {}  # key -> deque of (handler, args)
+        self.ready: collections.deque = collections.deque()  # keys with work waiting and no worker on them
+        self.scheduled: set = set()  # keys that are in ready or being handled
+        self.mergers: dict = {}  # key -> callable(waiting args, new args) that returns the merged args
+        self.threads: list = []
+        self.stopping: bool = False
+        self.handled: collections.Counter = collections.Counter()
+        self.dropped: collections.Counter = collections.Counter()
+        self.coalesced: collections.Counter = collections.Counter()
+        self.high_water: collections.Counter = collections.Counter()
+
+    def start(self) -> None:
+        """
+        Start the worker threads.
+
+        :return: None
+        """
+        self.stopping = False
+        for number in range(self.worker_count):
+            thread = threading.Thread(target=self._work, name=f"dispatch-{number + 1}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """
+        Stop the worker threads once they finish the handler they're running. Anything still waiting is discarded.
+
+        :param timeout: the maximum number of seconds to wait for each worker
+        :return: None
+        """
+        with self.condition:
+            self.stopping = True
+            self.condition.notify_all()
+        for thread in self.threads:
+            thread.join(timeout)
+        self.threads = []
+
+    def set_merge(self, key: str, merge: Callable) -> None:
+        """
+        Merge the items queued for a key instead of dropping or replacing them.
+
+        :param key: the broadcast key
+        :param merge: callable(waiting args, new args) that returns the args for one call that covers both
+        :return: None
+        """
+        with self.condition:
+            self.mergers[key] = merge
+
+    def put(self, key: str, handler: Callable, *args: any) -> None:
+        """
+        Queue a call to handler(*args). This returns right away.
+
+        :param key: the broadcast key, which selects the queue
+        :param handler: the method to call
+        :param args: the arguments to call it with
+        :return: None
+        """
+        with self.condition:
+            queue: collections.deque = self.queues.setdefault(key, collections.deque())
+            if key in self.mergers:
+                if queue:
+                    _, waiting = queue.pop()
+                    args = self.mergers[key](waiting, args)
+                    self.coalesced[key] += 1
+            elif self.policy == LATEST:
+                if queue:
+                    self.coalesced[key] += len(queue)
+                    queue.clear()
+            elif len(queue) >= self.max_depth:
+                queue.popleft()
+                self.dropped[key] += 1
+            queue.append((handler, args))
+            self.high_water[key] = max(self.high_water[key], len(queue))
+            if key not in self.scheduled:
+                self.scheduled.add(key)
+                self.ready.append(key)
+                self.condition.notify()
+
+    def _work(self) -> None:
+        while True:
+            with self.condition:
+                while not self.ready and not self.stopping:
+                    self.condition.wait()
+                if self.stopping:
+                    return
+                key: str = self.ready.popleft()
+                handler, args = self.queues[key].popleft()
+            try:
+                handler(*args)
+            except Exception as exc:
+                self.logger.exception(exc)
+            with self.condition:
+                self.handled[key] += 1
+                if self.queues[key]:
+                    self.ready.append(key)
+                    self.condition.notify()
+                else:
+                    self.scheduled.discard(key)
+
+    def stats(self) -> dict:
+        """
+        :return: {key: {"depth", "highWater", "handled", "dropped", "coalesced"}} for every key seen so far
+        """
+        with self.condition:
+            return {
+                key: {
+                    "depth": len(queue),
+                    "highWater": self.high_water[key],
+                    "handled": self.handled[key],
+                    "dropped": self.dropped[key],
+                    "coalesced": self.coalesced[key],
+                }
+                for key, queue in self.queues.items()
+            }
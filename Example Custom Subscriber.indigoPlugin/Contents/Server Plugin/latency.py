@@ -0,0 +1,91 @@
+####################
+# Copyright (c) 2026, Indigo Domotics. All rights reserved.
+# https://www.indigodomo.com
+"""
+Measures how long broadcasts take to get from the broadcaster to our callbacks. When the Example Custom Broadcaster is
+configured to embed its send time, every payload has a "sent" time.monotonic() value - the monotonic clock is shared by
+every process on the Mac, so receive minus send is the end-to-end latency through the Indigo Server.
+
+Latencies are counted in a fixed set of histogram buckets per broadcast key, so recording one is a bisect and an
+increment however many broadcasts arrive, and percentiles are read from the cumulative counts.
+"""
+import bisect
+import threading
+from array import array
+
+# The upper bounds of the histogram buckets, in milliseconds. The last bucket holds everything slower.
+BUCKET_BOUNDS = [0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+PERCENTILES = [50, 90, 99]
+
+
+class LatencyHistogram:
+    def __init__(self) -> None:
+        self.counts: array = array("L", [0] * (len(BUCKET_BOUNDS) + 1))
+        self.count: int = 0
+        self.total: float = 0.0
+        self.max: float = 0.0
+
+    def record(self, milliseconds: float) -> None:
+        """
+        :param milliseconds: the latency to record
+        :return: None
+        """
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS, milliseconds)] += 1
+        self.count += 1
+        self.total += milliseconds
+        self.max = max(self.max, milliseconds)
+
+    def percentile(self, percent: float) -> float:
+        """
+        :param percent: the percentile to compute (i.e. 99)
+        :return: the upper bound of the bucket the percentile falls in (or the maximum, for the last bucket), in
+            milliseconds - 0.0 if nothing has been recorded
+        """
+        if not self.count:
+            return 0.0
+        rank: float = self.count * percent / 100
+        cumulative: int = 0
+        for bucket, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return min(BUCKET_BOUNDS[bucket], self.max) if bucket < len(BUCKET_BOUNDS) else self.max
+        return self.max
+
+    def summary(self) -> dict:
+        """
+        :return: the count, mean, maximum, and PERCENTILES (as "p50" etc.), in milliseconds
+        """
+        summary: dict = {
+            "count": self.count,
+            "mean": round(self.total / self.count, 3) if self.count else 0.0,
+            "max": round(self.max, 3),
+        }
+        for percent in PERCENTILES:
+            summary[f"p{percent}"] = round(self.percentile(percent), 3)
+        return summary
+
+
+class LatencyStats:
+    def __init__(self) -> None:
+        self.lock: threading.Lock = threading.Lock()
+        self.histograms: dict = {}  # broadcast key -> LatencyHistogram
+
+    def record(self, key: str, sent: float, received: float) -> None:
+        """
+        :param key: the broadcast key
+        :param sent: the broadcaster's time.monotonic() when it sent the broadcast
+        :param received: our time.monotonic() when it arrived
+        :return: None
+        """
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = LatencyHistogram()
+            histogram.record(max(received - sent, 0.0) * 1000)
+
+    def summaries(self) -> dict:
+        """
+        :return: {broadcast key: LatencyHistogram.summary()}
+        """
+        with self.lock:
+            return {key: histogram.summary() for key, histogram in self.histograms.items()}
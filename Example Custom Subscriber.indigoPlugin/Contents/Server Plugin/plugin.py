@@ -7,8 +7,27 @@ try:
 except ImportError:
     pass
 
+import json
+import threading
+import time
+
+from dispatch import DispatchQueue, DROP_OLDEST, MAX_DEPTH
+from latency import LatencyStats, PERCENTILES
+from reassembly import ChunkError, ReassemblyBuffer
+from router import TopicRouter
+from sequence import DUPLICATE, GAP, SequenceTracker
+from statemirror import OUT_OF_SYNC, StateMirror, merge_changes
+
 # Plugin ID of the Example Custom Broadcaster plugin (taken from its Info.plist file):
-BROADCASTER_PLUGINID = "com.perceptiveautomation.indigoplugin.custom-broadcaster"
+BROADCASTER_PLUGINID = "com.example.indigoplugin.custom-broadcaster"
+# Where the events in the broadcaster's batches and the large payloads that arrive in chunks go: (key pattern, name of
+# the handler method). "*" matches anything within one dot-separated part of a key and "**" matches anything at all
+# (see router.py); a key goes to the first pattern it matches, and keys that match none are ignored.
+ROUTES = [
+    ("color*", "colorChanged"),
+    ("deviceSnapshot", "deviceSnapshot"),
+    ("stateSnapshot", "stateSnapshot"),
+]
 
 ################################################################################
 class Plugin(indigo.PluginBase):
@@ -31,7 +50,28 @@ class Plugin(indigo.PluginBase):
         :param kwargs: passthrough for any other keyword args
         :return: None
         """
+        super().__init__(plugin_id, plugin_display_name, plugin_version, plugin_prefs, **kwargs)
         self.debug: bool = True
+        self.reassembly: ReassemblyBuffer = ReassemblyBuffer()
+        # The broadcast callbacks below only unpack the broadcast - the handlers run on the dispatcher's worker
+        # threads (see dispatch.py), so a slow handler never holds up the next broadcast.
+        self.dispatcher: DispatchQueue = DispatchQueue(
+            self.logger,
+            max_depth=int(plugin_prefs.get("maxQueueDepth", MAX_DEPTH)),
+            policy=plugin_prefs.get("overflowPolicy", DROP_OLDEST)
+        )
+        # The last sequence number seen for each broadcast key, so we notice missed broadcasts (see sequence.py).
+        self.sequences: SequenceTracker = SequenceTracker(json.loads(plugin_prefs.get("lastSequences", "{}")))
+        # While a replay for a broadcast key is in progress, the broadcasts that arrive for the key wait here (in
+        # order) for it: key -> list of (payload, last sequence number before it if it revealed a gap, else None).
+        self.catching_up: dict = {}
+        self.catch_up_lock: threading.Lock = threading.Lock()
+        # End-to-end latency per broadcast key, for broadcasts that carry their send time (see latency.py).
+        self.latency: LatencyStats = LatencyStats()
+        # Our copy of the broadcaster's shared state, kept current with the deltas it broadcasts (see statemirror.py).
+        self.mirror: StateMirror = StateMirror(on_change=self.queue_state_changed)
+        self.dispatcher.set_merge("stateChanged", merge_changes)
+        self.router: TopicRouter = TopicRouter()
 
     ########################################
     def startup(self: indigo.PluginBase) -> None:
@@ -41,14 +81,25 @@ class Plugin(indigo.PluginBase):
         :return: None
         """
         self.logger.debug("startup called -- subscribing to messages from Example Custom Broadcaster plugin")
+        self.dispatcher.start()
+        for pattern, method_name in ROUTES:
+            self.router.add(pattern, getattr(self, method_name))
+        self.router.compile()
         # The Example Custom Broadcaster plugin defines three broadcast keys: broadcasterStarted,
-        # broadcasterShutdown, and colorChanged. We subscribe to notifications of all three. The
+        # broadcasterShutdown, and batch. We subscribe to notifications of all three. The
         # second argument is the broadcast key used by the broadcasting plugin, the third argument
-        # is the name of our callback method. In this case they are the same, but they don't have
-        # to be.
-        indigo.server.subscribeToBroadcast(BROADCASTER_PLUGINID, "broadcasterStarted", "broadcasterStarted")
-        indigo.server.subscribeToBroadcast(BROADCASTER_PLUGINID, "broadcasterShutdown", "broadcasterShutdown")
-        indigo.server.subscribeToBroadcast(BROADCASTER_PLUGINID, "colorChanged", "colorChanged")
+        # is the name of our callback method. They don't have to be the same: our callbacks just
+        # queue the work for the handler methods. Its events (like colorChanged) arrive inside
+        # batch broadcasts, and go to the handlers their keys are routed to (see ROUTES).
+        indigo.server.subscribeToBroadcast(BROADCASTER_PLUGINID, "broadcasterStarted", "received_broadcaster_started")
+        indigo.server.subscribeToBroadcast(BROADCASTER_PLUGINID, "broadcasterShutdown", "received_broadcaster_shutdown")
+        indigo.server.subscribeToBroadcast(BROADCASTER_PLUGINID, "batch", "batch")
+        # Payloads too big for a single broadcast arrive as a series of "chunk" broadcasts.
+        indigo.server.subscribeToBroadcast(BROADCASTER_PLUGINID, "chunk", "chunk")
+        # Changes to the broadcaster's shared state. We need the whole state to apply them to, so ask for it now - if
+        # the broadcaster isn't running yet, it broadcasts the state when it starts.
+        indigo.server.subscribeToBroadcast(BROADCASTER_PLUGINID, "stateDelta", "stateDelta")
+        self.dispatcher.put("stateSnapshot", self.request_state_snapshot)
 
     def shutdown(self: indigo.PluginBase) -> None:
         """
@@ -57,8 +108,34 @@ class Plugin(indigo.PluginBase):
         :return: None
         """
         self.logger.debug("shutdown called")
+        self.dispatcher.stop()
+        # Remember where we were, so broadcasts sent while we're not running are replayed when we start again.
+        self.pluginPrefs["lastSequences"] = json.dumps(self.sequences.state())
 
     ########################################
+    def runConcurrentThread(self: indigo.PluginBase) -> None:
+        """
+        Every few seconds, give up on any chunked payloads that stopped arriving.
+
+        :return: None
+        """
+        try:
+            while True:
+                for key, received, count in self.reassembly.expire():
+                    self.logger.warning(f"timed out waiting for {key}: only {received} of {count} chunks arrived")
+                self.sleep(5)
+        except self.StopThread:
+            pass
+
+    ########################################
+    # Broadcast callbacks - these run on the plugin's main thread, so they only queue the work.
+    ####################
+    def received_broadcaster_started(self: indigo.PluginBase) -> None:
+        self.dispatcher.put("broadcasterStarted", self.broadcasterStarted)
+
+    def received_broadcaster_shutdown(self: indigo.PluginBase) -> None:
+        self.dispatcher.put("broadcasterShutdown", self.broadcasterShutdown)
+
     def broadcasterStarted(self: indigo.PluginBase) -> None:
         """
         This method will be called when we receive the "broadcasterStarted" message from the Example Custom Broadcaster
@@ -77,11 +154,324 @@ class Plugin(indigo.PluginBase):
         """
         self.logger.info("received broadcasterShutdown message")
 
+    def receive(self: indigo.PluginBase, key: str, payload: dict, handler: any) -> None:
+        """
+        Check a broadcast's sequence number before handling it: a duplicate is skipped, and after a gap the missed
+        broadcasts are replayed (and handled in order) first. Asking the broadcaster for them means waiting for it, so
+        that's done by catch_up() on a dispatcher worker - until it's done, later broadcasts for the key wait for it
+        rather than being handled here. If the broadcast carries its send time, its latency is recorded (replayed
+        broadcasts don't, as their latency includes the wait for the replay).
+
+        :param key: the broadcast key
+        :param payload: the stamped payload
+        :param handler: the method that handles payloads for the key
+        :return: None
+        """
+        received: float = time.monotonic()
+        status, last_seq = self.sequences.observe(key, payload)
+        if status == DUPLICATE:
+            return
+        if "sent" in payload:
+            self.latency.record(key, payload["sent"], received)
+        with self.catch_up_lock:
+            waiting = self.catching_up.get(key)
+            if waiting is not None:
+                waiting.append((payload, last_seq if status == GAP else None))
+                return
+            if status == GAP:
+                self.catching_up[key] = [(payload, last_seq)]
+                self.dispatcher.put(f"replay.{key}", self.catch_up, key, handler)
+                return
+        handler(payload)
+
+    def catch_up(self: indigo.PluginBase, key: str, handler: any) -> None:
+        """
+        Replay the broadcasts missed for a key and handle them, then the broadcasts that arrived meanwhile, in order.
+        This runs on a dispatcher worker.
+
+        :param key: the broadcast key
+        :param handler: the method that handles payloads for the key
+        :return: None
+        """
+        while True:
+            with self.catch_up_lock:
+                waiting: list = self.catching_up[key]
+                if not waiting:
+                    # Caught up: from now on the broadcast callback handles the key's broadcasts again.
+                    del self.catching_up[key]
+                    return
+                self.catching_up[key] = []
+            for payload, last_seq in waiting:
+                try:
+                    if last_seq is not None:
+                        for missed in self.request_replay(key, last_seq, payload):
+                            handler(missed)
+                    handler(payload)
+                except Exception as exc:
+                    self.logger.exception(exc)
+
+    def request_replay(self: indigo.PluginBase, key: str, last_seq: int, payload: dict) -> list:
+        """
+        Ask the broadcaster for the broadcasts we missed between the last one we saw and this one.
+
+        :param key: the broadcast key
+        :param last_seq: the last sequence number we saw
+        :param payload: the broadcast that revealed the gap
+        :return: the missed payloads, oldest first
+        """
+        try:
+            broadcaster = indigo.server.getPlugin(BROADCASTER_PLUGINID)
+            props: dict = {"key": key, "afterSeq": last_seq, "epoch": payload["epoch"]}
+            reply = broadcaster.executeAction("replay", props=props, waitUntilDone=True)
+        except Exception as exc:
+            count: int = payload["seq"] - last_seq - 1
+            self.logger.warning(f"missed {count} {key} broadcasts and couldn't replay them: {exc}")
+            return []
+        missed: list = [message for message in json.loads(reply["messages"]) if message["seq"] < payload["seq"]]
+        if not reply.get("complete", False):
+            self.logger.warning(f"some missed {key} broadcasts are no longer available from the broadcaster")
+        self.logger.debug(f"replayed {len(missed)} missed {key} broadcasts")
+        return missed
+
+    def batch(self: indigo.PluginBase, arg: any) -> None:
+        """
+        This method will be called when we receive a "batch" message from the Example Custom Broadcaster plugin. The
+        broadcaster sends its events in batches to stay under the server's broadcast rate guideline: 'arg' is a dict
+        with a list of [key, payload] "events" in the order they happened, and a "state" dict with the latest payload
+        for keys where only the current value matters. Each one is queued for the handler its key is routed to (see
+        ROUTES).
+
+        :return: None
+        """
+        self.receive("batch", dict(arg), self.handle_batch)
+
+    def handle_batch(self: indigo.PluginBase, arg: dict) -> None:
+        for key, payload in list(arg.get("events", [])) + list(arg.get("state", {}).items()):
+            self.dispatch(key, payload)
+
     def colorChanged(self: indigo.PluginBase, arg: any) -> None:
         """
-        This method will be called when we receive the "colorChanged" message from the Example Custom Broadcaster
-        plugin. For this example, 'arg' will be a color string, like "blue" or "black".
+        This method will be called when we receive an event whose key starts with "color" (like "colorChanged") from
+        the Example Custom Broadcaster plugin. For this example, 'arg' will be a color string, like "blue" or "black".
 
         :return: None
         """
         self.logger.info(f"received colorChanged message: {arg}")
+
+    def chunk(self: indigo.PluginBase, arg: any) -> None:
+        """
+        This method will be called when we receive a "chunk" message from the Example Custom Broadcaster plugin. 'arg'
+        is one piece of a large payload; once all of them have arrived, the payload is queued for the handler its key is
+        routed to (see ROUTES).
+
+        :return: None
+        """
+        self.receive("chunk", dict(arg), self.handle_chunk)
+
+    def handle_chunk(self: indigo.PluginBase, arg: dict) -> None:
+        try:
+            completed = self.reassembly.add(arg)
+        except ChunkError as exc:
+            self.logger.warning(f"discarded a chunked payload: {exc}")
+            return
+        if completed is not None:
+            self.dispatch(*completed)
+
+    def dispatch(self: indigo.PluginBase, key: str, payload: any) -> None:
+        """
+        Queue an event or reassembled payload for the handler its key is routed to.
+
+        :param key: the event's key
+        :param payload: the event's payload
+        :return: None
+        """
+        handler = self.router.route(key)
+        if handler is None:
+            self.logger.debug(f"ignoring {key} event")
+            return
+        self.dispatcher.put(key, handler, payload)
+
+    def deviceSnapshot(self: indigo.PluginBase, arg: any) -> None:
+        """
+        This method will be called when a "deviceSnapshot" payload from the Example Custom Broadcaster plugin has been
+        reassembled. 'arg' is a dict of device id (as a string) to dict(dev).
+
+        :return: None
+        """
+        self.logger.info(f"received a snapshot of {len(arg)} devices")
+
+    def stateDelta(self: indigo.PluginBase, arg: any) -> None:
+        """
+        This method will be called when we receive a "stateDelta" message from the Example Custom Broadcaster plugin.
+        'arg' has just the keys of the broadcaster's shared state that changed since the last one; it's applied to our
+        mirror of the state, and the changes are queued for stateChanged().
+
+        :return: None
+        """
+        self.receive("stateDelta", dict(arg), self.handle_state_delta)
+
+    def handle_state_delta(self: indigo.PluginBase, arg: dict) -> None:
+        if self.mirror.apply(arg) == OUT_OF_SYNC:
+            self.logger.debug(f"state delta version {arg['version']} doesn't follow our mirror -- asking for the state")
+            self.dispatcher.put("stateSnapshot", self.request_state_snapshot)
+
+    def stateSnapshot(self: indigo.PluginBase, arg: any) -> None:
+        """
+        This method will be called when a "stateSnapshot" payload from the Example Custom Broadcaster plugin has been
+        reassembled. 'arg' is the broadcaster's whole shared state: {"epoch", "version", "state"}.
+
+        :return: None
+        """
+        self.load_state_snapshot(arg)
+
+    def request_state_snapshot(self: indigo.PluginBase) -> None:
+        """
+        Ask the broadcaster for its whole shared state and load it into the mirror.
+
+        :return: None
+        """
+        try:
+            broadcaster = indigo.server.getPlugin(BROADCASTER_PLUGINID)
+            if not broadcaster.isEnabled():
+                # It broadcasts its state when it starts.
+                self.logger.debug("the Example Custom Broadcaster isn't running -- waiting for it to send its state")
+                self.mirror.request_failed()
+                return
+            reply = broadcaster.executeAction("state_snapshot", waitUntilDone=True)
+            snapshot: dict = json.loads(reply["snapshot"])
+        except Exception as exc:
+            self.logger.warning(f"couldn't get the broadcaster's state (we'll ask again with its next change): {exc}")
+            self.mirror.request_failed()
+            return
+        self.load_state_snapshot(snapshot)
+
+    def load_state_snapshot(self: indigo.PluginBase, snapshot: dict) -> None:
+        version: int = snapshot["version"]
+        if self.mirror.load(snapshot) is None:
+            self.logger.debug(f"ignored an out of date snapshot of the broadcaster's state (version {version})")
+            return
+        self.logger.info(f"loaded the broadcaster's state: version {version}, {len(snapshot['state'])} keys")
+
+    def queue_state_changed(self: indigo.PluginBase, changed: dict, removed: list) -> None:
+        # Called by the mirror for each delta it applies, in version order - including the deltas that were held
+        # while it waited for a snapshot - so all of the stateChanged() calls go through one queue, in that order. The
+        # queue merges changes that are still waiting (see __init__) rather than dropping them, so none are missed.
+        self.dispatcher.put("stateChanged", self.stateChanged, changed, removed)
+
+    def stateChanged(self: indigo.PluginBase, changed: dict, removed: list) -> None:
+        """
+        This method will be called after a delta has been applied to our mirror of the broadcaster's shared state.
+
+        :param changed: {key: new value} for the keys that were added or changed
+        :param removed: the keys that were removed
+        :return: None
+        """
+        changes: list = [f"{key} = {value}" for key, value in changed.items()] + [f"{key} removed" for key in removed]
+        self.logger.info(f"shared state changed: {', '.join(changes)}")
+
+    ########################################
+    # Plugin config and menu items
+    ####################
+    def validatePrefsConfigUi(self: indigo.PluginBase, values_dict: indigo.Dict) -> tuple:
+        """
+        Validate the plugin config dialog.
+
+        :param values_dict: the values from the dialog
+        :return: a tuple: (True, values_dict) or (False, values_dict, errors)
+        """
+        errors: indigo.Dict = indigo.Dict()
+        try:
+            if int(values_dict.get("maxQueueDepth", MAX_DEPTH)) < 1:
+                errors["maxQueueDepth"] = "the depth must be at least 1"
+        except ValueError:
+            errors["maxQueueDepth"] = "enter a whole number"
+        if len(errors):
+            return (False, values_dict, errors)
+        return (True, values_dict)
+
+    def closedPrefsConfigUi(self: indigo.PluginBase, values_dict: indigo.Dict, user_cancelled: bool) -> None:
+        """
+        Apply the new queue settings when the plugin config dialog is saved.
+
+        :param values_dict: the values from the dialog
+        :param user_cancelled: True if the dialog was cancelled
+        :return: None
+        """
+        if not user_cancelled:
+            self.dispatcher.max_depth = int(values_dict.get("maxQueueDepth", MAX_DEPTH))
+            self.dispatcher.policy = values_dict.get("overflowPolicy", DROP_OLDEST)
+
+    def log_dispatch_stats(self: indigo.PluginBase) -> None:
+        """
+        This is called when the Log Dispatch Queue Statistics menu item is selected.
+
+        :return: None
+        """
+        stats: dict = self.dispatcher.stats()
+        if not stats:
+            self.logger.info("no broadcasts have been dispatched yet")
+            return
+        lines: list = [f"dispatch queues ({self.dispatcher.policy}, max depth {self.dispatcher.max_depth}):"]
+        for key, counts in sorted(stats.items()):
+            lines.append(
+                f"{key}: depth {counts['depth']} (high water {counts['highWater']}), handled {counts['handled']}, "
+                f"dropped {counts['dropped']}, coalesced {counts['coalesced']}"
+            )
+        self.logger.info("\n".join(lines))
+
+    def log_state(self: indigo.PluginBase) -> None:
+        """
+        This is called when the Log Mirrored State menu item is selected.
+
+        :return: None
+        """
+        state, version, synced = self.mirror.copy()
+        if version is None:
+            self.logger.info("we don't have the broadcaster's state yet")
+            return
+        lines: list = [f"the broadcaster's state, version {version}{'' if synced else ' (waiting for a resync)'}:"]
+        lines.extend(f"{key}: {value}" for key, value in sorted(state.items()))
+        self.logger.info("\n".join(lines))
+
+    def log_latency(self: indigo.PluginBase) -> None:
+        """
+        This is called when the Log Broadcast Latency menu item is selected.
+
+        :return: None
+        """
+        summaries: dict = self.latency.summaries()
+        if not summaries:
+            self.logger.info(
+                "no latencies recorded yet -- turn on \"Embed send times\" in the Example Custom Broadcaster's config"
+            )
+            return
+        lines: list = ["broadcast latency (milliseconds):"]
+        for key, summary in sorted(summaries.items()):
+            percentiles: str = ", ".join(f"p{percent} {summary[f'p{percent}']}" for percent in PERCENTILES)
+            lines.append(
+                f"{key}: {summary['count']} broadcasts, mean {summary['mean']}, {percentiles}, max {summary['max']}"
+            )
+        self.logger.info("\n".join(lines))
+
+    def get_latency(
+            self: indigo.PluginBase,
+            action: any,
+            dev: indigo.Device = None,
+            caller_waiting_for_result: bool = None
+    ) -> indigo.Dict:
+        """
+        This handler returns the broadcast latency percentiles, for scripts and other plugins:
+
+            plugin = indigo.server.getPlugin("com.example.indigoplugin.custom-subscriber")
+            reply = plugin.executeAction("get_latency", waitUntilDone=True)
+
+        :param action: unused
+        :param dev: unused
+        :param caller_waiting_for_result: this will be true if it's an API call
+        :return: a reply dict with a dict for each broadcast key: count, mean, max, and the percentiles (in
+            milliseconds)
+        """
+        reply_dict: indigo.Dict = indigo.Dict()
+        for key, summary in self.latency.summaries().items():
+            reply_dict[key] = indigo.Dict(summary)
+        return reply_dict
@@ -0,0 +1,123 @@
+####################
+# Copyright (c) 2026, Indigo Domotics. All rights reserved.
+# https://www.indigodomo.com
+"""
+Reassembles the large payloads that the Example Custom Broadcaster sends in chunks (see its chunking.py). Chunks are
+collected per message id until all of them have arrived; each chunk's CRC-32 is checked as it arrives and the CRC-32 of
+the whole payload is checked before it's decoded. A message whose chunks stop arriving for longer than the timeout is
+discarded, and so is the oldest incomplete message when too many are in progress at once.
+
+Chunks are added from the broadcast callbacks while expire() runs from the plugin's concurrent thread, so the buffer is
+guarded by a lock.
+"""
+import collections
+import json
+import threading
+import time
+import zlib
+
+# The number of seconds to wait for the next chunk of a message before giving up on it.
+TIMEOUT = 60.0
+# The maximum number of messages being reassembled at once.
+MAX_MESSAGES = 8
+# The number of discarded message ids to remember, so their remaining chunks are ignored rather than starting over.
+MAX_DROPPED = 64
+
+
+class ChunkError(Exception):
+    pass
+
+
+class PartialMessage:
+    def __init__(self, key: str, count: int, total_crc: int, now: float) -> None:
+        self.key: str = key
+        self.count: int = count
+        self.total_crc: int = total_crc
+        self.pieces: dict = {}  # part -> data
+        self.updated: float = now
+
+
+class ReassemblyBuffer:
+    def __init__(self, timeout: float = TIMEOUT, max_messages: int = MAX_MESSAGES) -> None:
+        """
+        :param timeout: the number of seconds to wait for the next chunk of a message
+        :param max_messages: the maximum number of messages being reassembled at once
+        """
+        self.timeout: float = timeout
+        self.max_messages: int = max_messages
+        self.lock: threading.Lock = threading.Lock()
+        self.messages: dict = {}  # message id -> PartialMessage, oldest first
+        self.dropped: collections.deque = collections.deque(maxlen=MAX_DROPPED)
+        self.completed: int = 0
+        self.discarded: int = 0
+
+    def add(self, chunk: dict, now: float = None) -> tuple:
+        """
+        Add a chunk.
+
+        :param chunk: the chunk dict as broadcast
+        :param now: the current time.monotonic() (mostly for testing)
+        :return: (key, payload) if this chunk completed its message, otherwise None
+        :raises ChunkError: if the chunk or the reassembled payload is corrupt - the message is discarded
+        """
+        now = time.monotonic() if now is None else now
+        message_id: str = chunk["id"]
+        data: str = chunk["data"]
+        chunk_ok: bool = zlib.crc32(data.encode("utf-8")) == chunk["crc"]
+        with self.lock:
+            message = self.messages.get(message_id)
+            if message is None:
+                if message_id in self.dropped:
+                    return None
+                if len(self.messages) >= self.max_messages:
+                    self._discard(next(iter(self.messages)))
+                message = PartialMessage(chunk["key"], chunk["count"], chunk["totalCrc"], now)
+                self.messages[message_id] = message
+            if not chunk_ok:
+                self._discard(message_id)
+                raise ChunkError(f"chunk {chunk['part'] + 1} of {chunk['count']} of {message.key} failed its checksum")
+            message.pieces[chunk["part"]] = data
+            message.updated = now
+            if len(message.pieces) < message.count:
+                return None
+            del self.messages[message_id]
+        # The message is complete and out of the buffer, so it's decoded without holding the lock.
+        text: str = "".join(message.pieces[part] for part in range(message.count))
+        if zlib.crc32(text.encode("utf-8")) != message.total_crc:
+            with self.lock:
+                self.discarded += 1
+            raise ChunkError(f"the reassembled {message.key} payload failed its checksum")
+        with self.lock:
+            self.completed += 1
+        return (message.key, json.loads(text))
+
+    def discard(self, message_id: str) -> None:
+        """
+        Give up on a message.
+
+        :param message_id: the message's id
+        :return: None
+        """
+        with self.lock:
+            self._discard(message_id)
+
+    def _discard(self, message_id: str) -> None:
+        if self.messages.pop(message_id, None) is not None:
+            self.dropped.append(message_id)
+            self.discarded += 1
+
+    def expire(self, now: float = None) -> list:
+        """
+        Discard the messages that haven't had a chunk for longer than the timeout.
+
+        :param now: the current time.monotonic() (mostly for testing)
+        :return: a list of (key, chunks received, chunk count) for the discarded messages
+        """
+        now = time.monotonic() if now is None else now
+        expired: list = []
+        with self.lock:
+            for message_id, message in list(self.messages.items()):
+                if now - message.updated > self.timeout:
+                    expired.append((message.key, len(message.pieces), message.count))
+                    self._discard(message_id)
+        return expired
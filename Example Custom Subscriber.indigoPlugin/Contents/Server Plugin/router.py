@@ -0,0 +1,134 @@
+####################
+# Copyright (c) 2026, Indigo Domotics. All rights reserved.
+# https://www.indigodomo.com
+"""
+Routes broadcast event keys to handlers by pattern. subscribeToBroadcast() only takes exact keys, so the broadcaster's
+events all arrive through one subscription (its batches and chunks) and a TopicRouter picks the handler for each one.
+Patterns match whole keys, with dots separating the parts of a key:
+
+    *       a whole part that's "*" matches any one part: "sensor.*.temperature" matches "sensor.kitchen.temperature"
+            but not "sensor.kitchen.probe.temperature"
+    **      a whole part that's "**" matches one or more parts: "sensor.**" matches every key that starts with "sensor."
+    color*  a "*" within a part matches anything within that part: "color*" matches "colorChanged"
+
+A key goes to the first pattern it matches, in the order they were added. compile() builds a trie of the patterns'
+parts - each node has its literal children in a dict, plus a "*" child, a "**" child, and the parts with a "*" within
+them in a dict by their literal prefix (the text before the first "*") - and records, at the node where each pattern
+ends, the index of the first pattern that ends there. Routing a key walks the trie one part at a time, so its cost
+depends on the key and on how many patterns overlap it, not on how many patterns there are.
+"""
+import re
+from typing import Callable
+
+WILDCARD = "*"
+MULTI_WILDCARD = "**"
+
+
+class TrieNode:
+    __slots__ = ("literal", "wildcard", "multi_wildcard", "globs", "prefix_lengths", "index")
+
+    def __init__(self) -> None:
+        self.literal: dict = {}  # part -> TrieNode
+        self.wildcard: TrieNode = None  # the "*" child
+        self.multi_wildcard: TrieNode = None  # the "**" child
+        self.globs: dict = {}  # literal prefix -> list of (compiled part pattern, TrieNode) for parts with a "*"
+        self.prefix_lengths: list = []  # the distinct lengths of the keys of globs
+        self.index: int = None  # the index of the first pattern that ends here
+
+    def child(self, part: str) -> "TrieNode":
+        """
+        :param part: one dot-separated part of a pattern
+        :return: the child node for the part, created if needed
+        """
+        if part == WILDCARD:
+            if self.wildcard is None:
+                self.wildcard = TrieNode()
+            return self.wildcard
+        if part == MULTI_WILDCARD:
+            if self.multi_wildcard is None:
+                self.multi_wildcard = TrieNode()
+            return self.multi_wildcard
+        if WILDCARD in part:
+            prefix: str = part[:part.index(WILDCARD)]
+            regex: str = "[^.]*".join(re.escape(piece) for piece in part.split(WILDCARD))
+            globs: list = self.globs.setdefault(prefix, [])
+            for compiled, node in globs:
+                if compiled.pattern == regex:
+                    return node
+            node = TrieNode()
+            globs.append((re.compile(regex), node))
+            if len(prefix) not in self.prefix_lengths:
+                self.prefix_lengths.append(len(prefix))
+            return node
+        return self.literal.setdefault(part, TrieNode())
+
+
+def best_match(node: TrieNode, parts: list, position: int) -> int:
+    """
+    :param node: the trie node reached after matching parts[:position]
+    :param parts: the key's dot-separated parts
+    :param position: the index of the next part to match
+    :return: the index of the first pattern that matches the rest of the key from this node, or None
+    """
+    if position == len(parts):
+        return node.index
+    best: int = None
+    part: str = parts[position]
+    candidates: list = [node.literal.get(part), node.wildcard]
+    for length in node.prefix_lengths:
+        for compiled, child in node.globs.get(part[:length], ()):
+            if compiled.fullmatch(part):
+                candidates.append(child)
+    for child in candidates:
+        if child is not None:
+            index = best_match(child, parts, position + 1)
+            if index is not None and (best is None or index < best):
+                best = index
+    if node.multi_wildcard is not None:
+        # "**" takes one or more parts.
+        for end in range(position + 1, len(parts) + 1):
+            index = best_match(node.multi_wildcard, parts, end)
+            if index is not None and (best is None or index < best):
+                best = index
+    return best
+
+
+class TopicRouter:
+    def __init__(self) -> None:
+        self.routes: list = []  # (pattern, handler), in the order they were added
+        self.root: TrieNode = None
+
+    def add(self, pattern: str, handler: Callable) -> None:
+        """
+        :param pattern: the key pattern
+        :param handler: what keys that match it are routed to
+        :return: None
+        """
+        self.routes.append((pattern, handler))
+        self.root = None
+
+    def compile(self) -> None:
+        """
+        Build the trie of the patterns. route() does this if needed, but it's best done once at startup, after adding
+        the patterns.
+
+        :return: None
+        """
+        root: TrieNode = TrieNode()
+        for index, (pattern, _) in enumerate(self.routes):
+            node: TrieNode = root
+            for part in pattern.split("."):
+                node = node.child(part)
+            if node.index is None:
+                node.index = index
+        self.root = root
+
+    def route(self, key: str) -> Callable:
+        """
+        :param key: the event key
+        :return: the handler for the first pattern that matches the key, or None
+        """
+        if self.root is None:
+            self.compile()
+        index = best_match(self.root, key.split("."), 0)
+        return None if index is None else self.routes[index][1]
@@ -0,0 +1,66 @@
+####################
+# Copyright (c) 2026, Indigo Domotics. All rights reserved.
+# https://www.indigodomo.com
+"""
+Detects missed broadcasts. The Example Custom Broadcaster stamps every batch and chunk with a per-key sequence number
+and an epoch (see its sequencing.py); a SequenceTracker remembers the last one seen for each key and classifies each new
+message as the next one, a duplicate (i.e. one we already got through a replay), or the first one after a gap. When the
+epoch changes the broadcaster has restarted and its numbering starts over, so that's not a gap.
+
+The tracker's state is saved in the plugin prefs at shutdown, so a gap that spans a restart of this plugin is detected
+too.
+"""
+NEXT = "next"
+DUPLICATE = "duplicate"
+GAP = "gap"
+
+
+class SequenceTracker:
+    def __init__(self, state: dict = None) -> None:
+        """
+        :param state: the state saved by state() - {key: [epoch, last sequence number]}
+        """
+        self.last: dict = {key: tuple(value) for key, value in (state or {}).items()}
+        self.gaps: int = 0
+        self.duplicates: int = 0
+
+    def observe(self, key: str, payload: dict) -> tuple:
+        """
+        Check a message's sequence number against the last one seen for its key, and remember it.
+
+        :param key: the broadcast key
+        :param payload: the stamped payload
+        :return: a tuple: (NEXT, DUPLICATE, or GAP; the last sequence number seen before this message, or 0)
+        """
+        epoch: str = payload.get("epoch")
+        seq: int = payload.get("seq", 0)
+        last_epoch, last_seq = self.last.get(key, (None, 0))
+        if epoch != last_epoch:
+            self.last[key] = (epoch, seq)
+            if last_epoch is not None and seq > 1:
+                # The broadcaster restarted and we missed the start of its new numbering.
+                self.gaps += 1
+                return (GAP, 0)
+            # The first message we've seen, or the first one of the broadcaster's new run.
+            return (NEXT, 0)
+        if seq <= last_seq:
+            self.duplicates += 1
+            return (DUPLICATE, last_seq)
+        self.last[key] = (epoch, seq)
+        if seq == last_seq + 1:
+            return (NEXT, last_seq)
+        self.gaps += 1
+        return (GAP, last_seq)
+
+    def epoch(self, key: str) -> str:
+        """
+        :param key: the broadcast key
+        :return: the epoch of the last message seen for the key
+        """
+        return self.last.get(key, (None, 0))[0]
+
+    def state(self) -> dict:
+        """
+        :return: the state to save, for SequenceTracker(state)
+        """
+        return {key: list(value) for key, value in self.last.items()}
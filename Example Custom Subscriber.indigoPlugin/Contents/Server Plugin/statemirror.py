@@ -0,0 +1,144 @@
+####################
+# Copyright (c) 2026, Indigo Domotics. All rights reserved.
+# https://www.indigodomo.com
+"""
+A local copy of the state dict the Example Custom Broadcaster shares (see its statesync.py). The mirror is loaded from
+a full snapshot, then kept current by applying each "stateDelta" broadcast - just the keys that changed - in version
+order.
+
+A delta can only be applied to the version right before it. Deltas that arrive before the mirror has its snapshot, or
+after one went missing (or from a broadcaster that restarted, which starts a new epoch), are held until the next
+snapshot is loaded; the snapshot replaces the mirror and the held deltas newer than it are applied on top. If the
+request for that snapshot fails (or nothing has arrived REQUEST_TIMEOUT seconds later), the next held delta asks for
+another one.
+
+Every applied delta, whether it arrived live or was held, is passed to the on_change callback while the mirror's lock
+is held, so the callback sees the changes in version order. merge_changes() combines the changes from consecutive
+deltas, for a callback that queues them and can't keep up.
+"""
+import threading
+import time
+from typing import Callable
+
+# apply() results:
+APPLIED = "applied"  # the delta was applied
+STALE = "stale"  # the mirror already includes the delta
+HELD = "held"  # the delta is waiting for a snapshot
+OUT_OF_SYNC = "outOfSync"  # the delta is waiting for a snapshot, and one should be requested
+# The maximum number of deltas held while waiting for a snapshot.
+MAX_HELD = 100
+# The number of seconds to wait for a requested snapshot before asking again.
+REQUEST_TIMEOUT = 30.0
+
+
+def merge_changes(first: tuple, second: tuple) -> tuple:
+    """
+    Combine the changes from two consecutive deltas into one set of changes with the same effect.
+
+    :param first: (changed, removed) from the earlier delta
+    :param second: (changed, removed) from the later delta
+    :return: (changed, removed)
+    """
+    first_changed, first_removed = first
+    second_changed, second_removed = second
+    changed: dict = {key: value for key, value in first_changed.items() if key not in second_removed}
+    changed.update(second_changed)
+    removed: list = [key for key in first_removed if key not in second_changed and key not in second_removed]
+    removed.extend(second_removed)
+    return (changed, removed)
+
+
+class StateMirror:
+    def __init__(self, on_change: Callable = None, max_held: int = MAX_HELD) -> None:
+        """
+        :param on_change: callable(changed, removed) called for every delta applied - it shouldn't block
+        :param max_held: the maximum number of deltas to hold while waiting for a snapshot
+        """
+        self.on_change: Callable = on_change
+        self.lock: threading.Lock = threading.Lock()
+        self.state: dict = {}
+        self.epoch: str = None
+        self.version: int = None  # None until the first snapshot is loaded
+        self.synced: bool = False
+        self.held: dict = {}  # (epoch, version) -> delta
+        self.requested: float = None  # the time.monotonic() a snapshot was asked for, if we're waiting for one
+        self.max_held: int = max_held
+        self.deltas_applied: int = 0
+        self.snapshots_loaded: int = 0
+
+    def load(self, snapshot: dict) -> int:
+        """
+        Replace the mirror with a snapshot, then apply any held deltas that follow it. A snapshot older than the
+        mirror (i.e. one that took a while to arrive in chunks) is ignored.
+
+        :param snapshot: {"epoch", "version", "state"}
+        :return: the number of held deltas that were applied - or None if the snapshot was ignored
+        """
+        with self.lock:
+            if self.synced and snapshot["epoch"] == self.epoch and snapshot["version"] <= self.version:
+                return None
+            self.state = dict(snapshot["state"])
+            self.epoch = snapshot["epoch"]
+            self.version = snapshot["version"]
+            self.synced = True
+            self.requested = None
+            self.snapshots_loaded += 1
+            applied: int = 0
+            for epoch, version in sorted(self.held):
+                if epoch == self.epoch and version == self.version + 1:
+                    self._apply(self.held[(epoch, version)])
+                    applied += 1
+            self.held = {}
+            return applied
+
+    def apply(self, delta: dict, now: float = None) -> str:
+        """
+        Apply a delta if it follows the mirror's version.
+
+        :param delta: {"epoch", "version", "changed", "removed"}
+        :param now: the current time.monotonic() (mostly for testing)
+        :return: APPLIED, STALE, HELD, or OUT_OF_SYNC (held, and a snapshot should be requested)
+        """
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            if self.synced and delta["epoch"] == self.epoch:
+                if delta["version"] <= self.version:
+                    return STALE
+                if delta["version"] == self.version + 1:
+                    self._apply(delta)
+                    return APPLIED
+            if len(self.held) < self.max_held:
+                self.held[(delta["epoch"], delta["version"])] = delta
+            self.synced = False
+            if self.requested is None or now - self.requested > REQUEST_TIMEOUT:
+                # We just lost track, have never had a snapshot, or the last request came to nothing: ask (again).
+                self.requested = now
+                return OUT_OF_SYNC
+            return HELD
+
+    def request_failed(self) -> None:
+        """
+        Note that asking for a snapshot failed, so the next held delta asks again.
+
+        :return: None
+        """
+        with self.lock:
+            self.requested = None
+
+    def _apply(self, delta: dict) -> None:
+        changed: dict = dict(delta.get("changed", {}))
+        removed: list = list(delta.get("removed", []))
+        self.state.update(changed)
+        for key in removed:
+            self.state.pop(key, None)
+        self.version = delta["version"]
+        self.deltas_applied += 1
+        if self.on_change is not None:
+            self.on_change(changed, removed)
+
+    def copy(self) -> tuple:
+        """
+        :return: a tuple: (a copy of the mirrored state, its version, True if it's current)
+        """
+        with self.lock:
+            return (dict(self.state), self.version, self.synced)
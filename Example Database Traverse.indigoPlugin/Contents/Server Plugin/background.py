@@ -0,0 +1,98 @@
+####################
+# Copyright (c) 2026, Indigo Domotics. All rights reserved.
+# https://www.indigodomo.com
+"""
+Logging the entire database of a large installation takes a while, and a menu callback that runs that long blocks the
+plugin from handling anything else. A BackgroundTraversal wraps the traversal as a generator that yields once per
+element, and the plugin's runConcurrentThread advances it a slice at a time: each slice processes elements until its
+time budget is used up, then the thread sleeps briefly so other callbacks get their turn. The traversal keeps its own
+report and name maps between slices, and can be cancelled at any slice boundary.
+"""
+import time
+from typing import Iterator
+
+from database import NameMaps
+from report import EventLogReport
+
+# The time budget for one slice, and how often progress is logged.
+SLICE_SECONDS = 0.05
+PROGRESS_INTERVAL = 5.0
+
+
+class BackgroundTraversal:
+    def __init__(
+            self,
+            name: str,
+            steps: Iterator,
+            total: int,
+            report: EventLogReport,
+            slice_seconds: float = SLICE_SECONDS
+    ) -> None:
+        """
+        :param name: the name of the traversal, used in progress messages
+        :param steps: a generator that does the work and yields once per element
+        :param total: the number of elements steps will yield for, used to compute progress
+        :param report: the report the traversal logs to
+        :param slice_seconds: the time budget for one slice
+        """
+        self.name: str = name
+        self.steps: Iterator = steps
+        self.total: int = total
+        self.report: EventLogReport = report
+        self.names: NameMaps = NameMaps()
+        self.slice_seconds: float = slice_seconds
+        self.processed: int = 0
+        self.slices: int = 0
+        self.finished: bool = False
+        self.cancelled: bool = False
+        self.last_progress: float = time.perf_counter()
+
+    def run_slice(self) -> bool:
+        """
+        Advance the traversal until the slice's time budget is used up or there's nothing left to do.
+
+        :return: True if there's more to do
+        """
+        if self.cancelled:
+            self.steps.close()
+            self.finished = True
+            return False
+        deadline: float = time.perf_counter() + self.slice_seconds
+        self.slices += 1
+        for _ in self.steps:
+            self.processed += 1
+            if time.perf_counter() >= deadline:
+                return True
+        self.finished = True
+        return False
+
+    def cancel(self) -> None:
+        """
+        Ask the traversal to stop. It stops at the start of the next slice.
+
+        :return: None
+        """
+        self.cancelled = True
+
+    @property
+    def progress(self) -> float:
+        """
+        :return: the fraction of the elements processed so far, from 0.0 to 1.0
+        """
+        return min(self.processed / self.total, 1.0) if self.total else 1.0
+
+    def progress_due(self) -> bool:
+        """
+        :return: True if it's been PROGRESS_INTERVAL seconds since progress was last reported
+        """
+        now: float = time.perf_counter()
+        if now - self.last_progress >= PROGRESS_INTERVAL:
+            self.last_progress = now
+            return True
+        return False
+
+    def status(self) -> str:
+        """
+        :return: a short description of how far along the traversal is
+        """
+        return f"{self.name}: {self.progress:.0%} ({self.processed} of {self.total} elements, {self.slices} slices)"
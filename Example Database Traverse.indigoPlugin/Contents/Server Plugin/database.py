@@ -0,0 +1,74 @@
+####################
+# Copyright (c) 2026, Indigo Domotics. All rights reserved.
+# https://www.indigodomo.com
+"""
+The Indigo object collections that the Database Traverse plugin walks, in the order they're traversed. Each entry is
+the name of the collection in the indigo module and the label used for one of its elements.
+"""
+try:
+    # This is primarily for IDEs - the indigo package is always included when a plugin is started.
+    import indigo
+except ImportError:
+    pass
+
+COLLECTIONS = [
+    ("devices", "device"),
+    ("triggers", "trigger"),
+    ("schedules", "schedule"),
+    ("actionGroups", "action group"),
+    ("controlPages", "control page"),
+    ("variables", "variable"),
+]
+
+# This is just a subset of supports* properties that a device can have.
+SUPPORTS_PROPERTIES = ["supportsColor", "supportsOnState", "supportsEnergyMeter", "supportsPowerMeter", "supportsStatusRequest"]
+
+
+def get_collection(name: str) -> any:
+    """
+    Look up an object collection by name.
+
+    :param name: the name of the collection in the indigo module (i.e. "actionGroups")
+    :return: the collection (i.e. indigo.actionGroups)
+    """
+    return getattr(indigo, name)
+
+
+class NameMaps:
+    """
+    Looking up a name with collection.getName() or folders.getName() is a request to the Indigo Server. Logging every
+    element's folder name and every trigger's device or variable name that way adds up quickly on a large database, so
+    a traversal uses one of these instead: the first lookup in a collection reads all of its names in a single pass and
+    every lookup after that is a dict lookup.
+    """
+    def __init__(self) -> None:
+        self.maps: dict = {}
+
+    def _lookup(self: "NameMaps", key: tuple, items: any, fallback: any, elem_id: int) -> str:
+        try:
+            names = self.maps[key]
+        except KeyError:
+            names = self.maps[key] = {item.id: item.name for item in items}
+        try:
+            return names[elem_id]
+        except KeyError:
+            # Probably created since the map was built - ask the server like we used to.
+            return fallback(elem_id)
+
+    def name(self: "NameMaps", collection_name: str, elem_id: int) -> str:
+        """
+        :param collection_name: the name of the collection (i.e. "devices")
+        :param elem_id: the id of the element
+        :return: the element's name
+        """
+        collection = get_collection(collection_name)
+        return self._lookup((collection_name, "elements"), collection, collection.getName, elem_id)
+
+    def folder_name(self: "NameMaps", collection_name: str, folder_id: int) -> str:
+        """
+        :param collection_name: the name of the collection the folder belongs to (i.e. "devices")
+        :param folder_id: the id of the folder
+        :return: the folder's name
+        """
+        folders = get_collection(collection_name).folders
+        return self._lookup((collection_name, "folders"), folders, folders.getName, folder_id)
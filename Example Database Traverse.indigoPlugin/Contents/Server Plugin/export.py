@@ -0,0 +1,199 @@
+####################
+# Copyright (c) 2026, Indigo Domotics. All rights reserved.
+# https://www.indigodomo.com
+"""
+Export the Indigo object database to a file for offline analysis. Elements are read one at a time and written as they
+are read, so memory use doesn't depend on the size of the database:
+
+    NdjsonWriter: one JSON object per line (newline-delimited JSON)
+    SqliteWriter: one table per collection (plus a folders table), indexed on id, folder, and type. Rows are inserted in
+                  batches of BATCH_SIZE, each batch in its own transaction.
+
+Every record has the same shape: the collection name, whether it's an element or a folder, the id, name, folder id,
+and class name, and the full dict(elem) as "props".
+"""
+try:
+    # This is primarily for IDEs - the indigo package is always included when a plugin is started.
+    import indigo
+except ImportError:
+    pass
+
+import hashlib
+import json
+import os
+import sqlite3
+from typing import Iterator
+
+from database import COLLECTIONS, get_collection
+
+BATCH_SIZE = 500
+
+
+def folder_record(collection_name: str, folder: any) -> dict:
+    """
+    :param collection_name: the name of the collection the folder belongs to
+    :param folder: an indigo.Folder instance
+    :return: the export record for the folder
+    """
+    return {
+        "collection": collection_name,
+        "kind": "folder",
+        "id": folder.id,
+        "name": folder.name,
+        "folderId": 0,
+        "type": folder.__class__.__name__,
+        "props": {"description": folder.description, "remoteDisplay": folder.remoteDisplay},
+    }
+
+
+def element_record(collection_name: str, elem: any) -> dict:
+    """
+    :param collection_name: the name of the collection the element belongs to
+    :param elem: an Indigo object instance: device, trigger, action group, etc.
+    :return: the export record for the element
+    """
+    return {
+        "collection": collection_name,
+        "kind": "element",
+        "id": elem.id,
+        "name": elem.name,
+        "folderId": elem.folderId,
+        "type": elem.__class__.__name__,
+        "props": dict(elem),
+    }
+
+
+def iter_records() -> Iterator[dict]:
+    """
+    Walk the whole database, yielding each collection's folders and then its elements.
+
+    :return: a generator of export records
+    """
+    for collection_name, _ in COLLECTIONS:
+        collection = get_collection(collection_name)
+        for folder in collection.folders:
+            yield folder_record(collection_name, folder)
+        for elem in collection:
+            yield element_record(collection_name, elem)
+
+
+def to_json(obj: any, sort_keys: bool = False) -> str:
+    """
+    :param obj: the object to encode
+    :param sort_keys: sort dict keys, for output that only depends on the content
+    :return: compact JSON for obj, with dates in ISO format
+    """
+    return json.dumps(obj, separators=(",", ":"), sort_keys=sort_keys, cls=indigo.utils.JSONDateEncoder)
+
+
+def element_digest(props: dict) -> str:
+    """
+    A stable fingerprint of an element's properties: two elements have the same digest if and only if dict(elem) has
+    the same content (in practice - it's a SHA-1 hash).
+
+    :param props: dict(elem)
+    :return: the hex digest
+    """
+    return hashlib.sha1(to_json(props, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class NdjsonWriter:
+    def __init__(self, path: str) -> None:
+        """
+        :param path: the path of the file to create (or replace)
+        """
+        self.path: str = path
+        self.count: int = 0
+        self.file = None
+
+    def __enter__(self) -> "NdjsonWriter":
+        self.file = open(self.path, "w", encoding="utf-8")
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.file.close()
+
+    def write(self, record: dict) -> None:
+        """
+        :param record: the export record to write
+        :return: None
+        """
+        self.file.write(to_json(record))
+        self.file.write("\n")
+        self.count += 1
+
+
+class SqliteWriter:
+    def __init__(self, path: str, batch_size: int = BATCH_SIZE) -> None:
+        """
+        :param path: the path of the database file to create (an existing file is replaced)
+        :param batch_size: the number of rows to insert per transaction
+        """
+        self.path: str = path
+        self.batch_size: int = batch_size
+        self.count: int = 0
+        self.connection: sqlite3.Connection = None
+        self.pending: dict = {}  # table name -> list of rows waiting to be inserted
+        self.pending_count: int = 0
+
+    def __enter__(self) -> "SqliteWriter":
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.connection = sqlite3.connect(self.path)
+        # The file is rebuilt from scratch on every export, so there's nothing to protect with a journal
+        self.connection.execute("PRAGMA journal_mode = OFF")
+        self.connection.execute("PRAGMA synchronous = OFF")
+        self.connection.execute(
+            "CREATE TABLE folders (collection TEXT, id INTEGER, name TEXT, data TEXT, PRIMARY KEY (collection, id))"
+        )
+        for collection_name, _ in COLLECTIONS:
+            self.connection.execute(
+                f"CREATE TABLE {collection_name} "
+                f"(id INTEGER PRIMARY KEY, name TEXT, folder_id INTEGER, type TEXT, data TEXT)"
+            )
+        self.connection.commit()
+        return self
+
+    def __exit__(self, exc_type: any, *exc_info) -> None:
+        try:
+            if exc_type is None:
+                self.flush()
+                # Building the indexes once the rows are in is much faster than maintaining them on every insert
+                for collection_name, _ in COLLECTIONS:
+                    self.connection.execute(
+                        f"CREATE INDEX {collection_name}_folder_id ON {collection_name} (folder_id)"
+                    )
+                    self.connection.execute(f"CREATE INDEX {collection_name}_type ON {collection_name} (type)")
+                self.connection.commit()
+        finally:
+            self.connection.close()
+
+    def write(self, record: dict) -> None:
+        """
+        :param record: the export record to write
+        :return: None
+        """
+        if record["kind"] == "folder":
+            table = "folders"
+            row = (record["collection"], record["id"], record["name"], to_json(record["props"]))
+        else:
+            table = record["collection"]
+            row = (record["id"], record["name"], record["folderId"], record["type"], to_json(record["props"]))
+        self.pending.setdefault(table, []).append(row)
+        self.pending_count += 1
+        self.count += 1
+        if self.pending_count >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Insert the pending rows in a single transaction.
+
+        :return: None
+        """
+        with self.connection:
+            for table, rows in self.pending.items():
+                placeholders = ", ".join("?" * len(rows[0]))
+                self.connection.executemany(f"INSERT INTO {table} VALUES ({placeholders})", rows)
+        self.pending = {}
+        self.pending_count = 0
@@ -7,9 +7,54 @@ try:
 except ImportError:
     pass
 
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+import export
+import snapshot
+from background import BackgroundTraversal
+from database import COLLECTIONS, SUPPORTS_PROPERTIES, NameMaps, get_collection
+from query import DeviceIndex, QueryError, parse_query
+from references import ReferenceIndex, SOURCE_COLLECTIONS
+from report import EventLogReport
+from stats import DatabaseStats, age_bucket_labels
+from timeline import ScheduleTimeline
+from watermarks import Watermarks
+
 DIVIDER_WIDTH = 50  # used to determine the width of the section/element dividers in the event log
 LABEL_WIDTH = 16  # used to right-justify element labels
 
+# The specialized logging methods for devices and triggers, as (indigo class name, method name) pairs. An element is
+# logged by the method for the first class it's an instance of, so subclasses must come before their base classes
+# (DimmerDevice before RelayDevice).
+DEVICE_LOGGERS = [
+    ("DimmerDevice", "log_device_dimmer"),
+    ("RelayDevice", "log_device_relay"),
+    ("SensorDevice", "log_device_sensor"),
+    ("MultiIODevice", "log_device_multi_io"),
+    ("SprinklerDevice", "log_device_sprinkler"),
+    ("ThermostatDevice", "log_device_thermostat"),
+]
+# The method used to log an element of each collection.
+ELEMENT_LOGGERS = {
+    "devices": "log_device",
+    "triggers": "log_trigger",
+    "schedules": "log_schedule",
+    "actionGroups": "log_action_group",
+    "controlPages": "log_control_page",
+    "variables": "log_variable",
+}
+TRIGGER_LOGGERS = [
+    ("DeviceStateChangeTrigger", "log_trigger_device_state"),
+    ("VariableValueChangeTrigger", "log_trigger_variable_value"),
+    ("InsteonCommandReceivedTrigger", "log_trigger_insteon_command"),
+    ("X10CommandReceivedTrigger", "log_trigger_x10_command"),
+    ("EmailReceivedTrigger", "log_trigger_email_received"),
+]
+
 ################################################################################
 class Plugin(indigo.PluginBase):
     ########################################
@@ -33,9 +78,185 @@ class Plugin(indigo.PluginBase):
         """
         super().__init__(plugin_id, plugin_display_name, plugin_version, plugin_prefs, **kwargs)
         self.debug: bool = True
+        self.report: EventLogReport = None
+        self.names: NameMaps = None
+        # Held while a traversal (or one slice of the background traversal) is logging, since menu items and the
+        # concurrent thread run on different threads and share self.report and self.names.
+        self.traversal_lock: threading.RLock = threading.RLock()
+        self.background: BackgroundTraversal = None
+        # Caches of the logging method (and for devices, the supports* properties) for each concrete element class -
+        # see resolve_device_logger() and resolve_trigger_logger().
+        self.device_loggers: dict = {}
+        self.trigger_loggers: dict = {}
+        # Which triggers, schedules, and action groups reference each device and variable. It's built the first time
+        # it's needed and then kept up to date from the change callbacks below.
+        self.references: ReferenceIndex = ReferenceIndex()
+        # Secondary indexes over device attributes for the query action, built and maintained the same way.
+        self.device_index: DeviceIndex = DeviceIndex()
+        # A min-heap of upcoming schedule executions, also built on first use and maintained from the callbacks.
+        self.timeline: ScheduleTimeline = ScheduleTimeline()
+
+    ########################################
+    def startup(self: indigo.PluginBase) -> None:
+        """
+        Any logic needed at startup, but after __init__ is called.
+
+        :return: None
+        """
+        self.logger.debug("startup called -- subscribing to device, trigger, schedule, and action group changes")
+        indigo.devices.subscribeToChanges()
+        indigo.triggers.subscribeToChanges()
+        indigo.schedules.subscribeToChanges()
+        indigo.actionGroups.subscribeToChanges()
+
+    ########################################
+    def runConcurrentThread(self: indigo.PluginBase) -> None:
+        """
+        Runs the background traversal started by the Log Entire Database menu item a slice at a time, sleeping briefly
+        between slices so the plugin keeps handling its other callbacks.
+
+        :return: None
+        """
+        try:
+            while True:
+                if self.background is None:
+                    self.sleep(1)
+                else:
+                    self.run_background_slice()
+                    self.sleep(0.01)
+        except self.StopThread:
+            pass
+
+    ########################################
+    # Change callbacks (see the subscribeToChanges() calls in startup). You must call the superclass method.
+    ####################
+    def deviceCreated(self: indigo.PluginBase, dev: indigo.Device) -> None:
+        super().deviceCreated(dev)
+        self.element_changed("devices", dev)
+
+    def deviceUpdated(self: indigo.PluginBase, orig_dev: indigo.Device, new_dev: indigo.Device) -> None:
+        super().deviceUpdated(orig_dev, new_dev)
+        self.element_changed("devices", new_dev)
+
+    def deviceDeleted(self: indigo.PluginBase, dev: indigo.Device) -> None:
+        super().deviceDeleted(dev)
+        self.element_deleted("devices", dev)
+
+    def triggerCreated(self: indigo.PluginBase, trigger: indigo.Trigger) -> None:
+        super().triggerCreated(trigger)
+        self.element_changed("triggers", trigger)
+
+    def triggerUpdated(self: indigo.PluginBase, orig_trigger: indigo.Trigger, new_trigger: indigo.Trigger) -> None:
+        super().triggerUpdated(orig_trigger, new_trigger)
+        self.element_changed("triggers", new_trigger)
+
+    def triggerDeleted(self: indigo.PluginBase, trigger: indigo.Trigger) -> None:
+        super().triggerDeleted(trigger)
+        self.element_deleted("triggers", trigger)
+
+    def scheduleCreated(self: indigo.PluginBase, schedule: indigo.Schedule) -> None:
+        super().scheduleCreated(schedule)
+        self.element_changed("schedules", schedule)
+
+    def scheduleUpdated(self: indigo.PluginBase, orig_schedule: indigo.Schedule, new_schedule: indigo.Schedule) -> None:
+        super().scheduleUpdated(orig_schedule, new_schedule)
+        self.element_changed("schedules", new_schedule)
+
+    def scheduleDeleted(self: indigo.PluginBase, schedule: indigo.Schedule) -> None:
+        super().scheduleDeleted(schedule)
+        self.element_deleted("schedules", schedule)
+
+    def actionGroupCreated(self: indigo.PluginBase, action_group: indigo.ActionGroup) -> None:
+        super().actionGroupCreated(action_group)
+        self.element_changed("actionGroups", action_group)
+
+    def actionGroupUpdated(
+            self: indigo.PluginBase,
+            orig_action_group: indigo.ActionGroup,
+            new_action_group: indigo.ActionGroup
+    ) -> None:
+        super().actionGroupUpdated(orig_action_group, new_action_group)
+        self.element_changed("actionGroups", new_action_group)
+
+    def actionGroupDeleted(self: indigo.PluginBase, action_group: indigo.ActionGroup) -> None:
+        super().actionGroupDeleted(action_group)
+        self.element_deleted("actionGroups", action_group)
+
+    def element_changed(self: indigo.PluginBase, collection_name: str, elem: any) -> None:
+        """
+        Bring the indexes up to date after an element was created or updated.
+
+        :param collection_name: the name of the element's collection
+        :param elem: the element as it is now
+        :return: None
+        """
+        if collection_name == "devices":
+            if self.device_index.built:
+                self.device_index.update(elem)
+            return
+        if self.references.built:
+            self.references.update(collection_name, elem)
+        if collection_name == "schedules" and self.timeline.built:
+            self.timeline.update(elem)
+
+    def element_deleted(self: indigo.PluginBase, collection_name: str, elem: any) -> None:
+        """
+        Remove a deleted element from the indexes.
+
+        :param collection_name: the name of the element's collection
+        :param elem: the element that was deleted
+        :return: None
+        """
+        if collection_name == "devices":
+            if self.device_index.built:
+                self.device_index.remove(elem.id)
+            return
+        if self.references.built:
+            self.references.remove(collection_name, elem.id)
+        if collection_name == "schedules" and self.timeline.built:
+            self.timeline.remove(elem.id)
+
+    ########################################
+    @contextmanager
+    def traversal(self: indigo.PluginBase) -> EventLogReport:
+        """
+        Context manager that wraps a traversal: everything logged inside it is collected into an EventLogReport and sent
+        to the Event Log in a few large records rather than one record per line, and folder, device, and variable names
+        are looked up in NameMaps built once for the traversal rather than asking the server for every element. If a
+        traversal is already running on this thread, it's shared; a traversal on another thread waits for it (at most
+        one slice, for the background traversal).
+
+        :return: the EventLogReport for the traversal
+        """
+        with self.traversal_lock:
+            if self.report is not None:
+                yield self.report
+                return
+            self.report = EventLogReport(self.logger)
+            self.names = NameMaps()
+            try:
+                yield self.report
+            finally:
+                self.report.flush()
+                self.logger.debug(self.report.summary())
+                self.report = None
+                self.names = None
+
     ########################################
     # IOM logging methods
     ####################
+    def log_line(self: indigo.PluginBase, line: str) -> None:
+        """
+        Add a line to the current traversal's report, or log it right away if there isn't one.
+
+        :param line: the line to log
+        :return: None
+        """
+        if self.report is not None:
+            self.report.add(line)
+        else:
+            self.logger.info(line)
+
     def log_elem_divider(self: indigo.PluginBase, character: str = "-") -> None:
         """
         Clever way of generating a section divider, something like:
@@ -44,7 +265,10 @@ class Plugin(indigo.PluginBase):
         :param character: the character to use for the divider, default to dash.
         :return: None
         """
-        self.logger.info("".join([character for x in range(DIVIDER_WIDTH)]))
+        # A divider starts a new block, so this is a good place to send what we have so far if it's big enough.
+        if self.report is not None:
+            self.report.end_block()
+        self.log_line("".join([character for x in range(DIVIDER_WIDTH)]))
 
     def log_list_divider(self: indigo.PluginBase, section_name: str) -> None:
         """
@@ -54,7 +278,7 @@ class Plugin(indigo.PluginBase):
         :return: None
         """
         self.log_elem_divider("=")
-        self.logger.info(section_name)
+        self.log_line(section_name)
         self.log_elem_divider()
 
     def log_element(self: indigo.PluginBase, label: str, value: any) -> None:
@@ -65,21 +289,21 @@ class Plugin(indigo.PluginBase):
         :param value: the value to use for this log line
         :return: None
         """
-        self.logger.info(f"{label.upper() : >{LABEL_WIDTH}}:  {value}")
+        self.log_line(f"{label.upper() : >{LABEL_WIDTH}}:  {value}")
 
-    def log_base_elem(self: indigo.PluginBase, elem: any, folders: indigo.List) -> None:
+    def log_base_elem(self: indigo.PluginBase, elem: any, collection_name: str) -> None:
         """
         Method to log a common parts of an element.
 
         :param elem: an Indigo object instance: device, trigger, action group, etc.
-        :param folders: the list of folders available for instance type
-        :return: Non e
+        :param collection_name: the name of the element's collection (i.e. "devices"), used to look up its folder
+        :return: None
         """
         self.log_element("instance", elem.__class__.__name__)
         if len(elem.description) > 0:
             self.log_element("description", elem.description)
-        if folders and elem.folderId != 0:
-            self.log_element("in folder", folders.getName(elem.folderId))
+        if elem.folderId != 0:
+            self.log_element("in folder", self.names.folder_name(collection_name, elem.folderId))
         self.log_element("remote display", elem.remoteDisplay)
 
     def log_base_folder(self: indigo.PluginBase, elem: any) -> None:
@@ -101,7 +325,7 @@ class Plugin(indigo.PluginBase):
         :param elem: a device instance
         :return: None
         """
-        self.log_base_elem(elem, indigo.devices.folders)
+        self.log_base_elem(elem, "devices")
         self.log_element("protocol", elem.protocol)
         self.log_element("model name", elem.model)
         self.log_element("address", (elem.address or "--"))
@@ -109,13 +333,10 @@ class Plugin(indigo.PluginBase):
             self.log_element("button count", elem.buttonGroupCount)
         self.log_element("last changed", elem.lastChanged)
 
-        supported_props: list = []
-        # This is just a subset of supports* properties that a device can have.
-        property_list = ["supportsColor", "supportsOnState", "supportsEnergyMeter", "supportsPowerMeter", "supportsStatusRequest"]
-        for property in property_list:
-            supports_property = getattr(elem, property, False)
-            if supports_property:
-                supported_props.append(property)
+        # Only the supports* properties this class actually has are checked (see resolve_device_logger()).
+        supported_props: list = [
+            property for property in self.resolve_device_logger(elem.__class__)[1] if getattr(elem, property)
+        ]
         if len(supported_props) == 0:
             supports = "--"
         else:
@@ -216,6 +437,28 @@ class Plugin(indigo.PluginBase):
         self.log_element("fan is on", elem.fanIsOn)
 
     ####################
+    def resolve_device_logger(self: indigo.PluginBase, cls: type) -> tuple:
+        """
+        Find the logging method for a device class and the supports* properties the class has. The answer is worked out
+        the first time a class is seen and cached, so the cost of logging a device doesn't depend on how many device
+        types we check.
+
+        :param cls: the device's class
+        :return: a tuple: (logging method, list of supports* property names)
+        """
+        try:
+            return self.device_loggers[cls]
+        except KeyError:
+            pass
+        method = self.log_device_base
+        for class_name, method_name in DEVICE_LOGGERS:
+            if issubclass(cls, getattr(indigo, class_name)):
+                method = getattr(self, method_name)
+                break
+        supports: list = [property for property in SUPPORTS_PROPERTIES if hasattr(cls, property)]
+        self.device_loggers[cls] = (method, supports)
+        return self.device_loggers[cls]
+
     def log_device(self: indigo.PluginBase, elem: any) -> None:
         """
         Method to log device details based on the device type
@@ -223,24 +466,11 @@ class Plugin(indigo.PluginBase):
         :param elem: indigo device instance
         :return: None
         """
-        if isinstance(elem, indigo.DimmerDevice):
-            self.log_device_dimmer(elem)
-        elif isinstance(elem, indigo.RelayDevice):
-            self.log_device_relay(elem)
-        elif isinstance(elem, indigo.SensorDevice):
-            self.log_device_sensor(elem)
-        elif isinstance(elem, indigo.MultiIODevice):
-            self.log_device_multi_io(elem)
-        elif isinstance(elem, indigo.SprinklerDevice):
-            self.log_device_sprinkler(elem)
-        elif isinstance(elem, indigo.ThermostatDevice):
-            self.log_device_thermostat(elem)
-        else:
-            self.log_device_base(elem)
+        self.resolve_device_logger(elem.__class__)[0](elem)
 
     ########################################
-    def log_event_base(self: indigo.PluginBase, elem: any, folders) -> None:
-        self.log_base_elem(elem, folders)
+    def log_event_base(self: indigo.PluginBase, elem: any, collection_name: str) -> None:
+        self.log_base_elem(elem, collection_name)
         self.log_element("enabled", elem.enabled)
         self.log_element("upload", elem.upload)
         if elem.suppressLogging:
@@ -248,48 +478,75 @@ class Plugin(indigo.PluginBase):
         # TODO: Need to add conditional tree and action list traversal here.
 
     ####################
+    def resolve_trigger_logger(self: indigo.PluginBase, cls: type) -> any:
+        """
+        Find the logging method for the type-specific details of a trigger class, cached per class like
+        resolve_device_logger().
+
+        :param cls: the trigger's class
+        :return: the logging method, or None if there are no type-specific details to log
+        """
+        try:
+            return self.trigger_loggers[cls]
+        except KeyError:
+            pass
+        method = None
+        for class_name, method_name in TRIGGER_LOGGERS:
+            if issubclass(cls, getattr(indigo, class_name)):
+                method = getattr(self, method_name)
+                break
+        self.trigger_loggers[cls] = method
+        return method
+
     def log_trigger(self: indigo.PluginBase, elem: any) -> None:
-        self.log_event_base(elem, indigo.triggers.folders)
-
-        if isinstance(elem, indigo.DeviceStateChangeTrigger):
-            self.log_element("device", indigo.devices.getName(elem.deviceId))
-            self.log_element("change type", elem.stateChangeType)
-            self.log_element("selector key", elem.stateSelector)
-            if elem.stateSelectorIndex > 0:
-                self.log_element("selector index", elem.stateSelectorIndex)
-            if len(elem.stateValue) > 0:
-                self.log_element("state value", elem.stateValue)
-        elif isinstance(elem, indigo.VariableValueChangeTrigger):
-            self.log_element("variable", indigo.variables.getName(elem.variableId))
-            self.log_element("change type", elem.variableChangeType)
-            if len(elem.variableValue) > 0:
-                self.log_element("variable value", elem.variableValue)
-        elif isinstance(elem, indigo.InsteonCommandReceivedTrigger):
-            self.log_element("insteon command", elem.command)
-            self.log_element("source type", elem.commandSourceType)
-            self.logger.info(f"     SOURCE TYPE:  {elem.commandSourceType}")
-            if elem.commandSourceType == indigo.kDeviceSourceType.DeviceId:
-                self.log_element("device", indigo.devices.getName(elem.deviceId))
-                self.log_element("group num", elem.buttonOrGroup)
-            self.logger.info(f"       GROUP NUM:  {elem.buttonOrGroup}")
-        elif isinstance(elem, indigo.X10CommandReceivedTrigger):
-            self.log_element("X10 command", elem.command)
-            self.log_element("source type", elem.commandSourceType)
-            if elem.commandSourceType == indigo.kDeviceSourceType.DeviceId:
-                self.log_element("device", indigo.devices.getName(elem.deviceId))
-            elif elem.commandSourceType == indigo.kDeviceSourceType.RawAddress:
-                self.log_element("address", elem.address)
-            elif elem.command == indigo.kX10Cmd.AvButtonPressed:
-                self.log_element("a/v button", elem.avButton)
-        elif isinstance(elem, indigo.EmailReceivedTrigger):
-            self.log_element("email filter", elem.emailFilter)
-            if elem.emailFilter == indigo.kEmailFilter.MatchEmailFields:
-                self.log_element("from filter", elem.emailFrom)
-                self.log_element("subject filter", elem.emailSubject)
+        self.log_event_base(elem, "triggers")
+        method = self.resolve_trigger_logger(elem.__class__)
+        if method:
+            method(elem)
+
+    def log_trigger_device_state(self: indigo.PluginBase, elem: any) -> None:
+        self.log_element("device", self.names.name("devices", elem.deviceId))
+        self.log_element("change type", elem.stateChangeType)
+        self.log_element("selector key", elem.stateSelector)
+        if elem.stateSelectorIndex > 0:
+            self.log_element("selector index", elem.stateSelectorIndex)
+        if len(elem.stateValue) > 0:
+            self.log_element("state value", elem.stateValue)
+
+    def log_trigger_variable_value(self: indigo.PluginBase, elem: any) -> None:
+        self.log_element("variable", self.names.name("variables", elem.variableId))
+        self.log_element("change type", elem.variableChangeType)
+        if len(elem.variableValue) > 0:
+            self.log_element("variable value", elem.variableValue)
+
+    def log_trigger_insteon_command(self: indigo.PluginBase, elem: any) -> None:
+        self.log_element("insteon command", elem.command)
+        self.log_element("source type", elem.commandSourceType)
+        self.log_line(f"     SOURCE TYPE:  {elem.commandSourceType}")
+        if elem.commandSourceType == indigo.kDeviceSourceType.DeviceId:
+            self.log_element("device", self.names.name("devices", elem.deviceId))
+            self.log_element("group num", elem.buttonOrGroup)
+        self.log_line(f"       GROUP NUM:  {elem.buttonOrGroup}")
+
+    def log_trigger_x10_command(self: indigo.PluginBase, elem: any) -> None:
+        self.log_element("X10 command", elem.command)
+        self.log_element("source type", elem.commandSourceType)
+        if elem.commandSourceType == indigo.kDeviceSourceType.DeviceId:
+            self.log_element("device", self.names.name("devices", elem.deviceId))
+        elif elem.commandSourceType == indigo.kDeviceSourceType.RawAddress:
+            self.log_element("address", elem.address)
+        elif elem.command == indigo.kX10Cmd.AvButtonPressed:
+            self.log_element("a/v button", elem.avButton)
+
+    def log_trigger_email_received(self: indigo.PluginBase, elem: any) -> None:
+        self.log_element("email filter", elem.emailFilter)
+        if elem.emailFilter == indigo.kEmailFilter.MatchEmailFields:
+            self.log_element("from filter", elem.emailFrom)
+            self.log_element("subject filter", elem.emailSubject)
 
     ####################
     def log_schedule(self: indigo.PluginBase, elem: any) -> None:
-        self.log_event_base(elem, indigo.schedules.folders)
+        self.log_event_base(elem, "schedules")
         self.log_element("date type", elem.dateType)
         self.log_element("time type", elem.timeType)
         if elem.dateType == indigo.kDateType.Absolute and elem.timeType == indigo.kTimeType.Absolute:
@@ -310,12 +567,12 @@ class Plugin(indigo.PluginBase):
 
     ####################
     def log_action_group(self: indigo.PluginBase, elem: any):
-        self.log_base_elem(elem, indigo.actionGroups.folders)
+        self.log_base_elem(elem, "actionGroups")
         # TODO: Need to add action list traversal here.
 
     ####################
     def log_control_page(self: indigo.PluginBase, elem: any) -> None:
-        self.log_base_elem(elem, indigo.controlPages.folders)
+        self.log_base_elem(elem, "controlPages")
         self.log_element("hide tab bar", elem.hideTabBar)
         if len(elem.backgroundImage) > 0:
             self.log_element("background image", elem.backgroundImage)
@@ -324,7 +581,7 @@ class Plugin(indigo.PluginBase):
 
     ####################
     def log_variable(self: indigo.PluginBase, elem: any) -> None:
-        self.log_base_elem(elem, indigo.variables.folders)
+        self.log_base_elem(elem, "variables")
         self.log_element("value", elem.value)
         if elem.readOnly:
             self.log_element("read only", "True")
@@ -338,14 +595,7 @@ class Plugin(indigo.PluginBase):
 
         :return: None
         """
-        self.log_list_divider("DEVICES")
-        for folder in indigo.devices.folders:
-            self.log_element("folder", folder.name)
-            self.log_base_folder(folder)
-        for elem in indigo.devices:
-            self.log_elem_divider()
-            self.log_element("device", elem.name)
-            self.log_device(elem)
+        self.traverse_collection("devices")
 
     def traverse_triggers(self: indigo.PluginBase) -> None:
         """
@@ -353,14 +603,7 @@ class Plugin(indigo.PluginBase):
 
         :return: None
         """
-        self.log_list_divider("TRIGGERS")
-        for folder in indigo.triggers.folders:
-            self.log_element("folder", folder.name)
-            self.log_base_folder(folder)
-        for elem in indigo.triggers:
-            self.log_elem_divider()
-            self.log_element("trigger", elem.name)
-            self.log_trigger(elem)
+        self.traverse_collection("triggers")
 
     def traverse_schedules(self: indigo.PluginBase) -> None:
         """
@@ -368,14 +611,7 @@ class Plugin(indigo.PluginBase):
 
         :return: None
         """
-        self.log_list_divider("SCHEDULES")
-        for folder in indigo.schedules.folders:
-            self.log_element("folder", folder.name)
-            self.log_base_folder(folder)
-        for elem in indigo.schedules:
-            self.log_elem_divider()
-            self.log_element("schedule", elem.name)
-            self.log_schedule(elem)
+        self.traverse_collection("schedules")
 
     def traverse_action_groups(self: indigo.PluginBase) -> None:
         """
@@ -383,14 +619,7 @@ class Plugin(indigo.PluginBase):
 
         :return: None
         """
-        self.log_list_divider("ACTION GROUPS")
-        for folder in indigo.actionGroups.folders:
-            self.log_element("folder", folder.name)
-            self.log_base_folder(folder)
-        for elem in indigo.actionGroups:
-            self.log_elem_divider()
-            self.log_element("action group", elem.name)
-            self.log_action_group(elem)
+        self.traverse_collection("actionGroups")
 
     def traverse_control_pages(self: indigo.PluginBase) -> None:
         """
@@ -398,14 +627,7 @@ class Plugin(indigo.PluginBase):
 
         :return: None
         """
-        self.log_list_divider("CONTROL PAGES")
-        for folder in indigo.controlPages.folders:
-            self.log_element("folder", folder.name)
-            self.log_base_folder(folder)
-        for elem in indigo.controlPages:
-            self.log_elem_divider()
-            self.log_element("control page", elem.name)
-            self.log_control_page(elem)
+        self.traverse_collection("controlPages")
 
     def traverse_variables(self: indigo.PluginBase) -> None:
         """
@@ -413,25 +635,555 @@ class Plugin(indigo.PluginBase):
 
         :return: None
         """
-        self.log_list_divider("VARIABLES")
-        for folder in indigo.variables.folders:
+        self.traverse_collection("variables")
+
+    def traverse_collection(self: indigo.PluginBase, collection_name: str) -> None:
+        """
+        Log every folder and element in a collection.
+
+        :param collection_name: the name of the collection (i.e. "devices")
+        :return: None
+        """
+        with self.traversal():
+            for _ in self.iter_collection(collection_name):
+                pass
+
+    def iter_collection(self: indigo.PluginBase, collection_name: str) -> Iterator:
+        """
+        Log every folder and element in a collection to the current traversal, yielding after each one so a
+        background traversal can stop between elements.
+
+        :param collection_name: the name of the collection (i.e. "devices")
+        :return: a generator that yields once per folder and element
+        """
+        label: str = dict(COLLECTIONS)[collection_name]
+        collection = get_collection(collection_name)
+        log_method = getattr(self, ELEMENT_LOGGERS[collection_name])
+        self.log_list_divider(f"{label.upper()}S")
+        for folder in collection.folders:
             self.log_element("folder", folder.name)
             self.log_base_folder(folder)
-        for elem in indigo.variables:
+            yield
+        for elem in collection:
             self.log_elem_divider()
-            self.log_element("variable", elem.name)
-            self.log_variable(elem)
+            self.log_element(label, elem.name)
+            log_method(elem)
+            yield
 
     ####################
     def traverse_database(self: indigo.PluginBase) -> None:
         """
-        This is called when the Log Entire Database menu item is selected.
+        This is called when the Log Entire Database menu item is selected. The traversal runs in the background (see
+        runConcurrentThread) so the plugin stays responsive while a large database is logged.
 
         :return: None
         """
-        self.traverse_devices()
-        self.traverse_triggers()
-        self.traverse_schedules()
-        self.traverse_action_groups()
-        self.traverse_control_pages()
-        self.traverse_variables()
+        if self.background is not None:
+            self.logger.warning(f"a traversal is already running -- {self.background.status()}")
+            return
+        total: int = sum(
+            len(get_collection(name)) + len(get_collection(name).folders) for name, label in COLLECTIONS
+        )
+        steps: Iterator = (step for name, label in COLLECTIONS for step in self.iter_collection(name))
+        self.background = BackgroundTraversal("Log Entire Database", steps, total, EventLogReport(self.logger))
+        self.logger.info(f"logging the entire database ({total} elements) in the background")
+
+    def run_background_slice(self: indigo.PluginBase) -> None:
+        """
+        Run one slice of the background traversal, logging progress now and then and finishing up when it's done.
+
+        :return: None
+        """
+        job: BackgroundTraversal = self.background
+        with self.traversal_lock:
+            self.report, self.names = job.report, job.names
+            try:
+                more: bool = job.run_slice()
+            except Exception as exc:
+                self.logger.exception(exc)
+                more = False
+            finally:
+                self.report = None
+                self.names = None
+        if more:
+            if job.progress_due():
+                self.logger.info(job.status())
+            return
+        job.report.flush()
+        self.logger.debug(job.report.summary())
+        if job.cancelled:
+            self.logger.info(f"cancelled -- {job.status()}")
+        self.background = None
+
+    def cancel_traversal(self: indigo.PluginBase) -> None:
+        """
+        This is called when the Cancel Background Traversal menu item is selected.
+
+        :return: None
+        """
+        if self.background is None:
+            self.logger.info("no traversal is running")
+        else:
+            self.background.cancel()
+
+    ####################
+    def traverse_changes(self: indigo.PluginBase) -> None:
+        """
+        This is called when the Log Changes Since Last Run menu item is selected. Rather than logging everything, we
+        compare a digest of every element with the one remembered from the last run (see watermarks.py) and only log
+        the elements that were added, changed, or deleted since then. The first run just records the baseline.
+
+        :return: None
+        """
+        marks: Watermarks = Watermarks(os.path.join(self.data_folder(), "watermarks.json"))
+        since: str = f"{marks.last_run:%Y-%m-%d %H:%M:%S}" if marks.last_run else None
+        totals: list = [0, 0, 0]
+        with self.traversal():
+            for collection_name, label in COLLECTIONS:
+                collection = get_collection(collection_name)
+                current: dict = {
+                    str(elem.id): [export.element_digest(dict(elem)), elem.name] for elem in collection
+                }
+                added, changed, deleted = marks.compare(collection_name, current)
+                if since is None or not (added or changed or deleted):
+                    continue
+                self.log_list_divider(f"{label.upper()}S CHANGED SINCE {since}")
+                log_method = getattr(self, ELEMENT_LOGGERS[collection_name])
+                for change, elem_ids in (("added", added), ("changed", changed)):
+                    for elem_id in elem_ids:
+                        elem = collection[elem_id]
+                        self.log_elem_divider()
+                        self.log_element(change, elem.name)
+                        log_method(elem)
+                for elem_id, name in deleted:
+                    self.log_elem_divider()
+                    self.log_element("deleted", f"{name} (id {elem_id})")
+                totals = [totals[0] + len(added), totals[1] + len(changed), totals[2] + len(deleted)]
+        marks.save()
+        if since is None:
+            self.logger.info("recorded the database baseline - the next run will log the changes since now")
+        else:
+            self.logger.info(f"{totals[0]} added, {totals[1]} changed, and {totals[2]} deleted since {since}")
+
+    ########################################
+    # Database exports defined in MenuItems.xml:
+    ####################
+    def data_folder(self: indigo.PluginBase) -> str:
+        """
+        The folder where the plugin writes its files unless told otherwise, created if it doesn't exist yet.
+
+        :return: the path to the folder
+        """
+        path = f"{indigo.server.getInstallFolderPath()}/Preferences/Plugins/{self.pluginId}"
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def export_database(self: indigo.PluginBase, writer: any) -> None:
+        """
+        Stream every folder and element in the database to the specified writer and log a summary.
+
+        :param writer: an export.NdjsonWriter or export.SqliteWriter instance
+        :return: None
+        """
+        start: float = time.perf_counter()
+        with writer:
+            for record in export.iter_records():
+                writer.write(record)
+        self.logger.info(
+            f"exported {writer.count} folders and elements to {writer.path} in {time.perf_counter() - start:.2f} seconds"
+        )
+
+    def export_menu_path(self: indigo.PluginBase, values_dict: indigo.Dict, default_name: str) -> tuple:
+        """
+        Work out the path to export to from the menu item's dialog, checking that its folder exists.
+
+        :param values_dict: the values from the menu item's config UI
+        :param default_name: the file name to use in the plugin's data folder if no path was specified
+        :return: a tuple: (path, None) or (None, errors)
+        """
+        path: str = os.path.expanduser(values_dict.get("path", "").strip())
+        if not path:
+            return (os.path.join(self.data_folder(), default_name), None)
+        errors: indigo.Dict = indigo.Dict()
+        if not os.path.isabs(path):
+            errors["path"] = "the path must be a full path"
+        elif not os.path.isdir(os.path.dirname(path)):
+            errors["path"] = f"the folder {os.path.dirname(path)} doesn't exist"
+        return (None, errors) if len(errors) else (path, None)
+
+    def export_ndjson(self: indigo.PluginBase, values_dict: indigo.Dict, menu_id: str) -> any:
+        """
+        This is called when the Export Database to NDJSON menu item is selected.
+
+        :param values_dict: the values from the menu item's config UI
+        :param menu_id: the id of the menu item
+        :return: True to close the dialog or a tuple with the errors to show
+        """
+        path, errors = self.export_menu_path(values_dict, "database.ndjson")
+        if errors:
+            return (False, values_dict, errors)
+        self.export_database(export.NdjsonWriter(path))
+        return True
+
+    def export_sqlite(self: indigo.PluginBase, values_dict: indigo.Dict, menu_id: str) -> any:
+        """
+        This is called when the Export Database to SQLite menu item is selected.
+
+        :param values_dict: the values from the menu item's config UI
+        :param menu_id: the id of the menu item
+        :return: True to close the dialog or a tuple with the errors to show
+        """
+        path, errors = self.export_menu_path(values_dict, "database.sqlite")
+        if errors:
+            return (False, values_dict, errors)
+        self.export_database(export.SqliteWriter(path))
+        return True
+
+    def save_snapshot(self: indigo.PluginBase, values_dict: indigo.Dict, menu_id: str) -> any:
+        """
+        This is called when the Save Database Snapshot menu item is selected.
+
+        :param values_dict: the values from the menu item's config UI
+        :param menu_id: the id of the menu item
+        :return: True to close the dialog or a tuple with the errors to show
+        """
+        path, errors = self.export_menu_path(values_dict, "snapshot.ndjson")
+        if errors:
+            return (False, values_dict, errors)
+        self.export_database(snapshot.SnapshotWriter(path))
+        return True
+
+    def diff_against_snapshot(self: indigo.PluginBase, values_dict: indigo.Dict, menu_id: str) -> any:
+        """
+        This is called when the Diff Database Against Snapshot menu item is selected. Logs what was added, removed, and
+        modified since the snapshot was saved (with the changed fields of the modified elements) and writes the full
+        report next to the snapshot as JSON.
+
+        :param values_dict: the values from the menu item's config UI
+        :param menu_id: the id of the menu item
+        :return: True to close the dialog or a tuple with the errors to show
+        """
+        path, errors = self.export_menu_path(values_dict, "snapshot.ndjson")
+        if not errors and not os.path.isfile(path):
+            errors = indigo.Dict()
+            errors["path"] = f"there's no snapshot at {path}"
+        if errors:
+            return (False, values_dict, errors)
+        start: float = time.perf_counter()
+        report: dict = snapshot.diff_snapshot(path)
+        report_path: str = f"{os.path.splitext(path)[0]}.diff.json"
+        with open(report_path, "w", encoding="utf-8") as file:
+            file.write(export.to_json(report))
+        with self.traversal():
+            self.log_list_divider(f"CHANGES SINCE SNAPSHOT {os.path.basename(path)}")
+            labels: dict = dict(COLLECTIONS)
+            for change in ("added", "removed"):
+                for entry in report[change]:
+                    self.log_element(change, f"{labels[entry['collection']]} {entry['name']} (id {entry['id']})")
+            for entry in report["modified"]:
+                self.log_elem_divider()
+                self.log_element("modified", f"{labels[entry['collection']]} {entry['name']} (id {entry['id']})")
+                for delta in entry["changes"]:
+                    self.log_element("changed", f"{delta['field']}: {delta['old']!r} -> {delta['new']!r}")
+        self.logger.info(
+            f"{len(report['added'])} added, {len(report['removed'])} removed, {len(report['modified'])} modified, and "
+            f"{report['unchanged']} unchanged in {time.perf_counter() - start:.2f} seconds -- "
+            f"report saved to {report_path}"
+        )
+        return True
+
+    ########################################
+    # Reference lookups defined in MenuItems.xml and Actions.xml:
+    ####################
+    def get_references(self: indigo.PluginBase, collection_name: str, elem_id: int) -> dict:
+        """
+        Look up everything that references a device or variable, building the reference index first if needed.
+
+        :param collection_name: "devices" or "variables"
+        :param elem_id: the id of the device or variable
+        :return: {source collection name: sorted list of ids}
+        """
+        if not self.references.built:
+            start: float = time.perf_counter()
+            self.references.build()
+            self.logger.debug(f"built the reference index in {time.perf_counter() - start:.3f} seconds")
+        return self.references.referrers_of(collection_name, elem_id)
+
+    def find_references_menu(self: indigo.PluginBase, values_dict: indigo.Dict, menu_id: str) -> any:
+        """
+        This is called when the Find References menu item is selected. Logs every trigger, schedule, and action group
+        that references the selected device or variable.
+
+        :param values_dict: the values from the menu item's config UI
+        :param menu_id: the id of the menu item
+        :return: True to close the dialog or a tuple with the errors to show
+        """
+        collection_name: str = values_dict.get("targetType", "devices")
+        field: str = "deviceId" if collection_name == "devices" else "variableId"
+        try:
+            target = get_collection(collection_name)[int(values_dict.get(field, 0))]
+        except (KeyError, ValueError):
+            errors: indigo.Dict = indigo.Dict()
+            errors[field] = "select a device or variable"
+            return (False, values_dict, errors)
+        found: dict = self.get_references(collection_name, target.id)
+        with self.traversal():
+            self.log_list_divider(f"REFERENCES TO {target.name.upper()}")
+            for source_collection, label in COLLECTIONS:
+                for source_id in found.get(source_collection, []):
+                    self.log_element(label, self.names.name(source_collection, source_id))
+            if not any(found.values()):
+                self.log_line("no triggers, schedules, or action groups reference it")
+        return True
+
+    def find_references(
+            self: indigo.PluginBase,
+            action: any,
+            dev: indigo.Device = None,
+            caller_waiting_for_result: bool = None
+    ) -> indigo.Dict:
+        """
+        This handler returns the triggers, schedules, and action groups that reference a device or variable, for
+        scripts and other plugins:
+
+            plugin = indigo.server.getPlugin("com.example.indigoplugin.example-db-traverse")
+            reply = plugin.executeAction("find_references", props={"deviceId": 123456}, waitUntilDone=True)
+
+        :param action: action.props contains either 'deviceId' or 'variableId'
+        :param dev: unused
+        :param caller_waiting_for_result: this will be true if it's an API call
+        :return: a reply dict with a list of ids for each of "triggers", "schedules", and "actionGroups"
+        """
+        props: dict = dict(action.props)
+        reply_dict: indigo.Dict = indigo.Dict()
+        if "deviceId" in props:
+            collection_name, field = "devices", "deviceId"
+        elif "variableId" in props:
+            collection_name, field = "variables", "variableId"
+        else:
+            self.logger.error("'find_references' needs either a 'deviceId' or a 'variableId' prop")
+            reply_dict["status"] = False
+            return reply_dict
+        try:
+            elem_id: int = int(props[field])
+        except (TypeError, ValueError):
+            self.logger.error(f"'find_references' needs a numeric '{field}', not {props[field]!r}")
+            reply_dict["status"] = False
+            return reply_dict
+        found: dict = self.get_references(collection_name, elem_id)
+        reply_dict["status"] = True
+        for source_collection in SOURCE_COLLECTIONS:
+            reply_dict[source_collection] = indigo.List(found[source_collection])
+        return reply_dict
+
+    ########################################
+    # Device queries defined in MenuItems.xml and Actions.xml:
+    ####################
+    def query_device_ids(self: indigo.PluginBase, props: dict) -> list:
+        """
+        Run a device query against the secondary indexes, building them first if needed.
+
+        :param props: the query (see parse_query() in query.py)
+        :return: a sorted list of matching device ids
+        :raises QueryError: if the query is invalid
+        """
+        query = parse_query(props)
+        if not self.device_index.built:
+            start: float = time.perf_counter()
+            self.device_index.build()
+            self.logger.debug(f"built the device indexes in {time.perf_counter() - start:.3f} seconds")
+        return self.device_index.query(query)
+
+    def query_devices_menu(self: indigo.PluginBase, values_dict: indigo.Dict, menu_id: str) -> any:
+        """
+        This is called when the Query Devices menu item is selected. Logs every device that matches the query.
+
+        :param values_dict: the values from the menu item's config UI
+        :param menu_id: the id of the menu item
+        :return: True to close the dialog or a tuple with the errors to show
+        """
+        props: dict = dict(values_dict)
+        supports: str = props.pop("supports", "")
+        if supports:
+            props[supports] = True
+        try:
+            dev_ids: list = self.query_device_ids(props)
+        except QueryError as exc:
+            errors: indigo.Dict = indigo.Dict()
+            errors[exc.field] = f"invalid value: {exc.message}"
+            return (False, values_dict, errors)
+        with self.traversal():
+            self.log_list_divider(f"DEVICE QUERY: {len(dev_ids)} MATCHES")
+            for dev_id in dev_ids:
+                elem = indigo.devices[dev_id]
+                self.log_elem_divider()
+                self.log_element("device", elem.name)
+                self.log_device(elem)
+        return True
+
+    def query_devices(
+            self: indigo.PluginBase,
+            action: any,
+            dev: indigo.Device = None,
+            caller_waiting_for_result: bool = None
+    ) -> indigo.Dict:
+        """
+        This handler returns the ids of the devices that match a query, for scripts and other plugins:
+
+            plugin = indigo.server.getPlugin("com.example.indigoplugin.example-db-traverse")
+            props = {"protocol": "Insteon", "class": "DimmerDevice", "supportsEnergyMeter": True, "unchangedForDays": 7}
+            reply = plugin.executeAction("query_devices", props=props, waitUntilDone=True)
+
+        :param action: action.props contains the query - any of the attributes in query.INDEXED_ATTRIBUTES, plus
+            changedBefore, changedAfter, and unchangedForDays
+        :param dev: unused
+        :param caller_waiting_for_result: this will be true if it's an API call
+        :return: a reply dict with the matching "deviceIds"
+        """
+        reply_dict: indigo.Dict = indigo.Dict()
+        try:
+            dev_ids: list = self.query_device_ids(dict(action.props))
+        except QueryError as exc:
+            self.logger.error(f"'query_devices' has an invalid query: {exc}")
+            reply_dict["status"] = False
+            return reply_dict
+        reply_dict["status"] = True
+        reply_dict["deviceIds"] = indigo.List(dev_ids)
+        return reply_dict
+
+    ########################################
+    # Schedule timeline defined in MenuItems.xml and Actions.xml:
+    ####################
+    def upcoming_executions(self: indigo.PluginBase, seconds: float, limit: int = None) -> list:
+        """
+        Look up the schedule executions due in the next seconds, building the timeline first if needed.
+
+        :param seconds: how far ahead to look
+        :param limit: the maximum number of executions to return
+        :return: a list of timeline.Execution in time order
+        """
+        if not self.timeline.built:
+            start: float = time.perf_counter()
+            self.timeline.build()
+            self.logger.debug(f"built the schedule timeline in {time.perf_counter() - start:.3f} seconds")
+        return self.timeline.upcoming(time.time(), seconds, limit)
+
+    def log_timeline(self: indigo.PluginBase, values_dict: indigo.Dict, menu_id: str) -> any:
+        """
+        This is called when the Log Upcoming Schedules menu item is selected. Logs the schedules that fire in the next
+        few hours and any clusters of schedules that may fire in the same second.
+
+        :param values_dict: the values from the menu item's config UI
+        :param menu_id: the id of the menu item
+        :return: True to close the dialog or a tuple with the errors to show
+        """
+        errors: indigo.Dict = indigo.Dict()
+        try:
+            hours: float = float(values_dict.get("hours", "1"))
+        except ValueError:
+            errors["hours"] = "enter a number of hours"
+        try:
+            min_cluster: int = int(values_dict.get("minCluster", "2"))
+        except ValueError:
+            errors["minCluster"] = "enter a whole number"
+        if errors:
+            return (False, values_dict, errors)
+        executions: list = self.upcoming_executions(hours * 3600)
+        with self.traversal():
+            self.log_list_divider(f"SCHEDULES IN THE NEXT {hours:g} HOURS")
+            for execution in executions:
+                window: str = ""
+                if execution.window_end > execution.when:
+                    window = f" (+/- {execution.window_end - execution.when:.0f} seconds)"
+                self.log_element("schedule", f"{execution.next_execution:%Y-%m-%d %H:%M:%S}  {execution.name}{window}")
+            if not executions:
+                self.log_line("- none scheduled -")
+            for cluster in self.timeline.clusters(executions, min_cluster):
+                self.log_list_divider(f"{len(cluster)} SCHEDULES MAY FIRE TOGETHER")
+                for execution in cluster:
+                    self.log_element("schedule", f"{execution.name} at {execution.next_execution:%H:%M:%S}")
+        return True
+
+    def upcoming_schedules(
+            self: indigo.PluginBase,
+            action: any,
+            dev: indigo.Device = None,
+            caller_waiting_for_result: bool = None
+    ) -> indigo.Dict:
+        """
+        This handler returns the schedules that fire in the next few seconds, for scripts and other plugins:
+
+            plugin = indigo.server.getPlugin("com.example.indigoplugin.example-db-traverse")
+            reply = plugin.executeAction("upcoming_schedules", props={"seconds": 3600}, waitUntilDone=True)
+
+        :param action: action.props contains 'seconds' (default 3600) and optionally 'limit'
+        :param dev: unused
+        :param caller_waiting_for_result: this will be true if it's an API call
+        :return: a reply dict with a list of "executions", each with the schedule's id, name, and next execution
+        """
+        props: dict = dict(action.props)
+        reply_dict: indigo.Dict = indigo.Dict()
+        try:
+            seconds: float = float(props.get("seconds", 3600))
+            limit: int = int(props["limit"]) if props.get("limit") else None
+        except ValueError:
+            self.logger.error("'upcoming_schedules' needs a number of seconds (and optionally a limit)")
+            reply_dict["status"] = False
+            return reply_dict
+        executions: indigo.List = indigo.List()
+        for execution in self.upcoming_executions(seconds, limit):
+            item: indigo.Dict = indigo.Dict()
+            item["id"] = execution.schedule_id
+            item["name"] = execution.name
+            item["nextExecution"] = f"{execution.next_execution:%Y-%m-%d %H:%M:%S}"
+            item["randomizeBy"] = int(execution.window_end - execution.when)
+            executions.append(item)
+        reply_dict["status"] = True
+        reply_dict["executions"] = executions
+        return reply_dict
+
+    ########################################
+    # Database statistics defined in MenuItems.xml:
+    ####################
+    def log_statistics(self: indigo.PluginBase, values_dict: indigo.Dict, menu_id: str) -> any:
+        """
+        This is called when the Log Database Statistics menu item is selected. Aggregates the whole database in one
+        pass (see stats.py) and logs a compact summary.
+
+        :param values_dict: the values from the menu item's config UI
+        :param menu_id: the id of the menu item
+        :return: True to close the dialog or a tuple with the errors to show
+        """
+        try:
+            stale_days: float = float(values_dict.get("staleDays", "30"))
+        except ValueError:
+            errors: indigo.Dict = indigo.Dict()
+            errors["staleDays"] = "enter a number of days"
+            return (False, values_dict, errors)
+        start: float = time.perf_counter()
+        stats: DatabaseStats = DatabaseStats(stale_days).collect()
+        self.logger.debug(f"collected the database statistics in {time.perf_counter() - start:.3f} seconds")
+        with self.traversal():
+            self.log_list_divider("DATABASE STATISTICS")
+            for collection_name, label in COLLECTIONS:
+                count: int = stats.collection_counts[collection_name]
+                disabled: int = stats.disabled_counts[collection_name]
+                self.log_element(f"{label}s", f"{count} ({disabled} disabled)" if disabled else count)
+            for title, counter in (("class", stats.classes), ("protocol", stats.protocols), ("model", stats.models)):
+                self.log_list_divider(f"DEVICES BY {title.upper()}")
+                for value, count in counter.most_common():
+                    self.log_element(str(value) or "(none)", count)
+            self.log_list_divider("ELEMENTS BY FOLDER")
+            for (collection_name, folder_id), count in stats.folder_counts.most_common():
+                folder: str = self.names.folder_name(collection_name, folder_id) if folder_id else "(top level)"
+                self.log_element(dict(COLLECTIONS)[collection_name], f"{count} in {folder}")
+            self.log_list_divider("DEVICES BY TIME SINCE LAST CHANGE")
+            largest: int = max(stats.ages) or 1
+            for label, count in zip(age_bucket_labels(), stats.ages):
+                self.log_element(label, f"{count : >6}  {'#' * round(count * 30 / largest)}".rstrip())
+            self.log_list_divider(f"{stats.stale_count} DEVICES UNCHANGED FOR {stale_days:g}+ DAYS")
+            for days, dev_id, name in stats.oldest_stale():
+                self.log_element(f"{days:.0f} days", name)
+            if stats.stale_count > len(stats.stale):
+                self.log_line(f"... and {stats.stale_count - len(stats.stale)} more")
+        return True
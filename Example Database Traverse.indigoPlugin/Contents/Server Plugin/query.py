@@ -0,0 +1,230 @@
+####################
+# Copyright (c) 2026, Indigo Domotics. All rights reserved.
+# https://www.indigodomo.com
+"""
+Secondary indexes over the device attributes the Database Traverse plugin already reads, so a query like "all Insteon
+dimmers that support energy metering and haven't changed in 7 days" is answered from the indexes rather than by
+reading every device.
+
+Each indexed attribute maps a value to the set of device ids that have it. A query intersects the sets for its
+equality predicates (smallest first), and lastChanged is kept as a sorted list of (timestamp, id) pairs so a date range
+is a bisect. The indexes are built in one pass and then kept up to date from the device change callbacks.
+"""
+try:
+    # This is primarily for IDEs - the indigo package is always included when a plugin is started.
+    import indigo
+except ImportError:
+    pass
+
+import bisect
+import datetime
+from typing import NamedTuple
+
+from database import SUPPORTS_PROPERTIES
+
+# The attributes that can be queried for equality. "class" matches the device's class or any of its base classes, so
+# RelayDevice matches dimmers too.
+INDEXED_ATTRIBUTES = ["class", "protocol", "model", "deviceTypeId", "folderId", "enabled"] + SUPPORTS_PROPERTIES
+BOOLEAN_ATTRIBUTES = {"enabled"} | set(SUPPORTS_PROPERTIES)
+INTEGER_ATTRIBUTES = {"folderId"}
+
+
+class QueryError(ValueError):
+    def __init__(self, field: str, message: str) -> None:
+        """
+        :param field: the query key (and config UI field id) with the invalid value
+        :param message: what's wrong with it
+        """
+        super().__init__(field, message)
+        self.field: str = field
+        self.message: str = message
+
+    def __str__(self) -> str:
+        return f"{self.field}: {self.message}"
+
+
+class Query(NamedTuple):
+    equals: dict  # attribute name -> index key
+    changed_before: float = None  # timestamp
+    changed_after: float = None  # timestamp
+
+
+def index_key(attribute: str, value: any) -> any:
+    """
+    Normalize an attribute value (or a query value from action props) into the key it's indexed under. Text values are
+    case-insensitive, and enums like indigo.kProtocol are indexed by their string value.
+
+    :param attribute: the attribute name
+    :param value: the value
+    :return: the index key
+    :raises ValueError: if the value can't be converted to the attribute's type
+    """
+    if attribute in BOOLEAN_ATTRIBUTES:
+        if isinstance(value, str):
+            if value.lower() not in ("true", "false"):
+                raise ValueError(f"{attribute} must be true or false")
+            return value.lower() == "true"
+        return bool(value)
+    if attribute in INTEGER_ATTRIBUTES:
+        return int(value)
+    return str(value).casefold()
+
+
+def device_classes(dev: indigo.Device) -> list:
+    """
+    :param dev: the device
+    :return: the index keys for the device's class and its base classes
+    """
+    return [index_key("class", cls.__name__) for cls in type(dev).__mro__ if cls is not object]
+
+
+def parse_query(props: dict, now: datetime.datetime = None) -> Query:
+    """
+    Build a Query from action props (or the values from a menu item's config UI). Any of the INDEXED_ATTRIBUTES can be
+    used as a key; an empty value means "any". Dates are ISO strings (or datetimes):
+
+        changedBefore, changedAfter: lastChanged must be before/after this date
+        unchangedForDays: lastChanged must be at least this many days ago
+
+    :param props: the query
+    :param now: the current time (mostly for testing)
+    :return: the Query
+    :raises QueryError: with the key of the first invalid value and a description of the problem
+    """
+    equals: dict = {}
+    for attribute in INDEXED_ATTRIBUTES:
+        value = props.get(attribute, "")
+        if value != "" and value is not None:
+            try:
+                equals[attribute] = index_key(attribute, value)
+            except (TypeError, ValueError) as exc:
+                raise QueryError(attribute, str(exc)) from exc
+    changed_before = _timestamp(props, "changedBefore")
+    changed_after = _timestamp(props, "changedAfter")
+    days = props.get("unchangedForDays", "")
+    if days != "" and days is not None:
+        try:
+            cutoff: float = ((now or datetime.datetime.now()) - datetime.timedelta(days=float(days))).timestamp()
+        except (OverflowError, TypeError, ValueError) as exc:
+            raise QueryError("unchangedForDays", str(exc)) from exc
+        changed_before = cutoff if changed_before is None else min(changed_before, cutoff)
+    return Query(equals, changed_before, changed_after)
+
+
+def _timestamp(props: dict, key: str) -> float:
+    value = props.get(key)
+    if value is None or value == "":
+        return None
+    try:
+        if not isinstance(value, datetime.datetime):
+            value = datetime.datetime.fromisoformat(str(value))
+        return value.timestamp()
+    except (OverflowError, ValueError) as exc:
+        raise QueryError(key, str(exc)) from exc
+
+
+class DeviceIndex:
+    def __init__(self) -> None:
+        self.built: bool = False
+        self.postings: dict = {}  # (attribute, key) -> set of device ids
+        self.entries: dict = {}  # device id -> {attribute: key or list of keys}
+        self.changed: list = []  # sorted (lastChanged timestamp, device id) pairs
+        self.changed_at: dict = {}  # device id -> lastChanged timestamp
+
+    def build(self) -> None:
+        """
+        Index every device in one pass.
+
+        :return: None
+        """
+        self.postings = {}
+        self.entries = {}
+        self.changed_at = {}
+        for dev in indigo.devices:
+            self.update(dev, sort=False)
+        self.changed = sorted((stamp, dev_id) for dev_id, stamp in self.changed_at.items())
+        self.built = True
+
+    def update(self, dev: indigo.Device, sort: bool = True) -> None:
+        """
+        Add a device to the indexes or refresh its entries after it changed. Only the attributes whose values changed
+        are touched, so the usual update (a state change) just moves the device in the lastChanged list.
+
+        :param dev: the device
+        :param sort: keep the lastChanged list sorted (build() sorts it once at the end instead)
+        :return: None
+        """
+        entry: dict = {"class": device_classes(dev)}
+        for attribute in INDEXED_ATTRIBUTES[1:]:
+            # Not every device class has every supports* property (see resolve_device_logger() in plugin.py).
+            entry[attribute] = index_key(attribute, getattr(dev, attribute, False))
+        old: dict = self.entries.get(dev.id, {})
+        for attribute, key in entry.items():
+            old_key = old.get(attribute)
+            if key != old_key:
+                self._unindex(dev.id, attribute, old_key)
+                for item in (key if isinstance(key, list) else [key]):
+                    self.postings.setdefault((attribute, item), set()).add(dev.id)
+        self.entries[dev.id] = entry
+        stamp: float = dev.lastChanged.timestamp()
+        old_stamp: float = self.changed_at.get(dev.id)
+        if stamp != old_stamp:
+            self.changed_at[dev.id] = stamp
+            if sort:
+                if old_stamp is not None:
+                    del self.changed[bisect.bisect_left(self.changed, (old_stamp, dev.id))]
+                bisect.insort(self.changed, (stamp, dev.id))
+
+    def remove(self, dev_id: int) -> None:
+        """
+        Remove a device from the indexes.
+
+        :param dev_id: the device's id
+        :return: None
+        """
+        for attribute, key in self.entries.pop(dev_id, {}).items():
+            self._unindex(dev_id, attribute, key)
+        stamp: float = self.changed_at.pop(dev_id, None)
+        if stamp is not None:
+            del self.changed[bisect.bisect_left(self.changed, (stamp, dev_id))]
+
+    def _unindex(self, dev_id: int, attribute: str, key: any) -> None:
+        if key is None:
+            return
+        for item in (key if isinstance(key, list) else [key]):
+            ids = self.postings.get((attribute, item))
+            if ids is not None:
+                ids.discard(dev_id)
+                if not ids:
+                    del self.postings[(attribute, item)]
+
+    def query(self, query: Query) -> list:
+        """
+        Find the devices that match every predicate in the query.
+
+        :param query: the Query
+        :return: a sorted list of device ids
+        """
+        postings: list = sorted(
+            (self.postings.get((attribute, key), set()) for attribute, key in query.equals.items()), key=len
+        )
+        if postings:
+            matches: set = set(postings[0])
+            for ids in postings[1:]:
+                if not matches:
+                    break
+                matches &= ids
+        else:
+            matches = None
+        if query.changed_before is not None or query.changed_after is not None:
+            low: float = float("-inf") if query.changed_after is None else query.changed_after
+            high: float = float("inf") if query.changed_before is None else query.changed_before
+            if matches is None:
+                start: int = bisect.bisect_right(self.changed, (low, float("inf")))
+                end: int = bisect.bisect_left(self.changed, (high, float("-inf")))
+                matches = {dev_id for stamp, dev_id in self.changed[start:end]}
+            else:
+                matches = {dev_id for dev_id in matches if low < self.changed_at[dev_id] < high}
+        elif matches is None:
+            matches = set(self.entries)
+        return sorted(matches)
@@ -0,0 +1,117 @@
+####################
+# Copyright (c) 2026, Indigo Domotics. All rights reserved.
+# https://www.indigodomo.com
+"""
+An inverted index from devices and variables to the triggers, schedules, and action groups that reference them, so
+"what uses device X?" is a dict lookup rather than a scan of the whole database.
+
+References are found by walking dict(elem) for the reference keys below (at any depth), so the index covers whatever
+the object model exposes: a trigger's deviceId or variableId today, and the condition and action lists as they are
+added to the dict (see the TODOs in plugin.py).
+"""
+try:
+    # This is primarily for IDEs - the indigo package is always included when a plugin is started.
+    import indigo
+except ImportError:
+    pass
+
+from database import get_collection
+
+# Keys whose (non-zero) values are ids in the specified collection.
+REFERENCE_KEYS = {
+    "deviceId": "devices",
+    "variableId": "variables",
+}
+
+# The collections whose elements can reference devices and variables.
+SOURCE_COLLECTIONS = ["triggers", "schedules", "actionGroups"]
+
+
+def extract_references(props: any) -> set:
+    """
+    Walk an element's properties and collect every device and variable it references.
+
+    :param props: dict(elem), or any value nested inside it
+    :return: a set of (target collection name, target id) tuples
+    """
+    mappings: tuple = (dict, indigo.Dict)
+    containers: tuple = mappings + (list, tuple, indigo.List)
+    found: set = set()
+    pending: list = [props]
+    while pending:
+        value = pending.pop()
+        if isinstance(value, mappings):
+            for key, item in value.items():
+                target = REFERENCE_KEYS.get(key)
+                if target and isinstance(item, int) and item != 0:
+                    found.add((target, item))
+                elif isinstance(item, containers):
+                    pending.append(item)
+        else:
+            pending.extend(item for item in value if isinstance(item, containers))
+    return found
+
+
+class ReferenceIndex:
+    def __init__(self) -> None:
+        self.built: bool = False
+        self.referrers: dict = {}  # (target collection, target id) -> set of (source collection, source id)
+        self.targets: dict = {}  # (source collection, source id) -> set of (target collection, target id)
+
+    def build(self) -> None:
+        """
+        Index every trigger, schedule, and action group in one pass.
+
+        :return: None
+        """
+        self.referrers = {}
+        self.targets = {}
+        for collection_name in SOURCE_COLLECTIONS:
+            for elem in get_collection(collection_name):
+                self.update(collection_name, elem)
+        self.built = True
+
+    def update(self, collection_name: str, elem: any) -> None:
+        """
+        Add an element to the index or refresh its entries after it changed.
+
+        :param collection_name: the name of the element's collection (i.e. "triggers")
+        :param elem: the element
+        :return: None
+        """
+        source: tuple = (collection_name, elem.id)
+        self.remove(collection_name, elem.id)
+        targets: set = extract_references(dict(elem))
+        if targets:
+            self.targets[source] = targets
+            for target in targets:
+                self.referrers.setdefault(target, set()).add(source)
+
+    def remove(self, collection_name: str, elem_id: int) -> None:
+        """
+        Remove an element from the index.
+
+        :param collection_name: the name of the element's collection
+        :param elem_id: the element's id
+        :return: None
+        """
+        source: tuple = (collection_name, elem_id)
+        for target in self.targets.pop(source, ()):
+            sources = self.referrers[target]
+            sources.discard(source)
+            if not sources:
+                del self.referrers[target]
+
+    def referrers_of(self, collection_name: str, elem_id: int) -> dict:
+        """
+        :param collection_name: "devices" or "variables"
+        :param elem_id: the id of the device or variable
+        :return: {source collection name: sorted list of ids} for every trigger, schedule, and action group that
+            references it
+        """
+        found: dict = {name: [] for name in SOURCE_COLLECTIONS}
+        for source_collection, source_id in self.referrers.get((collection_name, elem_id), ()):
+            found[source_collection].append(source_id)
+        for ids in found.values():
+            ids.sort()
+        return found
@@ -0,0 +1,78 @@
+####################
+# Copyright (c) 2026, Indigo Domotics. All rights reserved.
+# https://www.indigodomo.com
+"""
+Every call to self.logger.info() is a separate record sent to the Indigo Server, so logging a large database one line
+at a time means tens of thousands of round trips. The EventLogReport class collects the lines of a report and sends
+them to the Event Log as multi-line records instead: a record is only sent once an element's block is complete and the
+collected text has reached max_record_size (or when the report is flushed at the end), so an element's lines are never
+split across records.
+"""
+import logging
+import time
+
+# The approximate maximum size (in characters) of a single multi-line log record.
+MAX_RECORD_SIZE = 16 * 1024
+
+
+class EventLogReport:
+    def __init__(self, logger: logging.Logger, max_record_size: int = MAX_RECORD_SIZE) -> None:
+        """
+        :param logger: the logger to send the records to (usually the plugin's self.logger)
+        :param max_record_size: the approximate maximum number of characters in a single record
+        """
+        self.logger: logging.Logger = logger
+        self.max_record_size: int = max_record_size
+        self.pending: list = []
+        self.pending_size: int = 0
+        self.line_count: int = 0
+        self.record_count: int = 0
+        self.start_time: float = time.perf_counter()
+
+    def add(self, line: str) -> None:
+        """
+        Add a line to the report.
+
+        :param line: the line of text to add
+        :return: None
+        """
+        self.pending.append(line)
+        self.pending_size += len(line) + 1
+        self.line_count += 1
+
+    def end_block(self) -> None:
+        """
+        Mark the end of an element's block of lines. The collected lines are sent if they're big enough.
+
+        :return: None
+        """
+        if self.pending_size >= self.max_record_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Send any collected lines to the Event Log as one record.
+
+        :return: None
+        """
+        if self.pending:
+            self.logger.info("\n".join(self.pending))
+            self.record_count += 1
+            self.pending = []
+            self.pending_size = 0
+
+    @property
+    def elapsed(self) -> float:
+        """
+        :return: the number of seconds since the report was started
+        """
+        return time.perf_counter() - self.start_time
+
+    def summary(self) -> str:
+        """
+        :return: a short description of how much was logged and how long it took
+        """
+        return (
+            f"logged {self.line_count} lines in {self.record_count} log records "
+            f"({self.line_count - self.record_count} fewer logging calls) in {self.elapsed:.3f} seconds"
+        )
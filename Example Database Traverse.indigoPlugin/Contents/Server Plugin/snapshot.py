@@ -0,0 +1,157 @@
+####################
+# Copyright (c) 2026, Indigo Domotics. All rights reserved.
+# https://www.indigodomo.com
+"""
+Database snapshots for change control: save the database to a snapshot file now, and later diff the live database
+against it.
+
+A snapshot is an NDJSON export (see export.py) where every element record also carries its digest, plus a small index
+file next to it that maps each element to its digest and the byte offset of its line (and records the snapshot file's
+size and modification time, so an index that no longer matches its file is ignored). Diffing only reads the index:
+an element whose digest matches is unchanged and is skipped without looking at its record, and only the records of
+modified elements are read back (with a seek to their offset) to work out which fields changed. A plain NDJSON export
+can be diffed too - its index is built by reading it once.
+"""
+try:
+    # This is primarily for IDEs - the indigo package is always included when a plugin is started.
+    import indigo
+except ImportError:
+    pass
+
+import json
+import os
+
+import export
+from database import COLLECTIONS, get_collection
+
+
+def index_path(path: str) -> str:
+    """
+    :param path: the path of the snapshot file
+    :return: the path of its index file
+    """
+    return f"{path}.index.json"
+
+
+class SnapshotWriter(export.NdjsonWriter):
+    """
+    Writes an NDJSON export with a digest in every element record and saves the snapshot index when it's closed.
+    """
+    def __init__(self, path: str) -> None:
+        super().__init__(path)
+        self.offset: int = 0
+        self.index: dict = {}  # collection name -> {element id (str): [digest, offset, name]}
+
+    def __enter__(self) -> "SnapshotWriter":
+        # Remove the old index first, so it can't outlive the file it describes if this snapshot fails.
+        if os.path.exists(index_path(self.path)):
+            os.remove(index_path(self.path))
+        # Binary, so the offsets we record are real byte offsets we can seek to later.
+        self.file = open(self.path, "wb")
+        return self
+
+    def __exit__(self, exc_type: any, *exc_info) -> None:
+        self.file.close()
+        if exc_type is None:
+            stat: os.stat_result = os.stat(self.path)
+            saved: dict = {"size": stat.st_size, "mtime": stat.st_mtime_ns, "collections": self.index}
+            with open(index_path(self.path), "w", encoding="utf-8") as file:
+                json.dump(saved, file)
+
+    def write(self, record: dict) -> None:
+        """
+        :param record: the export record to write
+        :return: None
+        """
+        if record["kind"] == "element":
+            digest: str = export.element_digest(record["props"])
+            record = dict(record, digest=digest)
+            self.index.setdefault(record["collection"], {})[str(record["id"])] = [digest, self.offset, record["name"]]
+        line: bytes = (export.to_json(record) + "\n").encode("utf-8")
+        self.file.write(line)
+        self.offset += len(line)
+        self.count += 1
+
+
+def load_index(path: str) -> dict:
+    """
+    Load a snapshot's index, building it from the snapshot file if there isn't one (i.e. for a plain NDJSON export) or
+    the one there doesn't match the file (i.e. the file has since been replaced by a plain NDJSON export).
+
+    :param path: the path of the snapshot file
+    :return: {collection name: {element id (str): [digest, offset, name]}}
+    """
+    if os.path.exists(index_path(path)):
+        with open(index_path(path), "r", encoding="utf-8") as file:
+            saved: dict = json.load(file)
+        stat: os.stat_result = os.stat(path)
+        if saved.get("size") == stat.st_size and saved.get("mtime") == stat.st_mtime_ns:
+            return saved["collections"]
+    index: dict = {}
+    offset: int = 0
+    with open(path, "rb") as file:
+        for line in file:
+            record: dict = json.loads(line)
+            if record["kind"] == "element":
+                digest: str = record.get("digest") or export.element_digest(record["props"])
+                index.setdefault(record["collection"], {})[str(record["id"])] = [digest, offset, record["name"]]
+            offset += len(line)
+    return index
+
+
+def field_deltas(old: any, new: any, path: str = "") -> list:
+    """
+    Compare two versions of an element's properties. Dicts are compared key by key (recursively); anything else,
+    including lists, is compared as a whole.
+
+    :param old: the properties from the snapshot
+    :param new: the current properties, normalized the way they're stored in a snapshot
+    :param path: the dotted path of old and new within the element's properties
+    :return: a list of {"field", "old", "new"} dicts - a missing value is None
+    """
+    if isinstance(old, dict) and isinstance(new, dict):
+        deltas: list = []
+        for key in list(old) + [key for key in new if key not in old]:
+            deltas.extend(field_deltas(old.get(key), new.get(key), f"{path}.{key}" if path else key))
+        return deltas
+    if old == new:
+        return []
+    return [{"field": path, "old": old, "new": new}]
+
+
+def diff_snapshot(path: str) -> dict:
+    """
+    Diff the live database against a snapshot.
+
+    :param path: the path of the snapshot file
+    :return: {"added": [...], "removed": [...], "modified": [...], "unchanged": count}. Every entry has the element's
+        collection, id, and name; modified entries also have the list of field "changes" (see field_deltas)
+    """
+    index: dict = load_index(path)
+    report: dict = {"added": [], "removed": [], "modified": [], "unchanged": 0}
+    with open(path, "rb") as snapshot:
+        for collection_name, _ in COLLECTIONS:
+            saved: dict = index.get(collection_name, {})
+            seen: set = set()
+            for elem in get_collection(collection_name):
+                key: str = str(elem.id)
+                seen.add(key)
+                props: dict = dict(elem)
+                entry = saved.get(key)
+                summary: dict = {"collection": collection_name, "id": elem.id, "name": elem.name}
+                if entry is None:
+                    report["added"].append(summary)
+                    continue
+                if entry[0] == export.element_digest(props):
+                    report["unchanged"] += 1
+                    continue
+                snapshot.seek(entry[1])
+                old_props: dict = json.loads(snapshot.readline())["props"]
+                # Round trip the current properties through JSON so dates etc. compare the way they were saved.
+                new_props: dict = json.loads(export.to_json(props))
+                summary["changes"] = field_deltas(old_props, new_props)
+                report["modified"].append(summary)
+            for key, (digest, offset, name) in saved.items():
+                if key not in seen:
+                    report["removed"].append({"collection": collection_name, "id": int(key), "name": name})
+    return report
@@ -0,0 +1,100 @@
+####################
+# Copyright (c) 2026, Indigo Domotics. All rights reserved.
+# https://www.indigodomo.com
+"""
+Aggregate statistics about the database, gathered in a single pass over every collection. Each breakdown is a Counter
+keyed by value, the lastChanged ages are counted into a fixed array of histogram buckets, and only the oldest few stale
+devices are kept (in a bounded heap), so memory depends on the number of distinct values rather than the number of
+elements.
+"""
+try:
+    # This is primarily for IDEs - the indigo package is always included when a plugin is started.
+    import indigo
+except ImportError:
+    pass
+
+import bisect
+import heapq
+import time
+from array import array
+from collections import Counter
+
+from database import COLLECTIONS, get_collection
+
+# The upper bounds (in days) of the lastChanged age histogram buckets; the last bucket holds everything older.
+AGE_BUCKETS = [1, 7, 30, 90, 365]
+# The number of stale devices listed in the report.
+MAX_STALE = 25
+
+
+def age_bucket_labels() -> list:
+    """
+    :return: a label for each age histogram bucket (i.e. "< 7 days")
+    """
+    return [f"< {days} days" for days in AGE_BUCKETS] + [f">= {AGE_BUCKETS[-1]} days"]
+
+
+class DatabaseStats:
+    def __init__(self, stale_days: float = 30, now: float = None) -> None:
+        """
+        :param stale_days: a device that hasn't changed in this many days is stale
+        :param now: the current timestamp (mostly for testing)
+        """
+        self.now: float = time.time() if now is None else now
+        self.stale_seconds: float = stale_days * 86400
+        self.collection_counts: Counter = Counter()
+        self.disabled_counts: Counter = Counter()
+        self.folder_counts: Counter = Counter()  # (collection name, folder id) -> count
+        self.protocols: Counter = Counter()
+        self.models: Counter = Counter()
+        self.classes: Counter = Counter()
+        self.ages: array = array("L", [0] * (len(AGE_BUCKETS) + 1))
+        self.stale_count: int = 0
+        self.stale: list = []  # min-heap of the MAX_STALE oldest stale devices: (age, device id, name)
+
+    def collect(self) -> "DatabaseStats":
+        """
+        Iterate over every element in the database once.
+
+        :return: self
+        """
+        for collection_name, label in COLLECTIONS:
+            for elem in get_collection(collection_name):
+                self.add(collection_name, elem)
+        return self
+
+    def add(self, collection_name: str, elem: any) -> None:
+        """
+        Count one element.
+
+        :param collection_name: the name of the element's collection
+        :param elem: the element
+        :return: None
+        """
+        self.collection_counts[collection_name] += 1
+        self.folder_counts[(collection_name, elem.folderId)] += 1
+        if not getattr(elem, "enabled", True):
+            self.disabled_counts[collection_name] += 1
+        if collection_name == "devices":
+            self.add_device(elem)
+
+    def add_device(self, dev: indigo.Device) -> None:
+        self.protocols[str(dev.protocol)] += 1
+        self.models[dev.model] += 1
+        self.classes[dev.__class__.__name__] += 1
+        age: float = self.now - dev.lastChanged.timestamp()
+        self.ages[bisect.bisect_right(AGE_BUCKETS, age / 86400)] += 1
+        if age >= self.stale_seconds:
+            self.stale_count += 1
+            entry: tuple = (age, dev.id, dev.name)
+            if len(self.stale) < MAX_STALE:
+                heapq.heappush(self.stale, entry)
+            elif entry > self.stale[0]:
+                # Older than the youngest one we're keeping, which is at the top of the (min-)heap.
+                heapq.heapreplace(self.stale, entry)
+
+    def oldest_stale(self) -> list:
+        """
+        :return: (days since last change, device id, name) for the oldest stale devices, oldest first
+        """
+        return [(age / 86400, dev_id, name) for age, dev_id, name in sorted(self.stale, reverse=True)]
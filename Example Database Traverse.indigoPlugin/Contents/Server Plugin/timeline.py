@@ -0,0 +1,209 @@
+####################
+# Copyright (c) 2026, Indigo Domotics. All rights reserved.
+# https://www.indigodomo.com
+"""
+A timeline of upcoming schedule executions, kept as a min-heap ordered by execution time so "what fires in the next
+hour" only touches the schedules that actually fire in the next hour.
+
+The object model exposes one nextExecution per schedule (with any sun delta already applied), so the heap holds one
+entry per enabled schedule. When a schedule changes, a new entry is pushed and the old one is left in place but marked
+stale by its version number (lazy deletion); stale entries are skipped when reading and dropped when the heap is
+compacted. When a schedule's execution time passes, it's read again to find its next execution, so recurring schedules
+stay on the timeline whether or not a change callback reports that they moved on. A schedule with randomizeBy set fires
+somewhere in a window around its nextExecution, and the window is what's used to find clusters of schedules that may
+fire at the same time.
+"""
+try:
+    # This is primarily for IDEs - the indigo package is always included when a plugin is started.
+    import indigo
+except ImportError:
+    pass
+
+import datetime
+import heapq
+from typing import Iterator, NamedTuple
+
+# The heap is rebuilt without its stale entries once they outnumber the live ones by this factor.
+COMPACT_FACTOR = 2
+
+
+class Execution(NamedTuple):
+    when: float  # timestamp of nextExecution
+    schedule_id: int
+    name: str
+    window_start: float  # the earliest the schedule might fire, with randomizeBy applied
+    window_end: float  # the latest the schedule might fire
+    sun_delta: int  # seconds before/after sunrise or sunset, already included in when
+
+    @property
+    def next_execution(self) -> datetime.datetime:
+        return datetime.datetime.fromtimestamp(self.when)
+
+
+def schedule_execution(schedule: indigo.Schedule) -> Execution:
+    """
+    :param schedule: the schedule
+    :return: the schedule's next Execution, or None if it's disabled or has nothing scheduled
+    """
+    if not schedule.enabled:
+        return None
+    try:
+        next_execution = schedule.nextExecution
+    except Exception:
+        return None
+    if next_execution is None:
+        return None
+    when: float = next_execution.timestamp()
+    return Execution(
+        when, schedule.id, schedule.name, when - schedule.randomizeBy, when + schedule.randomizeBy, schedule.sunDelta
+    )
+
+
+class ScheduleTimeline:
+    def __init__(self) -> None:
+        self.built: bool = False
+        self.heap: list = []  # (when, schedule id, version) entries, possibly stale
+        self.current: dict = {}  # schedule id -> (version, Execution) for the live entries
+        self.fired: set = set()  # ids of schedules whose execution has passed but whose next one isn't known yet
+        self.version: int = 0
+
+    def build(self) -> None:
+        """
+        Read every schedule's next execution and heapify them in one pass.
+
+        :return: None
+        """
+        self.heap = []
+        self.current = {}
+        self.fired = set()
+        for schedule in indigo.schedules:
+            execution = schedule_execution(schedule)
+            if execution is not None:
+                self.version += 1
+                self.current[schedule.id] = (self.version, execution)
+                self.heap.append((execution.when, schedule.id, self.version))
+        heapq.heapify(self.heap)
+        self.built = True
+
+    def update(self, schedule: indigo.Schedule) -> None:
+        """
+        Add a schedule to the timeline or move it after it changed. The old entry is left in the heap as a stale entry.
+
+        :param schedule: the schedule
+        :return: None
+        """
+        execution = schedule_execution(schedule)
+        if execution is None:
+            self.remove(schedule.id)
+            return
+        self.fired.discard(schedule.id)
+        live = self.current.get(schedule.id)
+        if live is not None and live[1] == execution:
+            return
+        self.version += 1
+        self.current[schedule.id] = (self.version, execution)
+        heapq.heappush(self.heap, (execution.when, schedule.id, self.version))
+        self._compact_if_needed()
+
+    def remove(self, schedule_id: int) -> None:
+        """
+        Remove a schedule from the timeline. Its heap entry becomes stale.
+
+        :param schedule_id: the schedule's id
+        :return: None
+        """
+        self.fired.discard(schedule_id)
+        if self.current.pop(schedule_id, None) is not None:
+            self._compact_if_needed()
+
+    def _is_live(self, entry: tuple) -> bool:
+        live = self.current.get(entry[1])
+        return live is not None and live[0] == entry[2]
+
+    def _compact_if_needed(self) -> None:
+        if len(self.heap) > (COMPACT_FACTOR + 1) * max(len(self.current), 1):
+            self.heap = [entry for entry in self.heap if self._is_live(entry)]
+            heapq.heapify(self.heap)
+
+    def prune(self, now: float) -> None:
+        """
+        Pop the entries that are stale or in the past, and read the schedules that have fired again to put their next
+        execution on the timeline. A schedule that no longer exists or has nothing else scheduled is dropped; one that
+        the server hasn't moved on yet is read again on the next prune.
+
+        :param now: the current timestamp
+        :return: None
+        """
+        while self.heap and (self.heap[0][0] < now or not self._is_live(self.heap[0])):
+            entry = heapq.heappop(self.heap)
+            if self._is_live(entry):
+                del self.current[entry[1]]
+                self.fired.add(entry[1])
+        for schedule_id in list(self.fired):
+            schedule = indigo.schedules.get(schedule_id)
+            execution = None if schedule is None else schedule_execution(schedule)
+            if execution is None:
+                self.fired.discard(schedule_id)
+            elif execution.when >= now:
+                self.update(schedule)
+
+    def iter_upcoming(self, now: float) -> Iterator:
+        """
+        Walk the live executions from now on in time order without popping them: the heap is explored as a tree with a
+        second, small heap holding the frontier, so reading the first k executions costs O(k log k).
+
+        :param now: the current timestamp
+        :return: a generator of Executions in time order
+        """
+        self.prune(now)
+        heap: list = self.heap
+        frontier: list = [(heap[0], 0)] if heap else []
+        while frontier:
+            entry, index = heapq.heappop(frontier)
+            for child in (2 * index + 1, 2 * index + 2):
+                if child < len(heap):
+                    heapq.heappush(frontier, (heap[child], child))
+            if self._is_live(entry):
+                yield self.current[entry[1]][1]
+
+    def upcoming(self, now: float, seconds: float, limit: int = None) -> list:
+        """
+        :param now: the current timestamp
+        :param seconds: how far ahead to look
+        :param limit: the maximum number of executions to return
+        :return: the Executions due in the next seconds, in time order
+        """
+        found: list = []
+        for execution in self.iter_upcoming(now):
+            if execution.when > now + seconds or (limit is not None and len(found) >= limit):
+                break
+            found.append(execution)
+        return found
+
+    @staticmethod
+    def clusters(executions: list, min_size: int = 2) -> list:
+        """
+        Find groups of schedules that may fire in the same second: executions whose windows (from randomizeBy, or the
+        second they're due in) overlap are grouped together.
+
+        :param executions: Executions in time order, i.e. from upcoming()
+        :param min_size: the smallest group worth reporting
+        :return: a list of lists of Executions
+        """
+        groups: list = []
+        group: list = []
+        group_end: float = None
+        for execution in sorted(executions, key=lambda execution: execution.window_start):
+            start: float = int(execution.window_start)
+            end: float = max(execution.window_end, start + 1)
+            if group and start < group_end:
+                group.append(execution)
+                group_end = max(group_end, end)
+            else:
+                if len(group) >= min_size:
+                    groups.append(group)
+                group = [execution]
+                group_end = end
+        if len(group) >= min_size:
+            groups.append(group)
+        return groups
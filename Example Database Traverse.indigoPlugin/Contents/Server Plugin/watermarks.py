@@ -0,0 +1,61 @@
+####################
+# Copyright (c) 2026, Indigo Domotics. All rights reserved.
+# https://www.indigodomo.com
+"""
+Remember what the database looked like the last time it was traversed, so that the next traversal can report only
+what was added, changed, or deleted since then. For every element of every collection we keep its name and a digest of
+dict(elem) (see export.element_digest), along with the time of the run. They're stored as JSON in a side file rather
+than in the plugin prefs, since a large database has thousands of entries.
+"""
+import datetime
+import json
+import os
+
+
+class Watermarks:
+    def __init__(self, path: str) -> None:
+        """
+        :param path: the path of the side file
+        """
+        self.path: str = path
+        self.last_run: datetime.datetime = None
+        self.collections: dict = {}  # collection name -> {element id (str): [digest, name]}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as file:
+                saved = json.load(file)
+            self.last_run = datetime.datetime.fromisoformat(saved["lastRun"])
+            self.collections = saved["collections"]
+
+    def compare(self, collection_name: str, current: dict) -> tuple:
+        """
+        Compare the current elements of a collection with the ones from the last run, then remember the current ones.
+
+        :param collection_name: the name of the collection (i.e. "devices")
+        :param current: {element id (str): [digest, name]} for every element in the collection now
+        :return: a tuple of lists: (added ids, changed ids, [(deleted id, name), ...])
+        """
+        previous: dict = self.collections.get(collection_name, {})
+        added: list = []
+        changed: list = []
+        for elem_id, (digest, _) in current.items():
+            entry = previous.get(elem_id)
+            if entry is None:
+                added.append(int(elem_id))
+            elif entry[0] != digest:
+                changed.append(int(elem_id))
+        deleted: list = [(int(elem_id), entry[1]) for elem_id, entry in previous.items() if elem_id not in current]
+        self.collections[collection_name] = current
+        return (added, changed, deleted)
+
+    def save(self) -> None:
+        """
+        Record the time of this run and write the side file. The file is replaced atomically, so an interrupted save
+        can't leave a half written file behind.
+
+        :return: None
+        """
+        self.last_run = datetime.datetime.now()
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump({"lastRun": self.last_run.isoformat(), "collections": self.collections}, file)
+        os.replace(temp_path, self.path)